@@ -0,0 +1,492 @@
+"""Benchmark of building a dependency map with a synthetic SQL corpus
+
+Usage:
+    python scripts/benchmark.py --templates 1000 --output result.json
+    python scripts/benchmark.py --templates 1000 --baseline result.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.stairlight.configurator import Configurator  # noqa: E402
+from src.stairlight.map import Map, MappingPlan  # noqa: E402
+from src.stairlight.query import Query  # noqa: E402
+from src.stairlight.query_parser import (  # noqa: E402
+    HybridQueryParser,
+    QueryEngine,
+    QueryParser,
+    get_query_parser,
+)
+from src.stairlight.source.template import Template  # noqa: E402
+
+PHASES = ["discovery", "fetch", "render", "parse", "merge", "total"]
+THRESHOLD_DEFAULT = 0.1
+
+
+@dataclass
+class CorpusSpec:
+    templates: int = 200
+    cte_depth: int = 3
+    join_fanout: int = 2
+    params: int = 4
+    lines: int = 60
+    mappings: int = 0
+    tables: int = 500
+    # Ratio of templates whose main query reads from a subquery
+    subquery_ratio: float = 0.0
+    seed: int = 0
+
+
+@dataclass
+class BenchmarkResult:
+    spec: CorpusSpec
+    repeat: int
+    phases: dict[str, float] = field(default_factory=dict)
+    edges: int = 0
+    query_engine: str = QueryEngine.LEXER.value
+    # Queries and seconds of each parser strategy in the parse phase
+    strategies: dict[str, dict[str, Any]] = field(default_factory=dict)
+    python: str = platform.python_version()
+
+
+def create_query(spec: CorpusSpec, rand: random.Random) -> str:
+    """Create a query template like the ones in tests/sql
+
+    Args:
+        spec (CorpusSpec): Corpus specification
+        rand (random.Random): Random number generator
+
+    Returns:
+        str: Query template
+    """
+
+    def table() -> str:
+        return f"{{{{ params.PROJECT }}}}.DATASET_{rand.randrange(10)}.TABLE_" + str(
+            rand.randrange(spec.tables)
+        )
+
+    def columns(indent: str) -> list[str]:
+        # Each parameter is referenced once in every SELECT clause
+        return [
+            f"{indent}col_{i} + {{{{ params.P_{i} }}}} AS col_{i},"
+            for i in range(spec.params)
+        ] + [f"{indent}test_id"]
+
+    lines: list[str] = []
+    for depth in range(spec.cte_depth):
+        lines.append(f"WITH cte_{depth} AS (" if depth == 0 else f"cte_{depth} AS (")
+        lines += ["    SELECT"] + columns(indent="        ")
+        lines += ["    FROM", f"        {table()}", "    WHERE", "        0 = 0", "),"]
+    if lines:
+        lines[-1] = ")"
+        lines.append("")
+
+    lines += ["SELECT"] + columns(indent="    ")
+    if rand.random() < spec.subquery_ratio:
+        lines += ["FROM (", f"    SELECT * FROM {table()}", ") AS main"]
+    else:
+        lines += ["FROM", f"    {table()} AS main"]
+    for i in range(spec.join_fanout):
+        lines += [
+            f"    INNER JOIN {table()} AS j_{i}",
+            f"        ON main.test_id = j_{i}.test_id",
+        ]
+    for depth in range(spec.cte_depth):
+        lines += [
+            f"    LEFT JOIN cte_{depth}",
+            f"        ON main.test_id = cte_{depth}.test_id",
+        ]
+    lines += ["WHERE", "    1 = 1"]
+    while len(lines) < spec.lines:
+        lines.append(f"    -- padding {len(lines)}")
+    return "\n".join(lines) + "\n"
+
+
+def generate_corpus(spec: CorpusSpec, dir: str) -> None:
+    """Generate SQL templates and configurations
+
+    Args:
+        spec (CorpusSpec): Corpus specification
+        dir (str): Output directory
+    """
+    rand = random.Random(spec.seed)
+    sql_dir = Path(dir) / "sql"
+    sql_dir.mkdir(parents=True, exist_ok=True)
+
+    mapping: list[dict[str, Any]] = []
+    for i in range(spec.templates):
+        file_name = f"sql/template_{i:06}.sql"
+        (Path(dir) / file_name).write_text(create_query(spec=spec, rand=rand))
+        mapping.append(
+            {
+                "TemplateSourceType": "File",
+                "FileSuffix": file_name,
+                "Tables": [
+                    {
+                        "TableName": f"PROJECT_OUT.DATASET_OUT.TABLE_{i}",
+                        "Parameters": {
+                            "params": {f"P_{k}": k for k in range(spec.params)}
+                        },
+                        "Labels": {"Group": str(i % 10)},
+                    }
+                ],
+            }
+        )
+    # Mappings of templates that do not exist, to inflate mapping configurations
+    for i in range(spec.mappings):
+        mapping.append(
+            {
+                "TemplateSourceType": "File",
+                "FileSuffix": f"sql/missing_{i:06}.sql",
+                "Tables": [{"TableName": f"PROJECT_X.DATASET_X.TABLE_{i}"}],
+            }
+        )
+
+    stairlight_config = {
+        "Include": [
+            {
+                "TemplateSourceType": "File",
+                "FileSystemPath": str(sql_dir),
+                "Regex": ".*/*\\.sql$",
+                "DefaultTablePrefix": "PROJECT_DEFAULT",
+            }
+        ],
+        "Settings": {"MappingPrefix": "mapping"},
+    }
+    mapping_config = {
+        "Global": {"Parameters": {"params": {"PROJECT": "PROJECT_GLOBAL"}}},
+        "Mapping": mapping,
+    }
+    with open(Path(dir) / "stairlight.yaml", "w") as f:
+        yaml.safe_dump(stairlight_config, f, sort_keys=False)
+    with open(Path(dir) / "mapping.yaml", "w") as f:
+        yaml.safe_dump(mapping_config, f, sort_keys=False)
+
+
+def collect_strategies(query_parser: QueryParser) -> dict[str, dict[str, Any]]:
+    """Collect statistics of a parser and parsers it delegates to
+
+    Args:
+        query_parser (QueryParser): Query parser
+
+    Returns:
+        dict[str, dict[str, Any]]: Queries, seconds and reasons by strategy
+    """
+    strategies = {
+        query_parser.NAME: {
+            "queries": query_parser.stats.queries,
+            "seconds": query_parser.stats.seconds,
+            "reasons": dict(query_parser.stats.reasons),
+        }
+    }
+    if isinstance(query_parser, HybridQueryParser):
+        for key, delegated in (
+            ("fast", query_parser.fast),
+            ("full", query_parser.full),
+        ):
+            strategies[f"{key}:{delegated.NAME}"] = {
+                "queries": delegated.stats.queries,
+                "seconds": delegated.stats.seconds,
+            }
+    return strategies
+
+
+def subtract_strategies(
+    after: dict[str, dict[str, Any]], before: dict[str, dict[str, Any]]
+) -> dict[str, dict[str, Any]]:
+    """Subtract statistics of strategies
+
+    Args:
+        after (dict[str, dict[str, Any]]): Statistics after a phase
+        before (dict[str, dict[str, Any]]): Statistics before a phase
+
+    Returns:
+        dict[str, dict[str, Any]]: Statistics in the phase
+    """
+    strategies: dict[str, dict[str, Any]] = {}
+    for name, stats in after.items():
+        strategies[name] = {}
+        for key, value in stats.items():
+            base = before[name][key]
+            strategies[name][key] = (
+                {reason: value[reason] - base.get(reason, 0) for reason in value}
+                if isinstance(value, dict)
+                else value - base
+            )
+    return strategies
+
+
+def measure(
+    dir: str, query_engine: str
+) -> tuple[dict[str, float], int, dict[str, dict[str, Any]]]:
+    """Build a dependency map once and measure each phase
+
+    Args:
+        dir (str): Corpus directory
+        query_engine (str): Query engine
+
+    Returns:
+        tuple[dict[str, float], int, dict[str, dict[str, Any]]]:
+            Elapsed seconds by phase, edge count and statistics of strategies
+    """
+    configurator = Configurator(dir=dir)
+    stairlight_config = configurator.read_stairlight(prefix="stairlight")
+    mapping_config = configurator.read_mapping_with_prefix(prefix="mapping")
+    elapsed: dict[str, float] = {}
+
+    def timed(phase: str, func: Callable[[], Any]) -> Any:
+        start = time.perf_counter()
+        result = func()
+        elapsed[phase] = time.perf_counter() - start
+        return result
+
+    dependency_map = Map(
+        stairlight_config=stairlight_config,
+        mapping_config=mapping_config,
+        query_engine=query_engine,
+    )
+    plan = MappingPlan(
+        mapping_config=mapping_config,
+        global_params=mapping_config.get_global().Parameters or {},
+    )
+    templates: list[Template] = timed(
+        "discovery",
+        lambda: [
+            template
+            for template_source in dependency_map.find_template_source()
+            for template in template_source.search_templates()
+        ],
+    )
+    template_strs = timed(
+        "fetch", lambda: [template.get_template_str() for template in templates]
+    )
+    works = [
+        (template, template_str, table_attributes)
+        for template, template_str in zip(templates, template_strs)
+        for table_attributes in template.find_mapped_table_attributes()
+    ]
+    query_strs = timed(
+        "render",
+        lambda: [
+            template.render(
+                params=plan.get_table_plan(table_attributes=table_attributes).params,
+                ignore_params=table_attributes.IgnoreParameters,
+                template_str=template_str,
+            )
+            for template, template_str, table_attributes in works
+        ],
+    )
+    query_parser = get_query_parser(engine=QueryEngine(query_engine))
+    strategies_before = collect_strategies(query_parser=query_parser)
+    references = timed(
+        "parse",
+        lambda: [
+            list(
+                Query(
+                    query_str=query_str,
+                    default_table_prefix=template.default_table_prefix,
+                    engine=query_engine,
+                ).detect_upstair_table_reference()
+            )
+            for (template, _, _), query_str in zip(works, query_strs)
+        ],
+    )
+    strategies = subtract_strategies(
+        after=collect_strategies(query_parser=query_parser), before=strategies_before
+    )
+
+    def merge() -> None:
+        for (template, _, table_attributes), upstair_table_references in zip(
+            works, references
+        ):
+            dependency_map.remap(
+                template=template,
+                table_attributes=table_attributes,
+                upstair_table_references=upstair_table_references,
+            )
+
+    timed("merge", merge)
+
+    total_map = Map(
+        stairlight_config=stairlight_config,
+        mapping_config=mapping_config,
+        query_engine=query_engine,
+    )
+    timed("total", total_map.write)
+    edges = sum(
+        len(mapped_templates)
+        for upstairs in total_map.mapped.values()
+        for mapped_templates in upstairs.values()
+    )
+    return elapsed, edges, strategies
+
+
+def run(
+    spec: CorpusSpec,
+    repeat: int,
+    dir: str | None = None,
+    query_engine: str = QueryEngine.LEXER.value,
+) -> BenchmarkResult:
+    """Generate a corpus and measure it repeatedly
+
+    Args:
+        spec (CorpusSpec): Corpus specification
+        repeat (int): The number of measurements
+        dir (str, optional):
+            Corpus directory. Defaults to None, which means a temporary one.
+        query_engine (str, optional): Query engine. Defaults to "lexer".
+
+    Returns:
+        BenchmarkResult: Median seconds by phase
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_dir = dir or tmp_dir
+        generate_corpus(spec=spec, dir=corpus_dir)
+        cwd = os.getcwd()
+        os.chdir(corpus_dir)
+        try:
+            measurements = [
+                measure(dir=corpus_dir, query_engine=query_engine)
+                for _ in range(repeat)
+            ]
+        finally:
+            os.chdir(cwd)
+
+    return BenchmarkResult(
+        spec=spec,
+        repeat=repeat,
+        phases={
+            phase: statistics.median(elapsed[phase] for elapsed, _, _ in measurements)
+            for phase in PHASES
+        },
+        edges=measurements[0][1],
+        query_engine=query_engine,
+        strategies=measurements[-1][2],
+    )
+
+
+def compare(
+    result: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> list[str]:
+    """Compare phases with a baseline
+
+    Args:
+        result (dict[str, Any]): Current result
+        baseline (dict[str, Any]): Baseline result
+        threshold (float): Allowed ratio of slowdown
+
+    Returns:
+        list[str]: Phases that regressed
+    """
+    regressions: list[str] = []
+    if result["spec"] != baseline["spec"]:
+        print("Warning: corpus specifications differ from baseline", file=sys.stderr)
+
+    for phase in PHASES:
+        current = result["phases"].get(phase)
+        base = baseline["phases"].get(phase)
+        if current is None or not base:
+            continue
+        ratio = current / base
+        regressed = ratio > 1 + threshold
+        if regressed:
+            regressions.append(phase)
+        print(
+            f"{phase:<10} {base:10.4f}s -> {current:10.4f}s ({ratio - 1:+.1%})"
+            f"{'  REGRESSION' if regressed else ''}",
+            file=sys.stderr,
+        )
+    return regressions
+
+
+def create_parser() -> argparse.ArgumentParser:
+    spec = CorpusSpec()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--templates", type=int, default=spec.templates)
+    parser.add_argument("--cte-depth", type=int, default=spec.cte_depth)
+    parser.add_argument("--join-fanout", type=int, default=spec.join_fanout)
+    parser.add_argument("--params", type=int, default=spec.params)
+    parser.add_argument("--lines", type=int, default=spec.lines)
+    parser.add_argument(
+        "--mappings",
+        type=int,
+        default=spec.mappings,
+        help="mappings of missing templates added to mapping.yaml",
+    )
+    parser.add_argument(
+        "--tables", type=int, default=spec.tables, help="distinct upstairs tables"
+    )
+    parser.add_argument(
+        "--subquery-ratio",
+        type=float,
+        default=spec.subquery_ratio,
+        help="ratio of templates whose main query reads from a subquery",
+    )
+    parser.add_argument("--seed", type=int, default=spec.seed)
+    parser.add_argument(
+        "--query-engine",
+        choices=[engine.value for engine in QueryEngine],
+        default=QueryEngine.LEXER.value,
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--corpus-dir", help="keep a generated corpus here")
+    parser.add_argument("-o", "--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare with results of a previous run")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_DEFAULT)
+    return parser
+
+
+def main() -> None:
+    args = create_parser().parse_args()
+    spec = CorpusSpec(
+        templates=args.templates,
+        cte_depth=args.cte_depth,
+        join_fanout=args.join_fanout,
+        params=args.params,
+        lines=args.lines,
+        mappings=args.mappings,
+        tables=args.tables,
+        subquery_ratio=args.subquery_ratio,
+        seed=args.seed,
+    )
+    result = asdict(
+        run(
+            spec=spec,
+            repeat=args.repeat,
+            dir=args.corpus_dir,
+            query_engine=args.query_engine,
+        )
+    )
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(result=result, baseline=baseline, threshold=args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
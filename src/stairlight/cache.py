@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from logging import getLogger
+from typing import Any
+
+from src.stairlight.query import Query, ReferenceTuple, UpstairTableReference
+
+# Bump this when a change in rendering or parsing makes cached results stale
+CACHE_FORMAT_VERSION = "2"
+CACHE_FILE_SUFFIX = ".json"
+CACHE_MAX_SIZE_DEFAULT = 100 * 1024 * 1024
+
+QUERY_MEMO_MAX_ENTRIES_DEFAULT = 10000
+QUERY_MEMO_MAX_BYTES_DEFAULT = 64 * 1024 * 1024
+# Approximate bytes of objects which hold a reference, besides its strings
+QUERY_MEMO_REFERENCE_OVERHEAD = 200
+
+logger = getLogger(__name__)
+
+
+def normalize_params(value: Any) -> Any:
+    """Normalize parameters to be dumped as JSON with sorted keys
+
+    Dicts whose keys are not all strings, like ones with integer keys
+    from YAML, are converted to lists of pairs of key representations
+    and values, sorted by the representations.
+
+    Args:
+        value (Any): Parameters or a value of them
+
+    Returns:
+        Any: Normalized value
+    """
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value):
+            return {key: normalize_params(v) for key, v in value.items()}
+        return sorted([repr(key), normalize_params(v)] for key, v in value.items())
+    if isinstance(value, list):
+        return [normalize_params(v) for v in value]
+    return value
+
+
+class MappingCache:
+    """A persistent cache of upstairs table references"""
+
+    def __init__(self, dir: str, max_size: int | None = None) -> None:
+        """A persistent cache of upstairs table references
+
+        Each entry is a JSON file in the cache directory. When the total size
+        of entries exceeds max_size, least recently used entries are removed.
+
+        Args:
+            dir (str): A directory where cache files are saved.
+            max_size (int, optional):
+                Maximum total size of cache files in bytes.
+                Defaults to CACHE_MAX_SIZE_DEFAULT.
+        """
+        self.dir = dir
+        self.max_size = max_size or CACHE_MAX_SIZE_DEFAULT
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._lock = threading.Lock()
+        # File names and sizes, from least recently used to most recently used
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._size: int = 0
+
+        os.makedirs(self.dir, exist_ok=True)
+        stats: list[tuple[str, os.stat_result]] = [
+            (file_name, os.stat(os.path.join(self.dir, file_name)))
+            for file_name in os.listdir(self.dir)
+            if file_name.endswith(CACHE_FILE_SUFFIX)
+        ]
+        for file_name, stat in sorted(stats, key=lambda x: x[1].st_mtime):
+            self._entries[file_name] = stat.st_size
+            self._size += stat.st_size
+
+    @property
+    def hit_rate(self) -> float:
+        """Return a ratio of hits to lookups
+
+        Returns:
+            float: Hit rate
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def create_key(
+        uri: str,
+        template_str: str,
+        params: dict[str, Any],
+        ignore_params: list[str] | None,
+        default_table_prefix: str | None,
+        query_engine: str | None = None,
+    ) -> str:
+        """Create a cache key from inputs of rendering and parsing
+
+        Args:
+            uri (str): Template URI
+            template_str (str): Template string
+            params (dict[str, Any]): Merged parameters
+            ignore_params (list[str], optional): Ignore parameters
+            default_table_prefix (str, optional): Default table prefix
+            query_engine (str, optional): Query engine. Defaults to None.
+
+        Returns:
+            str: Cache key
+        """
+        h = hashlib.sha256()
+        for element in (
+            CACHE_FORMAT_VERSION,
+            uri,
+            template_str,
+            json.dumps(normalize_params(params), sort_keys=True, default=str),
+            json.dumps(ignore_params or []),
+            default_table_prefix or "",
+            query_engine or "",
+        ):
+            h.update(element.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> list[UpstairTableReference] | None:
+        """Get cached upstairs table references
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            list[UpstairTableReference] | None: Cached results if exists
+        """
+        file_name = key + CACHE_FILE_SUFFIX
+        path = os.path.join(self.dir, file_name)
+        with self._lock:
+            if file_name not in self._entries:
+                self.misses += 1
+                return None
+
+            try:
+                with open(path) as f:
+                    cached = json.load(f)
+            except (OSError, ValueError):
+                logger.warning(f"Cache file is broken: {path}")
+                self._remove(file_name=file_name)
+                self.misses += 1
+                return None
+
+            # Access times are kept in mtime for the next run
+            os.utime(path)
+            self._entries.move_to_end(file_name)
+            self.hits += 1
+
+        return [UpstairTableReference(**reference) for reference in cached]
+
+    def put(self, key: str, references: list[UpstairTableReference]) -> None:
+        """Save upstairs table references
+
+        Args:
+            key (str): Cache key
+            references (list[UpstairTableReference]): Upstairs table references
+        """
+        file_name = key + CACHE_FILE_SUFFIX
+        path = os.path.join(self.dir, file_name)
+        data = json.dumps([asdict(reference) for reference in references])
+
+        with self._lock:
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._size -= self._entries.pop(file_name, 0)
+            self._entries[file_name] = len(data.encode("utf-8"))
+            self._size += self._entries[file_name]
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the size fits max_size"""
+        while self._entries and self._size > self.max_size:
+            self._remove(file_name=next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, file_name: str) -> None:
+        """Remove a cache file
+
+        Args:
+            file_name (str): Cache file name
+        """
+        self._size -= self._entries.pop(file_name)
+        try:
+            os.remove(os.path.join(self.dir, file_name))
+        except FileNotFoundError:
+            pass
+
+
+class QueryMemo:
+    """An in-memory memo of upstairs table references by rendered queries"""
+
+    def __init__(
+        self, max_entries: int | None = None, max_bytes: int | None = None
+    ) -> None:
+        """An in-memory memo of upstairs table references by rendered queries
+
+        Templates which render to the same query, like copies of a file or
+        a template mapped to tables with the same parameters, are parsed once.
+        When the number of entries or their approximate size exceeds limits,
+        least recently used entries are removed.
+
+        Args:
+            max_entries (int, optional):
+                Maximum number of entries. 0 disables the memo.
+                Defaults to QUERY_MEMO_MAX_ENTRIES_DEFAULT.
+            max_bytes (int, optional):
+                Maximum approximate size of entries in bytes.
+                Defaults to QUERY_MEMO_MAX_BYTES_DEFAULT.
+        """
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._lock = threading.Lock()
+        # Keys and entries, from least recently used to most recently used
+        self._entries: OrderedDict[bytes, tuple[list[ReferenceTuple], int]] = (
+            OrderedDict()
+        )
+        self._size: int = 0
+        self.configure(max_entries=max_entries, max_bytes=max_bytes)
+
+    @property
+    def hit_rate(self) -> float:
+        """Return a ratio of hits to lookups
+
+        Returns:
+            float: Hit rate
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Return an approximate size of entries in bytes
+
+        Returns:
+            int: Size in bytes
+        """
+        return self._size
+
+    def configure(
+        self, max_entries: int | None = None, max_bytes: int | None = None
+    ) -> None:
+        """Set limits of the memo
+
+        Args:
+            max_entries (int, optional):
+                Maximum number of entries. 0 disables the memo.
+                Defaults to QUERY_MEMO_MAX_ENTRIES_DEFAULT.
+            max_bytes (int, optional):
+                Maximum approximate size of entries in bytes.
+                Defaults to QUERY_MEMO_MAX_BYTES_DEFAULT.
+        """
+        with self._lock:
+            self.max_entries = (
+                QUERY_MEMO_MAX_ENTRIES_DEFAULT if max_entries is None else max_entries
+            )
+            self.max_bytes = (
+                QUERY_MEMO_MAX_BYTES_DEFAULT if max_bytes is None else max_bytes
+            )
+            self._evict()
+
+    def clear(self) -> None:
+        """Remove all entries and reset statistics"""
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def create_key(query: Query) -> bytes:
+        """Create a key from a query and options of parsing
+
+        Args:
+            query (Query): SQL query
+
+        Returns:
+            bytes: Memo key
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for element in (
+            query.query_str,
+            query.default_table_prefix or "",
+            query.engine.value,
+        ):
+            h.update(element.encode("utf-8", "surrogatepass"))
+            h.update(b"\0")
+        return h.digest()
+
+    def detect_upstair_table_reference(
+        self, query: Query
+    ) -> list[UpstairTableReference]:
+        """Detect upstairs table references, or get them from the memo
+
+        Args:
+            query (Query): SQL query
+
+        Returns:
+            list[UpstairTableReference]: Upstairs table references
+        """
+        return [
+            UpstairTableReference(
+                TableName=table_name,
+                Line={"LineNumber": line_number, "LineString": line_string},
+            )
+            for table_name, line_number, line_string in self.get_reference_tuples(
+                query=query
+            )
+        ]
+
+    def get_reference_tuples(self, query: Query) -> list[ReferenceTuple]:
+        """Detect upstairs table references as tuples, or get them from the memo
+
+        Args:
+            query (Query): SQL query
+
+        Returns:
+            list[ReferenceTuple]: Table names, line numbers and line strings
+        """
+        if not self.max_entries:
+            return list(query.iterate_reference_tuples())
+
+        key = self.create_key(query=query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[0])
+            self.misses += 1
+
+        reference_tuples = list(query.iterate_reference_tuples())
+        size = len(key) + sum(
+            len(table_name) + len(line_string) + QUERY_MEMO_REFERENCE_OVERHEAD
+            for table_name, _, line_string in reference_tuples
+        )
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (reference_tuples, size)
+                self._size += size
+                self._evict()
+        return list(reference_tuples)
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until they fit limits"""
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._size > self.max_bytes
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+
+
+# Shared by all maps in a process
+query_memo = QueryMemo()
@@ -3,10 +3,12 @@ from __future__ import annotations
 import argparse
 import json
 import textwrap
-from typing import Any, Callable
+from dataclasses import asdict
+from typing import Any, Callable, Iterator, Mapping
 
 from src import stairlight
 from src.stairlight.map import MappedTemplate
+from src.stairlight.stairlight import SearchDirection
 
 
 def command_init(stairlight: stairlight.StairLight, args: argparse.Namespace) -> str:
@@ -57,7 +59,7 @@ def command_list(
 
 def command_up(
     stairlight: stairlight.StairLight, args: argparse.Namespace
-) -> dict[str, Any] | list[dict[str, Any]]:
+) -> dict[str, Any] | list[dict[str, Any]] | Iterator[dict[str, Any]]:
     """Execute up command
 
     Args:
@@ -65,10 +67,18 @@ def command_up(
         args (argparse.Namespace): CLI arguments
 
     Returns:
-        dict[str, Any] | list[dict[str, Any]]: Upstairs results
+        dict[str, Any] | list[dict[str, Any]] | Iterator[dict[str, Any]]:
+            Upstairs results, or records yielded while searching if --jsonl is set
     """
+    if args.jsonl:
+        return iterate_search(
+            stairlight=stairlight,
+            args=args,
+            tables=find_tables_to_search(stairlight=stairlight, args=args),
+            direction=SearchDirection.UP,
+        )
     return search(
-        func=stairlight.up,
+        func=stairlight.up_many,
         args=args,
         tables=find_tables_to_search(stairlight=stairlight, args=args),
     )
@@ -76,7 +86,7 @@ def command_up(
 
 def command_down(
     stairlight: stairlight.StairLight, args: argparse.Namespace
-) -> dict[str, Any] | list[dict[str, Any]]:
+) -> dict[str, Any] | list[dict[str, Any]] | Iterator[dict[str, Any]]:
     """Execute down command
 
     Args:
@@ -84,10 +94,18 @@ def command_down(
         args (argparse.Namespace): CLI arguments
 
     Returns:
-        dict[str, Any] | list[dict[str, Any]]: Downstairs results
+        dict[str, Any] | list[dict[str, Any]] | Iterator[dict[str, Any]]:
+            Downstairs results, or records yielded while searching if --jsonl is set
     """
+    if args.jsonl:
+        return iterate_search(
+            stairlight=stairlight,
+            args=args,
+            tables=find_tables_to_search(stairlight=stairlight, args=args),
+            direction=SearchDirection.DOWN,
+        )
     return search(
-        func=stairlight.down,
+        func=stairlight.down_many,
         args=args,
         tables=find_tables_to_search(stairlight=stairlight, args=args),
     )
@@ -96,29 +114,57 @@ def command_down(
 def search(
     func: Callable, args: argparse.Namespace, tables: str | list[str]
 ) -> dict[str, Any] | list[dict[str, Any]]:
-    """Search tables by executing stairlight.up() or stairlight.down()
+    """Search tables by executing stairlight.up_many() or stairlight.down_many()
 
     Args:
-        func (Callable): Either stairlight.up() or stairlight.down()
+        func (Callable): Either stairlight.up_many() or stairlight.down_many()
         args (argparse.Namespace): CLI arguments
         tables (str | list[str]): Tables to search
 
     Returns:
         dict[str, Any] | list[dict[str, Any]]: Results
     """
-    results = []
-    for table_name in tables:
-        result = func(
-            table_name=table_name,
-            recursive=args.recursive,
-            verbose=args.verbose,
-            response_type=args.output,
-        )
-        if len(tables) > 1:
-            results.append(result)
-        else:
-            return result
-    return results
+    if isinstance(tables, str):
+        tables = [tables]
+    results = func(
+        table_names=tables,
+        recursive=args.recursive or args.depth is not None,
+        verbose=args.verbose,
+        response_type=args.output,
+        depth=args.depth,
+    )
+    if len(tables) == 1:
+        return results[tables[0]]
+    return [results[table_name] for table_name in tables]
+
+
+def iterate_search(
+    stairlight: stairlight.StairLight,
+    args: argparse.Namespace,
+    tables: str | list[str],
+    direction: SearchDirection,
+) -> Iterator[dict[str, Any]]:
+    """Search tables by executing stairlight.iterate_search()
+
+    Args:
+        stairlight (StairLight): Stairlight class
+        args (argparse.Namespace): CLI arguments
+        tables (str | list[str]): Tables to search
+        direction (SearchDirection): Search direction
+
+    Yields:
+        Iterator[dict[str, Any]]: Records of references, with searched tables
+    """
+    if isinstance(tables, str):
+        tables = [tables]
+    depth = args.depth
+    if depth is None and not args.recursive:
+        depth = 1
+    for table_name in dict.fromkeys(tables):
+        for record in stairlight.iterate_search(
+            table_name=table_name, direction=direction, depth=depth
+        ):
+            yield {"SearchedTable": table_name, **asdict(record)}
 
 
 def find_tables_to_search(
@@ -143,6 +189,27 @@ def find_tables_to_search(
     return tables_to_search
 
 
+def positive_int(value: str) -> int:
+    """Convert an argument to an integer of 1 or more
+
+    Args:
+        value (str): Argument
+
+    Raises:
+        argparse.ArgumentTypeError: If it is not an integer of 1 or more
+
+    Returns:
+        int: Integer
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: '{value}'")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be 1 or more: '{value}'")
+    return number
+
+
 def set_general_parser(parser: argparse.ArgumentParser) -> None:
     """Set general arguments
 
@@ -183,6 +250,8 @@ def set_save_load_parser(parser: argparse.ArgumentParser) -> None:
             """\
             A file path where mapped results will be saved.
             You can choose from local file system, GCS, S3.
+            If the file suffix is '.jsonl', edges are saved as JSON lines
+            while mapping, without keeping the whole map in memory.
         """
         ),
         type=str,
@@ -201,6 +270,26 @@ def set_save_load_parser(parser: argparse.ArgumentParser) -> None:
     )
 
 
+def set_workers_parser(parser: argparse.ArgumentParser) -> None:
+    """Set arguments about concurrent executions
+
+    Args:
+        parser (argparse.ArgumentParser): ArgumentParser
+    """
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help=textwrap.dedent(
+            """\
+            The number of threads that process SQL templates concurrently.
+            It takes precedence over 'MaxWorkers' in stairlight.yaml.
+        """
+        ),
+        type=positive_int,
+        default=None,
+    )
+
+
 def set_search_parser(parser: argparse.ArgumentParser) -> None:
     """Set arguments used by up and down
 
@@ -246,6 +335,18 @@ def set_search_parser(parser: argparse.ArgumentParser) -> None:
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "--depth",
+        help="maximum depth to search recursively, implies --recursive",
+        type=positive_int,
+        default=None,
+    )
+    parser.add_argument(
+        "--jsonl",
+        help="write references as JSON lines while searching",
+        action="store_true",
+        default=False,
+    )
 
 
 def set_output_parser(parser: argparse.ArgumentParser) -> None:
@@ -282,6 +383,7 @@ def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="Stairlight", description=description)
     set_general_parser(parser=parser)
     set_save_load_parser(parser=parser)
+    set_workers_parser(parser=parser)
 
     subparsers = parser.add_subparsers()
 
@@ -303,12 +405,14 @@ def create_parser() -> argparse.ArgumentParser:
     )
     parser_check.set_defaults(handler=command_check)
     set_general_parser(parser=parser_check)
+    set_workers_parser(parser=parser_check)
 
     # list
     parser_list = subparsers.add_parser("list", help="return all ( tables | URIs )")
     parser_list.set_defaults(handler=command_list)
     set_general_parser(parser=parser_list)
     set_save_load_parser(parser=parser_list)
+    set_workers_parser(parser=parser_list)
     set_output_parser(parser=parser_list)
 
     # up
@@ -316,6 +420,7 @@ def create_parser() -> argparse.ArgumentParser:
     parser_up.set_defaults(handler=command_up)
     set_general_parser(parser=parser_up)
     set_save_load_parser(parser=parser_up)
+    set_workers_parser(parser=parser_up)
     set_output_parser(parser=parser_up)
     set_search_parser(parser=parser_up)
 
@@ -326,6 +431,7 @@ def create_parser() -> argparse.ArgumentParser:
     parser_down.set_defaults(handler=command_down)
     set_general_parser(parser=parser_down)
     set_save_load_parser(parser=parser_down)
+    set_workers_parser(parser=parser_down)
     set_output_parser(parser=parser_down)
     set_search_parser(parser=parser_down)
 
@@ -337,12 +443,15 @@ def main() -> None:
     parser = create_parser()
     args = parser.parse_args()
     _stairlight = stairlight.StairLight(
-        config_dir=args.config, load_files=args.load, save_file=args.save
+        config_dir=args.config,
+        load_files=args.load,
+        save_file=args.save,
+        max_workers=args.workers,
     )
     _stairlight.create_map()
 
     result_command: Any = None
-    result_mapped: dict[str, dict[str, list[MappedTemplate] | None] | None] = {}
+    result_mapped: Mapping[str, dict[str, list[MappedTemplate]]] = {}
     if hasattr(args, "handler"):
         if args.handler == command_init and _stairlight.has_stairlight_config():
             exit(f"'{args.config}/stairlight.y(a)ml' already exists.")
@@ -357,7 +466,10 @@ def main() -> None:
     if args.quiet or (not result_command and not result_mapped):
         return
 
-    if result_command and isinstance(result_command, str):
+    if isinstance(result_command, Iterator):
+        for record in result_command:
+            print(json.dumps(record), flush=True)
+    elif result_command and isinstance(result_command, str):
         print(result_command)
     elif result_command:
         print(json.dumps(result_command, indent=2))
@@ -197,6 +197,10 @@ class Configurator:
         mappings: list[MappingConfigMapping] = []
         detected_template: dict[str, Any]
         for detected_template in detected_templates:
+            # Templates which failed to be processed are already mapped
+            if MapKey.REASON in detected_template:
+                continue
+
             # Tables.Parameters
             parameters: OrderedDict = OrderedDict()
 
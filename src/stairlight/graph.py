@@ -0,0 +1,849 @@
+from __future__ import annotations
+
+import copy
+import json
+from array import array
+from collections.abc import Mapping
+from dataclasses import fields, is_dataclass
+from itertools import accumulate
+from typing import Any, Callable, Hashable, Iterator
+
+from src.stairlight.source.config_key import MapKey
+
+# Shapes of templates of an upstairs table, to restore loaded maps as they were
+SLOT_TEMPLATE_LIST = 0
+SLOT_TEMPLATE_SINGLE = 1
+SLOT_TEMPLATE_NONE = 2
+# Bytes of a block of a bitset, in which set bits are searched at once
+SET_BITS_BLOCK_BYTES = 64
+
+
+class Interner:
+    """A pool of values that gives each distinct value an integer id"""
+
+    __slots__ = ("_ids", "_values")
+
+    def __init__(self) -> None:
+        self._ids: dict[Hashable, int] = {}
+        self._values: list[Any] = []
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, id: int) -> Any:
+        return self._values[id]
+
+    def intern(self, value: Any, key: Hashable | None = None) -> int:
+        """Intern a value
+
+        Args:
+            value (Any): Value
+            key (Hashable, optional):
+                Key to identify the value if the value itself is not hashable.
+                Defaults to None, which means the value is used as key.
+
+        Returns:
+            int: Id of the value
+        """
+        if key is None:
+            key = value
+        id = self._ids.get(key)
+        if id is None:
+            id = len(self._values)
+            self._ids[key] = id
+            self._values.append(value)
+        return id
+
+    def get_id(self, key: Hashable) -> int | None:
+        """Get an id of an interned value
+
+        Args:
+            key (Hashable): Key of the value
+
+        Returns:
+            int | None: Id if the value has been interned
+        """
+        return self._ids.get(key)
+
+
+class TemplateRecord:
+    """Metadata of a mapped template, shared by edges of the template"""
+
+    __slots__ = ("factory", "names", "values")
+
+    def __init__(
+        self, factory: Callable[..., Any], names: tuple[str, ...], values: tuple
+    ) -> None:
+        """Metadata of a mapped template, shared by edges of the template
+
+        Args:
+            factory (Callable[..., Any]):
+                Class that the template is restored as, MappedTemplate or dict
+            names (tuple[str, ...]): Attribute names in order
+            values (tuple):
+                Attribute values. 'Uri' is kept as a name id and 'Lines' as None,
+                because lines belong to each edge.
+        """
+        self.factory = factory
+        self.names = names
+        self.values = values
+
+
+class DependencyGraph:
+    """A compact store of a dependency map
+
+    Table names and URIs are interned into integer ids. Adjacency is kept in
+    arrays of ids, where upstairs of the i-th table are
+    upstair_ids[upstair_starts[i]:upstair_starts[i + 1]], and templates of
+    the j-th upstairs slot are
+    edge_templates[template_starts[j]:template_starts[j + 1]].
+    Template metadata and lines are interned as well, so that they are kept once
+    however many edges refer to them.
+
+    Maps saved by older versions have a single template instead of a list of
+    templates, which is kept in slot_shapes to restore them as they were.
+
+    Upstairs slots are indexed in reverse as well, where slots whose upstairs
+    table has the id k are
+    downstair_slots[downstair_starts[k]:downstair_starts[k + 1]],
+    so that downstairs of a table are found without scanning all tables.
+    """
+
+    def __init__(self) -> None:
+        """A compact store of a dependency map"""
+        self._names = Interner()
+        self._templates = Interner()
+        self._lines = Interner()
+        self._attributes = Interner()
+
+        self._table_ids = array("i")
+        self._table_indexes: dict[int, int] = {}
+        self._upstair_starts = array("i", [0])
+        self._upstair_ids = array("i")
+        self._template_starts = array("i", [0])
+        self._slot_shapes = array("b")
+        self._edge_templates = array("i")
+        self._edge_lines = array("i")
+
+        self._slot_tables = array("i")
+        self._downstair_starts = array("i", [0])
+        self._downstair_slots = array("i")
+        # Transitive closures by direction, which are made on demand
+        self._closures: dict[bool, TransitiveClosure] = {}
+
+    @classmethod
+    def from_mapped(cls, mapped: Mapping[str, Any]) -> DependencyGraph:
+        """Create a graph from a dependency map
+
+        Args:
+            mapped (Mapping[str, Any]):
+                Dependency map whose templates are MappedTemplate or dict
+
+        Returns:
+            DependencyGraph: Graph
+        """
+        graph = cls()
+        for table_name, upstairs in mapped.items():
+            graph._table_indexes[graph._names.intern(table_name)] = len(
+                graph._table_ids
+            )
+            graph._table_ids.append(graph._names.intern(table_name))
+            for upstair_name, mapped_templates in (upstairs or {}).items():
+                graph._upstair_ids.append(graph._names.intern(upstair_name))
+                if mapped_templates is None:
+                    graph._slot_shapes.append(SLOT_TEMPLATE_NONE)
+                    mapped_templates = []
+                elif isinstance(mapped_templates, list):
+                    graph._slot_shapes.append(SLOT_TEMPLATE_LIST)
+                else:
+                    graph._slot_shapes.append(SLOT_TEMPLATE_SINGLE)
+                    mapped_templates = [mapped_templates]
+                for mapped_template in mapped_templates:
+                    if not mapped_template:
+                        continue
+                    template_id, lines_id = graph._intern_template(
+                        mapped_template=mapped_template
+                    )
+                    graph._edge_templates.append(template_id)
+                    graph._edge_lines.append(lines_id)
+                graph._template_starts.append(len(graph._edge_templates))
+            graph._upstair_starts.append(len(graph._upstair_ids))
+        graph._index_downstairs()
+        return graph
+
+    def __len__(self) -> int:
+        return len(self._table_ids)
+
+    @property
+    def edge_count(self) -> int:
+        """Return the number of edges, counted per template
+
+        Returns:
+            int: Edge count
+        """
+        return len(self._edge_templates)
+
+    def has_table(self, table_name: str) -> bool:
+        """Check if the table has an entry of upstairs
+
+        Args:
+            table_name (str): Table name
+
+        Returns:
+            bool: Has an entry or not
+        """
+        return self._find_table_index(table_name=table_name) is not None
+
+    def iterate_table_names(self) -> Iterator[str]:
+        """Iterate table names that have entries of upstairs
+
+        Yields:
+            Iterator[str]: Table names
+        """
+        for table_id in self._table_ids:
+            yield self._names[table_id]
+
+    def iterate_upstair_names(self) -> Iterator[str]:
+        """Iterate distinct upstairs table names
+
+        Yields:
+            Iterator[str]: Upstairs table names
+        """
+        for upstair_id in set(self._upstair_ids):
+            yield self._names[upstair_id]
+
+    def iterate_template_uris(self) -> Iterator[Any]:
+        """Iterate distinct URIs of templates
+
+        Yields:
+            Iterator[Any]: URIs
+        """
+        for template_id in set(self._edge_templates):
+            template: TemplateRecord = self._templates[template_id]
+            if MapKey.URI not in template.names:
+                continue
+            uri = template.values[template.names.index(MapKey.URI)]
+            yield self._names[uri] if isinstance(uri, int) else uri
+
+    def get_upstairs(
+        self, table_name: str, as_dict: bool = False
+    ) -> dict[str, list[Any]] | None:
+        """Get upstairs of a table
+
+        Args:
+            table_name (str): Table name
+            as_dict (bool, optional):
+                Return templates as dicts or not. Defaults to False,
+                which means they are restored as they were added.
+
+        Returns:
+            dict[str, list[Any]] | None:
+                Upstairs table names and templates, None if not found
+        """
+        table_index = self._find_table_index(table_name=table_name)
+        if table_index is None:
+            return None
+        return {
+            self._names[self._upstair_ids[slot]]: self._restore_slot(
+                slot=slot, as_dict=as_dict
+            )
+            for slot in range(
+                self._upstair_starts[table_index],
+                self._upstair_starts[table_index + 1],
+            )
+        }
+
+    def get_downstairs(
+        self, table_name: str, as_dict: bool = False
+    ) -> dict[str, list[Any]]:
+        """Get downstairs of a table, which have one template at least
+
+        Args:
+            table_name (str): Table name
+            as_dict (bool, optional):
+                Return templates as dicts or not. Defaults to False,
+                which means they are restored as they were added.
+
+        Returns:
+            dict[str, list[Any]]: Downstairs table names and templates
+        """
+        downstairs: dict[str, list[Any]] = {}
+        upstair_id = self._names.get_id(table_name)
+        if upstair_id is None or upstair_id + 1 >= len(self._downstair_starts):
+            return downstairs
+
+        for i in range(
+            self._downstair_starts[upstair_id], self._downstair_starts[upstair_id + 1]
+        ):
+            slot = self._downstair_slots[i]
+            if self._template_starts[slot] < self._template_starts[slot + 1]:
+                table_id = self._table_ids[self._slot_tables[slot]]
+                downstairs[self._names[table_id]] = self._restore_templates(
+                    slot=slot, as_dict=as_dict
+                )
+        return downstairs
+
+    def get_closure(
+        self, downstairs: bool = False, table_names: list[str] | None = None
+    ) -> TransitiveClosure:
+        """Get the transitive closure of references with templates
+
+        The closure of the whole graph is made at the first call and kept,
+        since the graph is not changed after it is created.
+
+        Args:
+            downstairs (bool, optional):
+                Follow references to downstairs or not. Defaults to False,
+                which means references to upstairs are followed.
+            table_names (list[str], optional):
+                Tables to start from. Defaults to None, which means all tables.
+                If they are set, only tables reachable from them are visited,
+                and the closure is not kept.
+
+        Returns:
+            TransitiveClosure: Transitive closure
+        """
+        if table_names is None and downstairs in self._closures:
+            return self._closures[downstairs]
+
+        successors: dict[int, list[int]] = {}
+        if table_names is None:
+            roots = list(range(len(self._names)))
+            for id in roots:
+                successors[id] = list(
+                    self._iterate_next_ids(id=id, downstairs=downstairs)
+                )
+        else:
+            roots = [
+                id for id in map(self._names.get_id, table_names) if id is not None
+            ]
+            ids_to_visit = list(roots)
+            while ids_to_visit:
+                id = ids_to_visit.pop()
+                if id in successors:
+                    continue
+                successors[id] = list(
+                    self._iterate_next_ids(id=id, downstairs=downstairs)
+                )
+                ids_to_visit.extend(successors[id])
+
+        closure = TransitiveClosure(
+            names=self._names, successors=successors, roots=roots
+        )
+        if table_names is None:
+            self._closures[downstairs] = closure
+        return closure
+
+    def to_mapped(self) -> dict[str, dict[str, list[Any]]]:
+        """Restore the whole dependency map
+
+        Returns:
+            dict[str, dict[str, list[Any]]]: Dependency map
+        """
+        return {
+            table_name: self.get_upstairs(table_name=table_name) or {}
+            for table_name in self.iterate_table_names()
+        }
+
+    def _iterate_next_ids(self, id: int, downstairs: bool) -> Iterator[int]:
+        """Iterate ids of next tables, which are referred with templates
+
+        Args:
+            id (int): Id of a table
+            downstairs (bool): Follow references to downstairs or not
+
+        Yields:
+            Iterator[int]: Ids of next tables
+        """
+        if downstairs:
+            if id + 1 >= len(self._downstair_starts):
+                return
+            for i in range(self._downstair_starts[id], self._downstair_starts[id + 1]):
+                slot = self._downstair_slots[i]
+                if self._template_starts[slot] < self._template_starts[slot + 1]:
+                    yield self._table_ids[self._slot_tables[slot]]
+            return
+
+        table_index = self._table_indexes.get(id)
+        if table_index is None:
+            return
+        for slot in range(
+            self._upstair_starts[table_index], self._upstair_starts[table_index + 1]
+        ):
+            if self._template_starts[slot] < self._template_starts[slot + 1]:
+                yield self._upstair_ids[slot]
+
+    def _index_downstairs(self) -> None:
+        """Index upstairs slots by ids of upstairs tables
+
+        Slots are sorted by counting, and slots of the same upstairs table
+        stay in the order of tables, as they are found by scanning all tables.
+        """
+        self._slot_tables = array("i")
+        for table_index in range(len(self._table_ids)):
+            count = (
+                self._upstair_starts[table_index + 1]
+                - self._upstair_starts[table_index]
+            )
+            self._slot_tables.extend([table_index] * count)
+
+        counts = [0] * (len(self._names) + 1)
+        for upstair_id in self._upstair_ids:
+            counts[upstair_id + 1] += 1
+        self._downstair_starts = array("i", accumulate(counts))
+        self._downstair_slots = array("i", [0]) * len(self._upstair_ids)
+        positions = self._downstair_starts.tolist()
+        for slot, upstair_id in enumerate(self._upstair_ids):
+            self._downstair_slots[positions[upstair_id]] = slot
+            positions[upstair_id] += 1
+
+    def _find_table_index(self, table_name: str) -> int | None:
+        """Find an index of the table in adjacency arrays
+
+        Args:
+            table_name (str): Table name
+
+        Returns:
+            int | None: Index if found
+        """
+        table_id = self._names.get_id(table_name)
+        if table_id is None:
+            return None
+        return self._table_indexes.get(table_id)
+
+    def _intern_template(self, mapped_template: Any) -> tuple[int, int]:
+        """Intern metadata and lines of a mapped template
+
+        Args:
+            mapped_template (Any): MappedTemplate or dict
+
+        Returns:
+            tuple[int, int]: Ids of the template and its lines
+        """
+        factory: Callable[..., Any]
+        attributes: dict[str, Any]
+        if is_dataclass(mapped_template):
+            factory = type(mapped_template)
+            attributes = {
+                f.name: getattr(mapped_template, f.name)
+                for f in fields(mapped_template)
+            }
+        else:
+            factory = dict
+            attributes = mapped_template
+
+        names: tuple[str, ...] = tuple(attributes.keys())
+        values: list[Any] = []
+        keys: list[Hashable] = []
+        for name, value in attributes.items():
+            if name == MapKey.LINES:
+                values.append(None)
+                keys.append(None)
+            elif name == MapKey.URI and isinstance(value, str):
+                values.append(self._names.intern(value))
+                keys.append(values[-1])
+            else:
+                shared_value, key = self._intern_attribute(value=value)
+                values.append(shared_value)
+                keys.append(key)
+
+        template_id = self._templates.intern(
+            TemplateRecord(factory=factory, names=names, values=tuple(values)),
+            key=(factory, names, tuple(keys)),
+        )
+
+        lines: tuple[tuple[str, Any], ...] = tuple(
+            self._intern_attribute(value=line)[1]
+            for line in attributes.get(MapKey.LINES) or []
+        )
+        return template_id, self._lines.intern(lines)
+
+    def _intern_attribute(self, value: Any) -> tuple[Any, tuple[str, Any]]:
+        """Intern an attribute value which may not be hashable
+
+        Args:
+            value (Any): Attribute value
+
+        Returns:
+            tuple[Any, tuple[str, Any]]: Shared value and its key
+        """
+        if isinstance(value, (dict, list)):
+            id = self._attributes.intern(
+                value, key=json.dumps(value, default=str, separators=(",", ":"))
+            )
+            return self._attributes[id], ("attribute", id)
+        return value, ("value", value)
+
+    def _restore_attribute(self, key: tuple[str, Any]) -> Any:
+        """Restore an attribute value from its key
+
+        Args:
+            key (tuple[str, Any]): Key made by _intern_attribute
+
+        Returns:
+            Any: Attribute value
+        """
+        kind, value = key
+        if kind == "attribute":
+            return copy.deepcopy(self._attributes[value])
+        return value
+
+    def _restore_slot(self, slot: int, as_dict: bool) -> Any:
+        """Restore templates of an upstairs slot in the shape they were added
+
+        Args:
+            slot (int): Index of the upstairs slot
+            as_dict (bool):
+                Return templates as dicts or not. If it is True, templates are
+                always returned as a list.
+
+        Returns:
+            Any: Templates
+        """
+        templates = self._restore_templates(slot=slot, as_dict=as_dict)
+        if as_dict or self._slot_shapes[slot] == SLOT_TEMPLATE_LIST:
+            return templates
+        elif self._slot_shapes[slot] == SLOT_TEMPLATE_SINGLE:
+            return templates[0] if templates else {}
+        return None
+
+    def _restore_templates(self, slot: int, as_dict: bool) -> list[Any]:
+        """Restore templates of an upstairs slot
+
+        Args:
+            slot (int): Index of the upstairs slot
+            as_dict (bool): Return templates as dicts or not
+
+        Returns:
+            list[Any]: Templates
+        """
+        results: list[Any] = []
+        for i in range(self._template_starts[slot], self._template_starts[slot + 1]):
+            template: TemplateRecord = self._templates[self._edge_templates[i]]
+            attributes: dict[str, Any] = {}
+            for name, value in zip(template.names, template.values):
+                if name == MapKey.LINES:
+                    value = [
+                        self._restore_attribute(key=line_key)
+                        for line_key in self._lines[self._edge_lines[i]]
+                    ]
+                elif name == MapKey.URI and isinstance(value, int):
+                    value = self._names[value]
+                elif isinstance(value, (dict, list)):
+                    value = copy.deepcopy(value)
+                attributes[name] = value
+
+            if as_dict or template.factory is dict:
+                results.append(attributes)
+            else:
+                results.append(template.factory(**attributes))
+        return results
+
+
+class DependencyGraphBuilder:
+    """Builds a dependency graph from edges as they are mapped
+
+    Templates and lines are interned as soon as edges are added, so that
+    a nested dict of mapped templates is not made before the graph.
+    Edges are added in the same way as Map.remap writes a dict, where
+    a line is added to every template of the upstairs table.
+    """
+
+    __slots__ = ("_pool", "_tables")
+
+    def __init__(self) -> None:
+        """Builds a dependency graph from edges as they are mapped"""
+        # Names, templates and lines interned so far
+        self._pool = DependencyGraph()
+        # Upstairs slots by table ids, and lists of [template id, line keys]
+        self._tables: dict[int, dict[int, list[tuple[int, list[Hashable]]]]] = {}
+
+    def add_table(self, table_name: str) -> bool:
+        """Add a table, which is kept in order of being added
+
+        Args:
+            table_name (str): Table name
+
+        Returns:
+            bool: The table has upstairs already or not
+        """
+        upstairs = self._tables.setdefault(self._pool._names.intern(table_name), {})
+        return bool(upstairs)
+
+    def add_edge(
+        self,
+        table_name: str,
+        upstair_name: str,
+        mapped_template: Any,
+        line: Any,
+        replace: bool = False,
+    ) -> None:
+        """Add an edge of a template and a line to an upstairs table
+
+        Args:
+            table_name (str): Table name, which has been added
+            upstair_name (str): Upstairs table name
+            mapped_template (Any): MappedTemplate or dict, whose lines are ignored
+            line (Any): Line which refers to the upstairs table
+            replace (bool, optional):
+                Replace templates of the upstairs table or not.
+                Defaults to False, which means the template is appended.
+        """
+        upstairs = self._tables[self._pool._names.get_id(table_name)]
+        upstair_id = self._pool._names.intern(upstair_name)
+        template_id, _ = self._pool._intern_template(mapped_template=mapped_template)
+        edges = upstairs.get(upstair_id) if not replace else None
+        if edges is None:
+            edges = upstairs[upstair_id] = []
+        edges.append((template_id, []))
+
+        line_key = self._pool._intern_attribute(value=line)[1]
+        for _, line_keys in edges:
+            if line_key not in line_keys:
+                line_keys.append(line_key)
+
+    def build(self) -> DependencyGraph:
+        """Build the graph, leaving out tables without upstairs
+
+        Names and templates are interned again in order of tables, so that
+        the graph is the same as the one made by from_mapped.
+
+        Returns:
+            DependencyGraph: Graph
+        """
+        pool = self._pool
+        graph = DependencyGraph()
+        graph._attributes = pool._attributes
+        template_ids: dict[int, int] = {}
+        for table_id, upstairs in self._tables.items():
+            if not upstairs:
+                continue
+            graph._table_indexes[graph._names.intern(pool._names[table_id])] = len(
+                graph._table_ids
+            )
+            graph._table_ids.append(graph._names.intern(pool._names[table_id]))
+            for upstair_id, edges in upstairs.items():
+                graph._upstair_ids.append(graph._names.intern(pool._names[upstair_id]))
+                graph._slot_shapes.append(SLOT_TEMPLATE_LIST)
+                for template_id, line_keys in edges:
+                    if template_id not in template_ids:
+                        template_ids[template_id] = self._move_template(
+                            graph=graph, template_id=template_id
+                        )
+                    graph._edge_templates.append(template_ids[template_id])
+                    graph._edge_lines.append(graph._lines.intern(tuple(line_keys)))
+                graph._template_starts.append(len(graph._edge_templates))
+            graph._upstair_starts.append(len(graph._upstair_ids))
+        graph._index_downstairs()
+        self._pool = DependencyGraph()
+        self._tables = {}
+        return graph
+
+    def _move_template(self, graph: DependencyGraph, template_id: int) -> int:
+        """Intern a template of the pool into a graph
+
+        Args:
+            graph (DependencyGraph): Graph
+            template_id (int): Id of the template in the pool
+
+        Returns:
+            int: Id of the template in the graph
+        """
+        template: TemplateRecord = self._pool._templates[template_id]
+        values = tuple(
+            (
+                graph._names.intern(self._pool._names[value])
+                if name == MapKey.URI and isinstance(value, int)
+                else value
+            )
+            for name, value in zip(template.names, template.values)
+        )
+        return graph._templates.intern(
+            TemplateRecord(
+                factory=template.factory, names=template.names, values=values
+            ),
+            key=template_id,
+        )
+
+
+def iterate_set_bits(bits: int) -> Iterator[int]:
+    """Iterate indexes of set bits of an integer in ascending order
+
+    Set bits are taken from blocks of the integer one by one, so that each
+    operation is on a small integer, and blocks without set bits are skipped.
+
+    Args:
+        bits (int): A non-negative integer
+
+    Yields:
+        Iterator[int]: Indexes of set bits
+    """
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for start in range(0, len(data), SET_BITS_BLOCK_BYTES):
+        end = start + SET_BITS_BLOCK_BYTES
+        block = int.from_bytes(data[start:end], "little")
+        while block:
+            low = block & -block
+            yield start * 8 + low.bit_length() - 1
+            block ^= low
+
+
+class TransitiveClosure:
+    """Tables reachable from each table, computed over strongly connected components
+
+    Strongly connected components(SCC) are found by Tarjan's algorithm, which
+    numbers them in reverse topological order of the condensation DAG.
+    Components reachable from each component are kept as a bitset in an int,
+    made from bitsets of its successors, which have smaller numbers.
+    """
+
+    def __init__(
+        self,
+        names: Interner,
+        successors: dict[int, list[int]],
+        roots: list[int],
+    ) -> None:
+        """Tables reachable from each table, computed over strongly connected components
+
+        Args:
+            names (Interner): Names of tables by id
+            successors (dict[int, list[int]]):
+                Ids of next tables by id, of all tables reachable from roots
+            roots (list[int]): Ids of tables to start from
+        """
+        self._names = names
+        self._components = array("i", [-1]) * len(names)
+        self._members: list[list[int]] = []
+        self._reachable: list[int] = []
+        self.cycles: list[list[str]] = []
+        self._find_components(successors=successors, roots=roots)
+
+        for component, members in enumerate(self._members):
+            reachable = 0
+            for member in members:
+                for successor in successors[member]:
+                    next_component = self._components[successor]
+                    reachable |= 1 << next_component
+                    # A component reaches itself if it has a cycle
+                    if next_component != component:
+                        reachable |= self._reachable[next_component]
+            self._reachable.append(reachable)
+            if reachable >> component & 1:
+                self.cycles.append(sorted(self._names[member] for member in members))
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def get_reachable_tables(self, table_name: str) -> list[str]:
+        """Get tables reachable from a table, except the table itself
+
+        Args:
+            table_name (str): Table name, which is reachable from roots
+
+        Returns:
+            list[str]: Table names in ascending order
+        """
+        table_id = self._names.get_id(table_name)
+        if (
+            table_id is None
+            or table_id >= len(self._components)
+            or self._components[table_id] < 0
+        ):
+            return []
+
+        table_names: list[str] = []
+        for component in iterate_set_bits(
+            bits=self._reachable[self._components[table_id]]
+        ):
+            table_names.extend(
+                self._names[member]
+                for member in self._members[component]
+                if member != table_id
+            )
+        return sorted(table_names)
+
+    def _find_components(
+        self, successors: dict[int, list[int]], roots: list[int]
+    ) -> None:
+        """Find strongly connected components without recursion
+
+        Args:
+            successors (dict[int, list[int]]): Ids of next tables by id
+            roots (list[int]): Ids of tables to start from
+        """
+        indexes = array("i", [-1]) * len(self._components)
+        lowlinks = array("i", [0]) * len(self._components)
+        on_stack = bytearray(len(self._components))
+        stack: list[int] = []
+        count = 0
+        for root in roots:
+            if indexes[root] >= 0:
+                continue
+            # Tables being visited and positions of their next tables
+            work: list[tuple[int, int]] = [(root, 0)]
+            indexes[root] = lowlinks[root] = count
+            count += 1
+            stack.append(root)
+            on_stack[root] = 1
+            while work:
+                node, position = work[-1]
+                if position < len(successors[node]):
+                    work[-1] = (node, position + 1)
+                    successor = successors[node][position]
+                    if indexes[successor] < 0:
+                        indexes[successor] = lowlinks[successor] = count
+                        count += 1
+                        stack.append(successor)
+                        on_stack[successor] = 1
+                        work.append((successor, 0))
+                    elif on_stack[successor]:
+                        lowlinks[node] = min(lowlinks[node], indexes[successor])
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+                if lowlinks[node] == indexes[node]:
+                    members: list[int] = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        self._components[member] = len(self._members)
+                        members.append(member)
+                        if member == node:
+                            break
+                    self._members.append(members)
+
+
+class MappedView(Mapping):
+    """A read-only view of a graph in the shape of a dependency map dict
+
+    Values are restored from the graph every time they are accessed,
+    so changes to them are not reflected in the graph.
+    """
+
+    def __init__(self, graph: DependencyGraph) -> None:
+        """A read-only view of a graph in the shape of a dependency map dict
+
+        Args:
+            graph (DependencyGraph): Graph
+        """
+        self._graph = graph
+
+    def __getitem__(self, table_name: str) -> dict[str, list[Any]]:
+        upstairs = self._graph.get_upstairs(table_name=table_name)
+        if upstairs is None:
+            raise KeyError(table_name)
+        return upstairs
+
+    def __iter__(self) -> Iterator[str]:
+        return self._graph.iterate_table_names()
+
+    def __len__(self) -> int:
+        return len(self._graph)
+
+    def __contains__(self, table_name: object) -> bool:
+        return isinstance(table_name, str) and self._graph.has_table(
+            table_name=table_name
+        )
@@ -0,0 +1,311 @@
+from __future__ import annotations
+
+import codecs
+import hashlib
+import io
+import locale
+import mmap
+import os
+from bisect import bisect_right
+from collections import deque
+from logging import getLogger
+from string import Template as StringTemplate
+from typing import Any, Iterator
+
+from src.stairlight.query import (
+    ReferenceTuple,
+    UpstairTableReference,
+    solve_table_prefix,
+)
+from src.stairlight.source.template import Template
+from src.stairlight.sql_lexer import LineIndex, QueryLexer
+
+# Files of this size or larger are parsed in chunks
+LARGE_FILE_THRESHOLD_DEFAULT = 16 * 1024 * 1024
+LARGE_FILE_CHUNK_SIZE_DEFAULT = 4 * 1024 * 1024
+JINJA_EXPRESSION_START = b"{{"
+
+logger = getLogger(__name__)
+
+
+def open_mapped_file(path: str) -> mmap.mmap | None:
+    """Map a file into memory for reading
+
+    Args:
+        path (str): File path
+
+    Returns:
+        mmap.mmap | None: Mapped file, None if the file is empty
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        # The mapping is kept after the file is closed
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def has_jinja_expressions(path: str) -> bool:
+    """Check if a file contains jinja expressions without reading it entirely
+
+    Args:
+        path (str): File path
+
+    Returns:
+        bool: Whether '{{' is found
+    """
+    mapped = open_mapped_file(path=path)
+    if not mapped:
+        return False
+    with mapped:
+        return mapped.find(JINJA_EXPRESSION_START) >= 0
+
+
+def digest_file(path: str) -> str:
+    """Calculate a digest of a file contents, which identifies a large template
+
+    Args:
+        path (str): File path
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    mapped = open_mapped_file(path=path)
+    if mapped:
+        with mapped:
+            digest.update(mapped)
+    return digest.hexdigest()
+
+
+def iterate_file_chunks(
+    path: str, chunk_size: int = LARGE_FILE_CHUNK_SIZE_DEFAULT
+) -> Iterator[str]:
+    """Read a file in chunks of whole lines
+
+    Chunks are decoded in the same way as a file opened in text mode,
+    so that joined chunks are equal to the file contents read at once.
+
+    Args:
+        path (str): File path
+        chunk_size (int, optional):
+            Bytes read at once. Defaults to LARGE_FILE_CHUNK_SIZE_DEFAULT.
+
+    Yields:
+        Iterator[str]: Chunks which end with a line break, except the last one
+    """
+    decoder = io.IncrementalNewlineDecoder(
+        codecs.getincrementaldecoder(locale.getpreferredencoding(False))(),
+        translate=True,
+    )
+    # A line which continues in the next chunk
+    rest = ""
+    mapped = open_mapped_file(path=path)
+    if mapped:
+        with mapped:
+            for start in range(0, len(mapped), chunk_size):
+                end = start + chunk_size
+                text = rest + decoder.decode(mapped[start:end])
+                cut = text.rfind("\n") + 1
+                if cut:
+                    yield text[:cut]
+                rest = text[cut:]
+    text = rest + decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def has_invalid_placeholders(template_str: str) -> bool:
+    """Check if string.Template fails to substitute a template string
+
+    Args:
+        template_str (str): Template string
+
+    Returns:
+        bool: Whether it has placeholders like '$1'
+    """
+    return any(
+        match.group("invalid") is not None
+        for match in StringTemplate.pattern.finditer(template_str)
+    )
+
+
+class LargeFileQuery:
+    """A query in a large file, which is rendered and parsed in chunks"""
+
+    def __init__(
+        self,
+        template: Template,
+        path: str,
+        params: dict[str, Any],
+        ignore_params: list[str] | None = None,
+        chunk_size: int | None = None,
+    ) -> None:
+        """A query in a large file, which is rendered and parsed in chunks
+
+        The file is read twice with a memory map. Tables are extracted with
+        the lexer in the first pass, and lines which contain them out of
+        comments and strings are found in the second pass. Only chunks which
+        have not been scanned are held, besides the results.
+
+        Args:
+            template (Template): Query template without jinja expressions
+            path (str): A local file path of the template
+            params (dict[str, Any]): Parameters of string.Template
+            ignore_params (list[str], optional):
+                Ignore parameters. Defaults to None.
+            chunk_size (int, optional):
+                Bytes read at once. Defaults to LARGE_FILE_CHUNK_SIZE_DEFAULT.
+        """
+        self.template = template
+        self.path = path
+        self.params = params
+        self.ignore_params = ignore_params
+        self.chunk_size = chunk_size or LARGE_FILE_CHUNK_SIZE_DEFAULT
+
+    def detect_upstair_table_reference(self) -> Iterator[UpstairTableReference]:
+        """Parse the query and detect upstream table references
+
+        Yields:
+            Iterator[UpstairTableReference]: upstream table results
+        """
+        for table_name, line_number, line_string in self.iterate_reference_tuples():
+            yield UpstairTableReference(
+                TableName=table_name,
+                Line={"LineNumber": line_number, "LineString": line_string},
+            )
+
+    def iterate_reference_tuples(self) -> Iterator[ReferenceTuple]:
+        """Parse the query and detect upstream table references as tuples
+
+        Yields:
+            Iterator[ReferenceTuple]: Table name, line number and line string
+        """
+        params: dict[str, Any] | None = self.params
+        lexer = self.lex(params=params)
+        if not lexer:
+            # A whole template is left unrendered, as Template.render does
+            logger.warning(
+                f"Query rendering failed. "
+                f"source_type: {self.template.source_type}, "
+                f"key: {self.template.key}"
+            )
+            params = None
+            lexer = self.lex(params=params)
+
+        tables = sorted(lexer.tables)
+        lines: dict[str, list[tuple[int, str]]] = {table: [] for table in tables}
+        # Chunks are searched after comments and strings in them are scanned
+        finder = QueryLexer()
+        pending: deque[tuple[int, int, LineIndex]] = deque()
+        offset = 0
+        line_count = 0
+        for rendered_str in self.iterate_rendered_chunks(params=params):
+            line_index = LineIndex(query_str=rendered_str)
+            pending.append((offset, line_count, line_index))
+            offset += len(rendered_str)
+            line_count += len(line_index)
+            finder.feed(text=rendered_str)
+            self.find_lines(finder=finder, pending=pending, lines=lines)
+        finder.feed(text="", final=True)
+        self.find_lines(finder=finder, pending=pending, lines=lines)
+
+        for table in tables:
+            table_name = (
+                solve_table_prefix(
+                    table=table,
+                    default_table_prefix=self.template.default_table_prefix,
+                )
+                if self.template.default_table_prefix
+                else table
+            ).replace("`", "")
+            for line_number, line_string in lines[table]:
+                yield table_name, line_number, line_string
+
+    @staticmethod
+    def find_lines(
+        finder: QueryLexer,
+        pending: deque[tuple[int, int, LineIndex]],
+        lines: dict[str, list[tuple[int, str]]],
+    ) -> None:
+        """Find lines which contain tables in chunks which have been scanned
+
+        Args:
+            finder (QueryLexer): A lexer which scans the same chunks
+            pending (deque[tuple[int, int, LineIndex]]):
+                Offsets, line counts before them and line indexes of chunks
+            lines (dict[str, list[tuple[int, str]]]):
+                Line numbers and line strings found by tables
+        """
+        while pending:
+            offset, line_count, line_index = pending[0]
+            rendered_str = line_index.query_str
+            if offset + len(rendered_str) > finder.scanned_offset:
+                return
+            pending.popleft()
+
+            for table, table_lines in lines.items():
+                position = rendered_str.find(table)
+                while position >= 0:
+                    span_index = bisect_right(finder.ignored_starts, offset + position)
+                    if (
+                        span_index == 0
+                        or finder.ignored_ends[span_index - 1] <= offset + position
+                    ):
+                        index = line_index.find(offset=position)
+                        line_number = line_count + index + 1
+                        if not table_lines or table_lines[-1][0] != line_number:
+                            table_lines.append(
+                                (line_number, line_index.get_line(line_index=index))
+                            )
+                    position = rendered_str.find(table, position + 1)
+            finder.discard_ignored_spans(before=offset + len(rendered_str))
+
+    def lex(self, params: dict[str, Any] | None) -> QueryLexer | None:
+        """Extract upstairs tables from rendered chunks
+
+        Args:
+            params (dict[str, Any] | None): Parameters of string.Template
+
+        Returns:
+            QueryLexer | None:
+                A lexer which has scanned the query,
+                None if a chunk fails to be rendered with the parameters
+        """
+        lexer = QueryLexer()
+        try:
+            for rendered_str in self.iterate_rendered_chunks(params=params):
+                lexer.feed(text=rendered_str)
+                lexer.discard_ignored_spans(before=lexer.scanned_offset)
+        except ValueError:
+            return None
+        lexer.feed(text="", final=True)
+        return lexer
+
+    def iterate_rendered_chunks(self, params: dict[str, Any] | None) -> Iterator[str]:
+        """Render chunks of the template
+
+        Args:
+            params (dict[str, Any] | None): Parameters of string.Template
+
+        Raises:
+            ValueError: A chunk has invalid placeholders
+
+        Yields:
+            Iterator[str]: Rendered chunks
+        """
+        for chunk in iterate_file_chunks(path=self.path, chunk_size=self.chunk_size):
+            if (
+                params
+                and not self.template.IS_COMPILED
+                and has_invalid_placeholders(
+                    template_str=Template.ignore_string_template_params(
+                        template_str=chunk, ignore_params=self.ignore_params
+                    )
+                )
+            ):
+                raise ValueError(f"Invalid placeholders are found: {self.path}")
+            yield self.template.render(
+                params=params or {},
+                ignore_params=self.ignore_params,
+                template_str=chunk,
+            )
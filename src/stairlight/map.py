@@ -1,10 +1,21 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import os
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from logging import getLogger
 from typing import Any, Iterator, OrderedDict, Type
 
-from src.stairlight.query import Query, UpstairTableReference
+from src.stairlight.cache import MappingCache, query_memo
+from src.stairlight.graph import DependencyGraphBuilder
+from src.stairlight.large_file import (
+    LARGE_FILE_THRESHOLD_DEFAULT,
+    LargeFileQuery,
+    digest_file,
+    has_jinja_expressions,
+)
+from src.stairlight.query import Query, ReferenceTuple, UpstairTableReference
+from src.stairlight.sink import EdgeSink
 from src.stairlight.source.config import (
     MappingConfig,
     MappingConfigGlobal,
@@ -13,7 +24,26 @@ from src.stairlight.source.config import (
 )
 from src.stairlight.source.config_key import MapKey, MappingConfigKey
 from src.stairlight.source.controller import get_template_source_class
-from src.stairlight.source.template import Template, TemplateSource, TemplateSourceType
+from src.stairlight.source.template import (
+    Template,
+    TemplateSource,
+    TemplateSourceType,
+    TemplateStrStore,
+    jinja_environment,
+)
+from src.stairlight.worker import (
+    PROCESS_CHUNK_SIZE_DEFAULT,
+    RenderParseWorkUnit,
+    SupervisedWorkerPool,
+    WorkFailure,
+    configure_worker_process,
+    create_work_unit,
+    process_work_unit,
+    to_upstair_table_references,
+)
+
+# Chunks of work units sent to worker processes at once, per process
+PROCESS_BATCH_CHUNKS = 4
 
 logger = getLogger(__name__)
 
@@ -43,6 +73,111 @@ class MappedTemplateRedash(MappedTemplate):
     DataSourceType: str | None = None
 
 
+def restore_mapped_template(mapped_template: dict[str, Any]) -> MappedTemplate:
+    """Restore a mapped template from a dict
+
+    Args:
+        mapped_template (dict[str, Any]): Mapped template as dict
+
+    Returns:
+        MappedTemplate: Mapped template
+    """
+    if "BucketName" in mapped_template:
+        return MappedTemplateObjectStorage(**mapped_template)
+    elif "DataSourceType" in mapped_template:
+        return MappedTemplateRedash(**mapped_template)
+    return MappedTemplate(**mapped_template)
+
+
+@dataclass
+class MappedTableReferences:
+    table_attributes: MappingConfigMappingTable
+    upstair_table_references: list[UpstairTableReference]
+    # Why references are not found, like exceeding a time limit
+    failure: str | None = None
+
+
+@dataclass
+class TemplateMappingResult:
+    template: Template
+    unmapped_params: list[list[str]] = field(default_factory=list)
+    mapped_table_references: list[MappedTableReferences] = field(default_factory=list)
+
+
+@dataclass
+class PendingTemplateWork:
+    index: int
+    work_unit: RenderParseWorkUnit
+    cache_key: str
+
+
+@dataclass
+class PendingTemplate:
+    result: TemplateMappingResult
+    works: list[PendingTemplateWork] = field(default_factory=list)
+
+
+@dataclass
+class MappingTablePlan:
+    params: dict[str, Any]
+    param_keys: frozenset[str]
+    ignore_params: frozenset[str]
+
+
+class MappingPlan:
+    """Precomputed parameters and labels of a mapping configuration"""
+
+    def __init__(
+        self, mapping_config: MappingConfig, global_params: dict[str, Any]
+    ) -> None:
+        """Precomputed parameters and labels of a mapping configuration
+
+        Args:
+            mapping_config (MappingConfig): Mapping configurations
+            global_params (dict[str, Any]): Global parameters
+        """
+        self.global_params = global_params
+
+        # The first entry takes precedence if a table name is duplicated
+        self.extra_labels: dict[str, dict[str, Any]] = {}
+        for extra_label in mapping_config.ExtraLabels or []:
+            self.extra_labels.setdefault(
+                extra_label.get(MappingConfigKey.TABLE_NAME),
+                extra_label.get(MappingConfigKey.LABELS, {}),
+            )
+
+        # Table attributes are kept to pin their ids
+        self._table_plans: dict[
+            int, tuple[MappingConfigMappingTable, MappingTablePlan]
+        ] = {}
+
+    def get_table_plan(
+        self, table_attributes: MappingConfigMappingTable
+    ) -> MappingTablePlan:
+        """Get a plan of table attributes, built at the first call
+
+        Args:
+            table_attributes (MappingConfigMappingTable): Table attributes
+
+        Returns:
+            MappingTablePlan: Merged parameters, their keys and ignore parameters
+        """
+        cached = self._table_plans.get(id(table_attributes))
+        if cached:
+            return cached[1]
+
+        params = Map.merge_global_params(
+            table_attributes=table_attributes, global_params=self.global_params
+        )
+        table_plan = MappingTablePlan(
+            params=params,
+            param_keys=frozenset(create_dict_key_list(d=params)),
+            ignore_params=frozenset(table_attributes.IgnoreParameters or []),
+        )
+        self._table_plans[id(table_attributes)] = (table_attributes, table_plan)
+        return table_plan
+
+
 class Map:
     """Manages functions related to dependency map objects"""
 
@@ -51,6 +186,17 @@ class Map:
         stairlight_config: StairlightConfig,
         mapping_config: MappingConfig,
         mapped: dict[str, dict[str, list[MappedTemplate]] | None] | None = None,
+        max_workers: int | None = None,
+        cache: MappingCache | None = None,
+        edge_sink: EdgeSink | None = None,
+        max_processes: int | None = None,
+        process_chunk_size: int | None = None,
+        query_engine: str | None = None,
+        large_file_threshold: int | None = None,
+        large_file_chunk_size: int | None = None,
+        template_time_limit: float | None = None,
+        template_memory_limit: int | None = None,
+        graph_builder: DependencyGraphBuilder | None = None,
     ) -> None:
         """Manages functions related to dependency map objects
 
@@ -60,6 +206,42 @@ class Map:
                 Mapping configurations.
             mapped (dict[str, Any], optional):
                 Mapped templates. Defaults to None.
+            max_workers (int, optional):
+                The number of threads that process templates concurrently.
+                If it is None or less than 2, templates are processed serially.
+                Defaults to None.
+            cache (MappingCache, optional):
+                A cache of upstairs table references. Defaults to None.
+            edge_sink (EdgeSink, optional):
+                If it is set, edges are written to the sink as soon as they are
+                resolved, instead of being kept in 'mapped'. Defaults to None.
+            max_processes (int, optional):
+                The number of processes that render and parse templates.
+                If it is 2 or more, it takes precedence over max_workers.
+                Defaults to None.
+            process_chunk_size (int, optional):
+                The number of work units sent to a process at once.
+                Defaults to PROCESS_CHUNK_SIZE_DEFAULT.
+            query_engine (str, optional):
+                An engine which extracts upstairs tables from queries.
+                Defaults to None, which means QUERY_ENGINE_DEFAULT.
+            large_file_threshold (int, optional):
+                Local files of this size or larger in bytes are parsed in chunks,
+                unless they have jinja expressions. 0 disables it.
+                Defaults to LARGE_FILE_THRESHOLD_DEFAULT.
+            large_file_chunk_size (int, optional):
+                Bytes of a large file read at once.
+                Defaults to LARGE_FILE_CHUNK_SIZE_DEFAULT.
+            template_time_limit (float, optional):
+                Maximum seconds of rendering and parsing a template for a table.
+                If it or template_memory_limit is set, templates are processed
+                in supervised processes. Defaults to None.
+            template_memory_limit (int, optional):
+                Maximum size of the address space of a process which renders
+                and parses templates in bytes. Defaults to None.
+            graph_builder (DependencyGraphBuilder, optional):
+                If it is set, edges are added to the builder as soon as they are
+                resolved, instead of being kept in 'mapped'. Defaults to None.
         """
         if mapped:
             self.mapped = mapped
@@ -68,14 +250,296 @@ class Map:
         self.unmapped: list[dict] = []
         self._stairlight_config = stairlight_config
         self._mapping_config = mapping_config
+        self._max_workers = max_workers
+        self._max_processes = max_processes
+        self._process_chunk_size = process_chunk_size or PROCESS_CHUNK_SIZE_DEFAULT
+        self._cache = cache
+        self._query_engine = query_engine
+        self._large_file_threshold = (
+            LARGE_FILE_THRESHOLD_DEFAULT
+            if large_file_threshold is None
+            else large_file_threshold
+        )
+        self._large_file_chunk_size = large_file_chunk_size
+        self._template_time_limit = template_time_limit
+        self._template_memory_limit = template_memory_limit
+        # Paths of large files and their digests by URIs of templates
+        self._large_file_paths: dict[str, str | None] = {}
+        self._large_file_digests: dict[str, str] = {}
+        self._plan: MappingPlan | None = (
+            MappingPlan(
+                mapping_config=mapping_config, global_params=self.get_global_params()
+            )
+            if mapping_config
+            else None
+        )
+        self.template_str_store = TemplateStrStore()
+        self._edge_sink = edge_sink
+        self._graph_builder = graph_builder
+        # URIs of templates and names of upstairs tables written to the sink
+        self.streamed_uris: set[str] = set()
+        self.streamed_upstairs: set[str] = set()
 
     def write(self) -> None:
         """Write a dependency map"""
-        template_source: TemplateSource
-        for template_source in self.find_template_source():
-            self.write_by_template_source(template_source=template_source)
+        has_limits = self._template_time_limit or self._template_memory_limit
+        if (self._max_processes and self._max_processes > 1) or has_limits:
+            self.write_in_processes(
+                max_processes=self._max_processes or 1,
+                chunk_size=self._process_chunk_size,
+            )
+        elif self._max_workers and self._max_workers > 1:
+            self.write_concurrently(max_workers=self._max_workers)
+        else:
+            template_source: TemplateSource
+            for template_source in self.find_template_source():
+                self.write_by_template_source(template_source=template_source)
 
         self.mapped = {k: v for k, v in self.mapped.items() if v}
+        logger.info(
+            f"Template strings: fetched={self.template_str_store.bytes_fetched}B, "
+            f"served from memory={self.template_str_store.bytes_served}B"
+        )
+
+    def write_concurrently(self, max_workers: int) -> None:
+        """Write a dependency map with thread pools
+
+        Include sections are searched concurrently, and templates are
+        processed concurrently. Results are merged in the same order
+        as a serial run, so the dependency map is identical to it.
+
+        Args:
+            max_workers (int): The number of threads that process templates
+        """
+        template_sources: list[TemplateSource] = list(self.find_template_source())
+        if not template_sources:
+            return
+
+        source_executor = ThreadPoolExecutor(max_workers=len(template_sources))
+        template_executor = ThreadPoolExecutor(max_workers=max_workers)
+        with source_executor, template_executor:
+            source_futures: list[Future[list[Future[TemplateMappingResult]]]] = [
+                source_executor.submit(
+                    self.submit_templates,
+                    executor=template_executor,
+                    template_source=template_source,
+                )
+                for template_source in template_sources
+            ]
+
+            for source_future in source_futures:
+                for template_future in source_future.result():
+                    self.merge_template_mapping_result(result=template_future.result())
+
+    def write_in_processes(self, max_processes: int, chunk_size: int) -> None:
+        """Write a dependency map with a process pool
+
+        Templates are searched in the main process, and rendering and parsing
+        are sent to worker processes as picklable work units. Results are
+        merged in the same order as a serial run, so the dependency map is
+        identical to it. If limits of templates are set, processes are
+        supervised, and templates which exceed them are added to unmapped.
+
+        Args:
+            max_processes (int): The number of processes
+            chunk_size (int): The number of work units sent to a process at once
+        """
+        batch_size = max_processes * chunk_size * PROCESS_BATCH_CHUNKS
+        # Worker processes have their own memos and environments with the same settings
+        initargs = (
+            query_memo.max_entries,
+            query_memo.max_bytes,
+            jinja_environment.max_entries,
+            jinja_environment.bytecode_cache_dir,
+        )
+        executor: ProcessPoolExecutor | SupervisedWorkerPool
+        if self._template_time_limit or self._template_memory_limit:
+            executor = SupervisedWorkerPool(
+                max_processes=max_processes,
+                time_limit=self._template_time_limit,
+                memory_limit=self._template_memory_limit,
+                initializer=configure_worker_process,
+                initargs=initargs,
+            )
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=max_processes,
+                initializer=configure_worker_process,
+                initargs=initargs,
+            )
+        with executor:
+            batch: list[PendingTemplate] = []
+            work_count = 0
+            for template_source in self.find_template_source():
+                for template in self.search_templates(template_source=template_source):
+                    pending_template = self.prepare_template(template=template)
+                    batch.append(pending_template)
+                    work_count += len(pending_template.works)
+                    if work_count >= batch_size:
+                        self.merge_pending_templates(
+                            executor=executor, batch=batch, chunk_size=chunk_size
+                        )
+                        batch = []
+                        work_count = 0
+            self.merge_pending_templates(
+                executor=executor, batch=batch, chunk_size=chunk_size
+            )
+
+    def prepare_template(self, template: Template) -> PendingTemplate:
+        """Create work units of a template, which are rendered and parsed later
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            PendingTemplate: A result to be filled and work units
+        """
+        try:
+            pending_template = PendingTemplate(
+                result=TemplateMappingResult(template=template)
+            )
+            if not self._mapping_config or not template.mapped:
+                pending_template.result.unmapped_params.append(
+                    self.get_template_params(template=template)
+                )
+                return pending_template
+
+            for table_attributes in template.find_mapped_table_attributes():
+                unmapped_params = self.detect_unmapped_params(
+                    template=template, table_attributes=table_attributes
+                )
+                if unmapped_params:
+                    pending_template.result.unmapped_params.append(unmapped_params)
+
+                params = self._plan.get_table_plan(
+                    table_attributes=table_attributes
+                ).params
+                cache_key, cached = self.get_cached_references(
+                    template=template, table_attributes=table_attributes
+                )
+                pending_template.result.mapped_table_references.append(
+                    MappedTableReferences(
+                        table_attributes=table_attributes,
+                        upstair_table_references=cached or [],
+                    )
+                )
+                if cached is not None:
+                    continue
+
+                # Large files are read by workers from their paths not to send them
+                large_file_path = self.get_large_file_path(template=template)
+                pending_template.works.append(
+                    PendingTemplateWork(
+                        index=len(pending_template.result.mapped_table_references) - 1,
+                        work_unit=create_work_unit(
+                            template=template,
+                            template_str=(
+                                ""
+                                if large_file_path
+                                else self.template_str_store.get(template=template)
+                            ),
+                            params=params,
+                            ignore_params=table_attributes.IgnoreParameters,
+                            query_engine=self._query_engine,
+                            path=large_file_path,
+                            chunk_size=self._large_file_chunk_size,
+                        ),
+                        cache_key=cache_key,
+                    )
+                )
+            return pending_template
+        finally:
+            self.template_str_store.release(template=template)
+
+    def merge_pending_templates(
+        self,
+        executor: ProcessPoolExecutor | SupervisedWorkerPool,
+        batch: list[PendingTemplate],
+        chunk_size: int,
+    ) -> None:
+        """Process work units of templates and merge their results
+
+        Args:
+            executor (ProcessPoolExecutor | SupervisedWorkerPool):
+                Executor that processes work units
+            batch (list[PendingTemplate]): Templates in search order
+            chunk_size (int): The number of work units sent to a process at once
+        """
+        works: list[tuple[PendingTemplate, PendingTemplateWork]] = [
+            (pending_template, work)
+            for pending_template in batch
+            for work in pending_template.works
+        ]
+        work_units = [work.work_unit for _, work in works]
+        reference_tuples_list: Iterator[list[ReferenceTuple] | WorkFailure]
+        if isinstance(executor, SupervisedWorkerPool):
+            reference_tuples_list = executor.map(process_work_unit, work_units)
+        else:
+            reference_tuples_list = executor.map(
+                process_work_unit, work_units, chunksize=chunk_size
+            )
+        for (pending_template, work), reference_tuples in zip(
+            works, reference_tuples_list
+        ):
+            mapped_table_references = pending_template.result.mapped_table_references[
+                work.index
+            ]
+            if isinstance(reference_tuples, WorkFailure):
+                logger.warning(
+                    f"Rendering and parsing failed, {reference_tuples}, "
+                    f"key: {pending_template.result.template.key}, "
+                    f"table: {mapped_table_references.table_attributes.TableName}"
+                )
+                mapped_table_references.failure = str(reference_tuples)
+                continue
+
+            upstair_table_references = to_upstair_table_references(
+                reference_tuples=reference_tuples
+            )
+            pending_template.result.mapped_table_references[
+                work.index
+            ].upstair_table_references = upstair_table_references
+            if self._cache:
+                self._cache.put(key=work.cache_key, references=upstair_table_references)
+
+        for pending_template in batch:
+            self.merge_template_mapping_result(result=pending_template.result)
+
+    def submit_templates(
+        self, executor: ThreadPoolExecutor, template_source: TemplateSource
+    ) -> list[Future[TemplateMappingResult]]:
+        """Search templates and submit them to an executor
+
+        Args:
+            executor (ThreadPoolExecutor): Executor that processes templates
+            template_source (TemplateSource): Template source
+
+        Returns:
+            list[Future[TemplateMappingResult]]: Futures in search order
+        """
+        return [
+            executor.submit(self.process_template, template=template)
+            for template in self.search_templates(template_source=template_source)
+        ]
+
+    def search_templates(self, template_source: TemplateSource) -> Iterator[Template]:
+        """Search templates, prefetching their strings if it is configured
+
+        Args:
+            template_source (TemplateSource): Template source
+
+        Yields:
+            Iterator[Template]: Query templates
+        """
+        max_concurrent_fetches = template_source.get_max_concurrent_fetches()
+        if not max_concurrent_fetches or max_concurrent_fetches < 2:
+            yield from template_source.search_templates()
+            return
+
+        yield from self.template_str_store.prefetch(
+            templates=template_source.search_templates(),
+            max_concurrency=max_concurrent_fetches,
+        )
 
     def find_template_source(self) -> Iterator[TemplateSource]:
         """find template source
@@ -102,21 +566,278 @@ class Map:
         Args:
             template_source (TemplateSource): Template source
         """
-        for template in template_source.search_templates():
-            if not self._mapping_config or not template.mapped:
-                self.add_unmapped_params(template=template)
+        for template in self.search_templates(template_source=template_source):
+            self.merge_template_mapping_result(
+                result=self.process_template(template=template)
+            )
+
+    def process_template(self, template: Template) -> TemplateMappingResult:
+        """Render and parse a template without modifying the dependency map
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            TemplateMappingResult: Unmapped parameters and upstairs references
+        """
+        try:
+            return self._process_template(template=template)
+        finally:
+            self.template_str_store.release(template=template)
+
+    def _process_template(self, template: Template) -> TemplateMappingResult:
+        """Render and parse a template without modifying the dependency map
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            TemplateMappingResult: Unmapped parameters and upstairs references
+        """
+        result = TemplateMappingResult(template=template)
+        if not self._mapping_config or not template.mapped:
+            result.unmapped_params.append(self.get_template_params(template=template))
+            return result
+
+        table_attributes_list = list(template.find_mapped_table_attributes())
+        for table_attributes in table_attributes_list:
+            unmapped_params = self.detect_unmapped_params(
+                template=template, table_attributes=table_attributes
+            )
+            if unmapped_params:
+                result.unmapped_params.append(unmapped_params)
+
+        for table_attributes, upstair_table_references in zip(
+            table_attributes_list,
+            self.find_upstair_table_references_of_tables(
+                template=template, table_attributes_list=table_attributes_list
+            ),
+        ):
+            result.mapped_table_references.append(
+                MappedTableReferences(
+                    table_attributes=table_attributes,
+                    upstair_table_references=upstair_table_references,
+                )
+            )
+        return result
+
+    def merge_template_mapping_result(self, result: TemplateMappingResult) -> None:
+        """Merge a result of process_template into the dependency map
+
+        Args:
+            result (TemplateMappingResult): Result of process_template
+        """
+        for unmapped_params in result.unmapped_params:
+            self.add_unmapped_params(template=result.template, params=unmapped_params)
+
+        for mapped_table_references in result.mapped_table_references:
+            if mapped_table_references.failure:
+                self.add_failed_template(
+                    template=result.template,
+                    table_attributes=mapped_table_references.table_attributes,
+                    reason=mapped_table_references.failure,
+                )
                 continue
 
-            for table_attributes in template.find_mapped_table_attributes():
-                unmapped_params = self.detect_unmapped_params(
-                    template=template, table_attributes=table_attributes
+            if self._edge_sink:
+                self.write_edges(
+                    template=result.template,
+                    table_attributes=mapped_table_references.table_attributes,
+                    upstair_table_references=(
+                        mapped_table_references.upstair_table_references
+                    ),
                 )
-                if unmapped_params:
-                    self.add_unmapped_params(template=template, params=unmapped_params)
-                self.remap(template=template, table_attributes=table_attributes)
+                continue
 
-    def remap(
+            self.remap(
+                template=result.template,
+                table_attributes=mapped_table_references.table_attributes,
+                upstair_table_references=(
+                    mapped_table_references.upstair_table_references
+                ),
+            )
+
+    def find_upstair_table_references(
         self, template: Template, table_attributes: MappingConfigMappingTable
+    ) -> list[UpstairTableReference]:
+        """Render a template and find upstairs table references
+
+        Args:
+            template (Template): Query template
+            table_attributes (MappingConfigMappingTable):
+                Table attributes from mapping configuration
+
+        Returns:
+            list[UpstairTableReference]: Upstairs table references
+        """
+        return self.find_upstair_table_references_of_tables(
+            template=template, table_attributes_list=[table_attributes]
+        )[0]
+
+    def find_upstair_table_references_of_tables(
+        self,
+        template: Template,
+        table_attributes_list: list[MappingConfigMappingTable],
+    ) -> list[list[UpstairTableReference]]:
+        """Render a template for tables and find upstairs table references
+
+        Tables with the same ignore parameters are rendered together,
+        so that the template is prepared only once for them.
+
+        Args:
+            template (Template): Query template
+            table_attributes_list (list[MappingConfigMappingTable]):
+                Attributes of tables mapped to the template
+
+        Returns:
+            list[list[UpstairTableReference]]:
+                Upstairs table references in the same order as tables
+        """
+        references_list: list[list[UpstairTableReference] | None] = []
+        cache_keys: list[str] = []
+        # Indexes of tables which are not cached, by their ignore parameters
+        pending: dict[tuple[str, ...], list[int]] = {}
+        for index, table_attributes in enumerate(table_attributes_list):
+            cache_key, cached = self.get_cached_references(
+                template=template, table_attributes=table_attributes
+            )
+            cache_keys.append(cache_key)
+            references_list.append(cached)
+            if cached is None:
+                pending.setdefault(
+                    tuple(table_attributes.IgnoreParameters or ()), []
+                ).append(index)
+
+        large_file_path = self.get_large_file_path(template=template)
+        for indexes in pending.values():
+            ignore_params = table_attributes_list[indexes[0]].IgnoreParameters
+            param_sets = [
+                self._plan.get_table_plan(
+                    table_attributes=table_attributes_list[index]
+                ).params
+                for index in indexes
+            ]
+            if large_file_path:
+                for index, params in zip(indexes, param_sets):
+                    references_list[index] = list(
+                        LargeFileQuery(
+                            template=template,
+                            path=large_file_path,
+                            params=params,
+                            ignore_params=ignore_params,
+                            chunk_size=self._large_file_chunk_size,
+                        ).detect_upstair_table_reference()
+                    )
+                continue
+
+            query_strs = template.render_many(
+                param_sets=param_sets,
+                ignore_params=ignore_params,
+                template_str=self.template_str_store.get(template=template),
+            )
+            for index, query_str in zip(indexes, query_strs):
+                query = Query(
+                    query_str=query_str,
+                    default_table_prefix=template.default_table_prefix,
+                    engine=self._query_engine,
+                )
+                references_list[index] = query_memo.detect_upstair_table_reference(
+                    query=query
+                )
+
+        # Only references which have been parsed are written, not cache hits
+        if self._cache:
+            for indexes in pending.values():
+                for index in indexes:
+                    self._cache.put(
+                        key=cache_keys[index], references=references_list[index] or []
+                    )
+        return [references or [] for references in references_list]
+
+    def get_cached_references(
+        self, template: Template, table_attributes: MappingConfigMappingTable
+    ) -> tuple[str, list[UpstairTableReference] | None]:
+        """Get cached upstairs table references of a template
+
+        Args:
+            template (Template): Query template
+            table_attributes (MappingConfigMappingTable):
+                Table attributes from mapping configuration
+
+        Returns:
+            tuple[str, list[UpstairTableReference] | None]:
+                A cache key and cached references if exist
+        """
+        if not self._cache:
+            return "", None
+
+        cache_key = self._cache.create_key(
+            uri=template.uri,
+            template_str=self.get_template_digest(template=template),
+            params=self._plan.get_table_plan(table_attributes=table_attributes).params,
+            ignore_params=table_attributes.IgnoreParameters,
+            default_table_prefix=template.default_table_prefix,
+            query_engine=self._query_engine,
+        )
+        return cache_key, self._cache.get(key=cache_key)
+
+    def get_large_file_path(self, template: Template) -> str | None:
+        """Get a local path of a template which is parsed in chunks
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            str | None: File path, None if the template is not a large file
+        """
+        if template.uri not in self._large_file_paths:
+            path = template.get_local_path()
+            self._large_file_paths[template.uri] = (
+                path
+                if path
+                and self._large_file_threshold
+                and os.path.getsize(path) >= self._large_file_threshold
+                and not has_jinja_expressions(path=path)
+                else None
+            )
+        return self._large_file_paths[template.uri]
+
+    def get_template_digest(self, template: Template) -> str:
+        """Get a string which identifies contents of a template
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            str: A template string, or a digest of a large file
+        """
+        large_file_path = self.get_large_file_path(template=template)
+        if not large_file_path:
+            return self.template_str_store.get(template=template)
+        if template.uri not in self._large_file_digests:
+            self._large_file_digests[template.uri] = digest_file(path=large_file_path)
+        return self._large_file_digests[template.uri]
+
+    def get_template_params(self, template: Template) -> list[str]:
+        """Get jinja parameters of a template
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            list[str]: Jinja parameters
+        """
+        # Large files are checked to have no jinja expressions
+        if self.get_large_file_path(template=template):
+            return []
+        template_str = self.template_str_store.get(template=template)
+        return list(template.get_signature(template_str=template_str).jinja_params)
+
+    def remap(
+        self,
+        template: Template,
+        table_attributes: MappingConfigMappingTable,
+        upstair_table_references: list[UpstairTableReference] | None = None,
     ) -> None:
         """Remap a dependency map
 
@@ -124,30 +845,45 @@ class Map:
             template (Template): Query template
             table_attributes (MappingConfigMappingTable):
                 Table attributes from mapping configuration
+            upstair_table_references (list[UpstairTableReference], optional):
+                Upstairs table references found in advance.
+                If it is None, the template is rendered and parsed here.
+                Defaults to None.
         """
+        if upstair_table_references is None:
+            upstair_table_references = self.find_upstair_table_references(
+                template=template, table_attributes=table_attributes
+            )
+
         current_floor_name: str = table_attributes.TableName
         current_floor_label: dict[str, Any] = table_attributes.Labels
-        if self._mapping_config:
-            extra_labels: list[dict[str, Any]] = self._mapping_config.ExtraLabels or []
+
+        upstair_table_reference: UpstairTableReference
+        if self._graph_builder:
+            # As with the dict below, templates are replaced instead of appended
+            # if the table has had no upstairs before the call
+            has_upstairs = self._graph_builder.add_table(table_name=current_floor_name)
+            for upstair_table_reference in upstair_table_references:
+                self._graph_builder.add_edge(
+                    table_name=current_floor_name,
+                    upstair_name=upstair_table_reference.TableName,
+                    mapped_template=self.create_upstair_template(
+                        template=template,
+                        current_floor_label=current_floor_label,
+                        extra_label=self._plan.extra_labels.get(
+                            upstair_table_reference.TableName, {}
+                        ),
+                    ),
+                    line=upstair_table_reference.Line,
+                    replace=not has_upstairs,
+                )
+            return
 
         current_floor_map: dict[str, Any] = self.mapped.get(current_floor_name) or {}
         if not current_floor_map:
             self.mapped[current_floor_name] = {}
 
-        global_params: dict[str, Any] = self.get_global_params()
-        params = self.merge_global_params(
-            table_attributes=table_attributes, global_params=global_params
-        )
-        query = Query(
-            query_str=template.render(
-                params=params,
-                ignore_params=table_attributes.IgnoreParameters,
-            ),
-            default_table_prefix=template.default_table_prefix,
-        )
-
-        upstair_table_reference: UpstairTableReference
-        for upstair_table_reference in query.detect_upstair_table_reference():
+        for upstair_table_reference in upstair_table_references:
             upstair = Stair(
                 name=upstair_table_reference.TableName,
                 mapped_templates=current_floor_map.get(
@@ -155,14 +891,8 @@ class Map:
                 ),
             )
 
-            upstairs_extra_labels: list[dict[str, Any]] = [
-                extra_label.get(MappingConfigKey.LABELS, {})
-                for extra_label in extra_labels
-                if extra_label.get(MappingConfigKey.TABLE_NAME)
-                == upstair_table_reference.TableName
-            ]
-            upstairs_extra_label = (
-                upstairs_extra_labels[0] if upstairs_extra_labels else {}
+            upstairs_extra_label: dict[str, Any] = self._plan.extra_labels.get(
+                upstair_table_reference.TableName, {}
             )
             upstair_template = self.create_upstair_template(
                 template=template,
@@ -192,6 +922,45 @@ class Map:
                 str(upstair.name)
             ] = upstair.mapped_templates
 
+    def write_edges(
+        self,
+        template: Template,
+        table_attributes: MappingConfigMappingTable,
+        upstair_table_references: list[UpstairTableReference],
+    ) -> None:
+        """Write edges to the edge sink, one per upstairs table
+
+        Each edge has lines of the template only, unlike remap which adds
+        lines to all templates of the upstairs table.
+
+        Args:
+            template (Template): Query template
+            table_attributes (MappingConfigMappingTable):
+                Table attributes from mapping configuration
+            upstair_table_references (list[UpstairTableReference]):
+                Upstairs table references
+        """
+        lines_by_upstair: dict[str, list[dict]] = {}
+        for upstair_table_reference in upstair_table_references:
+            lines = lines_by_upstair.setdefault(upstair_table_reference.TableName, [])
+            if upstair_table_reference.Line not in lines:
+                lines.append(upstair_table_reference.Line)
+
+        for upstair_name, lines in lines_by_upstair.items():
+            upstair_template = self.create_upstair_template(
+                template=template,
+                current_floor_label=table_attributes.Labels,
+                extra_label=self._plan.extra_labels.get(upstair_name, {}),
+            )
+            upstair_template.Lines = lines
+            self._edge_sink.write(
+                table_name=table_attributes.TableName,
+                upstair_table_name=upstair_name,
+                mapped_template=upstair_template,
+            )
+            self.streamed_uris.add(template.uri)
+            self.streamed_upstairs.add(upstair_name)
+
     def get_global_params(self) -> dict[str, Any]:
         """get global parameters in mapping.yaml
 
@@ -205,8 +974,8 @@ class Map:
                 global_params = _global.Parameters
         return global_params
 
+    @staticmethod
     def merge_global_params(
-        self,
         table_attributes: MappingConfigMappingTable,
         global_params: dict[str, Any],
     ) -> dict[str, Any]:
@@ -290,9 +1059,8 @@ class Map:
             template (Template): Query template
             params (list[str], optional): Jinja parameters
         """
-        if not params:
-            template_str = template.get_template_str()
-            params = template.get_jinja_params(template_str=template_str)
+        if params is None:
+            params = list(template.get_signature().jinja_params)
         self.unmapped.append(
             {
                 MapKey.TEMPLATE: template,
@@ -300,6 +1068,29 @@ class Map:
             }
         )
 
+    def add_failed_template(
+        self,
+        template: Template,
+        table_attributes: MappingConfigMappingTable,
+        reason: str,
+    ) -> None:
+        """add a template which failed to be rendered or parsed to unmapped
+
+        Args:
+            template (Template): Query template
+            table_attributes (MappingConfigMappingTable):
+                Table attributes from mapping configuration
+            reason (str): Why it failed, like exceeding a time limit
+        """
+        self.unmapped.append(
+            {
+                MapKey.TEMPLATE: template,
+                MapKey.PARAMETERS: [],
+                MapKey.TABLE_NAME: table_attributes.TableName,
+                MapKey.REASON: reason,
+            }
+        )
+
     def detect_unmapped_params(
         self, template: Template, table_attributes: MappingConfigMappingTable
     ) -> list[str]:
@@ -313,19 +1104,13 @@ class Map:
         Returns:
             list[str]: Unmapped parameters
         """
-        template_str: str = template.get_template_str()
-        template_params: list[str] = template.get_jinja_params(template_str)
+        template_params: list[str] = self.get_template_params(template=template)
         if not template_params:
             return []
 
-        global_params: dict[str, Any] = self.get_global_params()
-        mapped_params_dict: dict[str, Any] = self.merge_global_params(
-            table_attributes=table_attributes, global_params=global_params
-        )
-        mapped_params: list[str] = create_dict_key_list(d=mapped_params_dict)
-        ignore_params: list[str] = table_attributes.IgnoreParameters or []
+        table_plan = self._plan.get_table_plan(table_attributes=table_attributes)
         unmapped_params: list[str] = list(
-            set(template_params) - set(mapped_params) - set(ignore_params)
+            set(template_params) - table_plan.param_keys - table_plan.ignore_params
         )
 
         return unmapped_params
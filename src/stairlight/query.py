@@ -1,8 +1,23 @@
 from __future__ import annotations
 
-import re
-from dataclasses import asdict, dataclass
-from typing import Iterator
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Iterator, Sequence, Tuple
+
+from src.stairlight.graph import Interner
+from src.stairlight.query_parser import (
+    QUERY_ENGINE_DEFAULT,
+    QueryEngine,
+    QueryParser,
+    TableLines,
+    get_query_parser,
+    parse_and_get_upstairs_tables,
+)
+from src.stairlight.sql_lexer import LineIndex
+
+# Table name, line number and line string of an upstairs table reference
+ReferenceTuple = Tuple[str, int, str]
 
 
 @dataclass
@@ -17,10 +32,66 @@ class UpstairTableReferenceLine:
     LineString: str
 
 
+@dataclass
+class ParsedQueries:
+    """Upstairs table references of queries in columnar arrays
+
+    The i-th reference is found in the query of query_indexes[i].
+    Table names and line strings are interned, and their ids are kept.
+    References are ordered by query index.
+    """
+
+    query_indexes: array = field(default_factory=lambda: array("L"))
+    table_ids: array = field(default_factory=lambda: array("L"))
+    line_numbers: array = field(default_factory=lambda: array("L"))
+    line_ids: array = field(default_factory=lambda: array("L"))
+    tables: Interner = field(default_factory=Interner)
+    lines: Interner = field(default_factory=Interner)
+
+    def __len__(self) -> int:
+        return len(self.query_indexes)
+
+    def get_range(self, query_index: int) -> range:
+        """Get a range of references found in a query
+
+        Args:
+            query_index (int): Index of the query
+
+        Returns:
+            range: Indexes of references
+        """
+        return range(
+            bisect_left(self.query_indexes, query_index),
+            bisect_right(self.query_indexes, query_index),
+        )
+
+    def get_reference(self, index: int) -> UpstairTableReference:
+        """Get a reference as an object
+
+        Args:
+            index (int): Index of the reference
+
+        Returns:
+            UpstairTableReference: Upstairs table reference
+        """
+        return UpstairTableReference(
+            TableName=self.tables[self.table_ids[index]],
+            Line={
+                "LineNumber": self.line_numbers[index],
+                "LineString": self.lines[self.line_ids[index]],
+            },
+        )
+
+
 class Query:
     """SQL query"""
 
-    def __init__(self, query_str: str, default_table_prefix: str = None) -> None:
+    def __init__(
+        self,
+        query_str: str,
+        default_table_prefix: str = None,
+        engine: str | None = None,
+    ) -> None:
         """SQL query
 
         Args:
@@ -28,9 +99,15 @@ class Query:
             default_table_prefix (str, optional):
                 If project or dataset that configured table have are omitted,
                 it will be complement this prefix. Defaults to None.
+            engine (str, optional):
+                An engine which extracts upstairs tables,
+                'lexer', 'regex', 'hybrid' or 'sqlglot'.
+                Defaults to QUERY_ENGINE_DEFAULT.
         """
         self.query_str = query_str
         self.default_table_prefix = default_table_prefix
+        self.engine = QueryEngine(engine) if engine else QUERY_ENGINE_DEFAULT
+        self.parser: QueryParser = get_query_parser(engine=self.engine)
 
     def detect_upstair_table_reference(self) -> Iterator[UpstairTableReference]:
         """Parse a query statement and detect a upstream table reference
@@ -38,91 +115,96 @@ class Query:
         Yields:
             Iterator[UpstairsResults]: upstream table results
         """
-        upstairs_tables = self.parse_and_get_upstairs_tables()
+        for table_name, line_number, line_string in self.iterate_reference_tuples():
+            yield UpstairTableReference(
+                TableName=table_name,
+                Line={"LineNumber": line_number, "LineString": line_string},
+            )
 
-        for upstairs_table in upstairs_tables:
-            line_indexes = [
-                i
-                for i, line in enumerate(self.query_str.splitlines())
-                if upstairs_table in line
-                and "--" not in line.split(upstairs_table)[0]  # exclude comments
-            ]
+    def iterate_reference_tuples(self) -> Iterator[ReferenceTuple]:
+        """Parse a query statement and detect upstream table references as tuples
 
-            for line_index in line_indexes:
-                table_name = (
-                    solve_table_prefix(
-                        table=upstairs_table,
-                        default_table_prefix=self.default_table_prefix,
-                    )
-                    if self.default_table_prefix
-                    else upstairs_table
+        Yields:
+            Iterator[ReferenceTuple]: Table name, line number and line string
+        """
+        line_index_of_query = LineIndex(query_str=self.query_str)
+        for upstairs_table, line_indexes in self.find_upstairs_table_lines(
+            line_index=line_index_of_query
+        ):
+            table_name = (
+                solve_table_prefix(
+                    table=upstairs_table,
+                    default_table_prefix=self.default_table_prefix,
                 )
-                yield UpstairTableReference(
-                    TableName=table_name.replace("`", ""),
-                    Line=asdict(
-                        UpstairTableReferenceLine(
-                            LineNumber=line_index + 1,
-                            LineString=self.query_str.splitlines()[line_index],
-                        )
-                    ),
+                if self.default_table_prefix
+                else upstairs_table
+            ).replace("`", "")
+            for line_index in line_indexes:
+                yield (
+                    table_name,
+                    line_index + 1,
+                    line_index_of_query.get_line(line_index=line_index),
                 )
 
-    def parse_and_get_upstairs_tables(self) -> list[str]:
-        """Parse query and get upstairs tables
+    @staticmethod
+    def parse_many(
+        query_strs: Sequence[str],
+        default_table_prefixes: Sequence[str | None] | None = None,
+        engine: str | None = None,
+    ) -> ParsedQueries:
+        """Parse query statements and get references in columnar arrays
+
+        Args:
+            query_strs (Sequence[str]): Query statements
+            default_table_prefixes (Sequence[str | None], optional):
+                Default table prefixes of each query. Defaults to None.
+            engine (str, optional): Query engine. Defaults to None.
 
         Returns:
-            list[str]: A list of upstairs tables
+            ParsedQueries: Upstairs table references
         """
-        # Remove comments
-        comments_pattern = r"\-\-.*\n"
-        query_str = re.sub(comments_pattern, "", self.query_str)
-
-        # Get Common-Table-Expressions(CTE) from query string
-        cte_pattern = r"(?:with|,)\s*(\w+)\s+as\s*"
-        cte_alias: list[str] = re.findall(cte_pattern, query_str, re.IGNORECASE)
-
-        # Search a boundary line number that a main query starts
-        boundary_num: int = 0
-        main_pattern = r"\)[;\s]*select" if any(cte_alias) else r"select"
-        main_search_result = re.search(main_pattern, query_str, re.IGNORECASE)
-        if main_search_result:
-            boundary_num = main_search_result.start()
-
-        # Split the query to a main query and CTEs
-        query_group = {}
-        query_group["main"] = query_str[boundary_num:].strip()
-        query_group["cte"] = query_str[:boundary_num].strip()
-
-        table_pattern = r"\s(?:from|join)\s+([`.\-\w]+)"
-        main_tables_with_alias: list[str] = re.findall(
-            table_pattern, query_group["main"], re.IGNORECASE
-        )
+        parsed = ParsedQueries()
+        for query_index, query_str in enumerate(query_strs):
+            query = Query(
+                query_str=query_str,
+                default_table_prefix=(
+                    default_table_prefixes[query_index]
+                    if default_table_prefixes
+                    else None
+                ),
+                engine=engine,
+            )
+            for (
+                table_name,
+                line_number,
+                line_string,
+            ) in query.iterate_reference_tuples():
+                parsed.query_indexes.append(query_index)
+                parsed.table_ids.append(parsed.tables.intern(table_name))
+                parsed.line_numbers.append(line_number)
+                parsed.line_ids.append(parsed.lines.intern(line_string))
+        return parsed
+
+    def find_upstairs_table_lines(self, line_index: LineIndex) -> list[TableLines]:
+        """Find upstairs tables and indexes of lines which contain them
 
-        # Exclude Google BigQuery EXTRACT function
-        bq_extract_pattern = r"(?:EXTRACT\(.+ FROM)\s+([`.\-\w]+)"
-        bq_extracts: list[str] = re.findall(
-            bq_extract_pattern, query_group["main"], re.IGNORECASE
-        )
+        Args:
+            line_index (LineIndex): Line index of the query statement
 
-        main_tables = [
-            table
-            for table in main_tables_with_alias
-            if table not in cte_alias
-            and table not in bq_extracts
-            and table.upper() != "UNNEST"
-        ]
-
-        # Exclude table alias from CTEs
-        cte_tables_with_alias: list[str] = re.findall(
-            table_pattern, query_group["cte"], re.IGNORECASE
+        Returns:
+            list[TableLines]: Tables in ascending order and their line indexes
+        """
+        return self.parser.find_upstairs_table_lines(
+            query_str=self.query_str, line_index=line_index
         )
-        cte_tables = [
-            cte_table
-            for cte_table in cte_tables_with_alias
-            if cte_table not in cte_alias
-        ]
 
-        return sorted(set(main_tables + cte_tables))
+    def parse_and_get_upstairs_tables(self) -> list[str]:
+        """Parse query and get upstairs tables with regular expressions
+
+        Returns:
+            list[str]: A list of upstairs tables
+        """
+        return parse_and_get_upstairs_tables(query_str=self.query_str)
 
 
 def solve_table_prefix(table: str, default_table_prefix: str) -> str:
@@ -0,0 +1,388 @@
+from __future__ import annotations
+
+import enum
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from importlib.util import find_spec
+from logging import getLogger
+from typing import List, Tuple
+
+from src.stairlight.sql_lexer import LineIndex, lex_query
+
+# A table and indexes of lines which contain it
+TableLines = Tuple[str, List[int]]
+
+# Constructs that the regex parser may misread, with substrings which they contain.
+# Patterns are searched in an upper-cased query only if a substring is found.
+UNSAFE_CONSTRUCTS: list[tuple[str, tuple[str, ...], re.Pattern | None]] = [
+    ("subquery", ("(",), re.compile(r"\b(?:FROM|JOIN)\s*\(")),
+    (
+        "string",
+        ("'", '"'),
+        re.compile(
+            r"'[^'\n]*\b(?:FROM|JOIN)\b[^'\n]*'|\"[^\"\n]*\b(?:FROM|JOIN)\b[^\"\n]*\""
+        ),
+    ),
+    ("block_comment", ("/*",), None),
+    ("function", ("EXTRACT",), re.compile(r"\bEXTRACT\s*\(")),
+    (
+        "scripting",
+        ("DECLARE", "BEGIN", "LOOP", "WHILE", "EXECUTE", "CALL", "CREATE", ";"),
+        re.compile(
+            r"\b(?:DECLARE|BEGIN|LOOP|WHILE|EXECUTE\s+IMMEDIATE|CALL)\b"
+            r"|\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP(?:ORARY)?\s+)?"
+            r"(?:FUNCTION|PROCEDURE)\b"
+            r"|;\s*\S"
+        ),
+    ),
+]
+
+logger = getLogger(__name__)
+
+
+class QueryEngine(enum.Enum):
+    """Engines which extract upstairs tables from a query"""
+
+    LEXER = "lexer"
+    REGEX = "regex"
+    HYBRID = "hybrid"
+    SQLGLOT = "sqlglot"
+
+    def __str__(self):
+        return self.name
+
+
+QUERY_ENGINE_DEFAULT = QueryEngine.LEXER
+
+
+@dataclass
+class QueryParserStats:
+    queries: int = 0
+    seconds: float = 0.0
+    # Why queries were sent to a full parser, only used by hybrid parsers
+    reasons: Counter[str] = field(default_factory=Counter)
+
+
+class QueryParser(ABC):
+    """A strategy which finds upstairs tables in a query"""
+
+    NAME: str = ""
+
+    def __init__(self) -> None:
+        self.stats = QueryParserStats()
+        self._lock = threading.Lock()
+
+    def find_upstairs_table_lines(
+        self, query_str: str, line_index: LineIndex
+    ) -> list[TableLines]:
+        """Find upstairs tables and indexes of lines which contain them
+
+        Args:
+            query_str (str): Query statement
+            line_index (LineIndex): Line index of the query statement
+
+        Returns:
+            list[TableLines]: Tables in ascending order and their line indexes
+        """
+        start = time.perf_counter()
+        try:
+            return self.parse(query_str=query_str, line_index=line_index)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stats.queries += 1
+                self.stats.seconds += elapsed
+
+    @abstractmethod
+    def parse(self, query_str: str, line_index: LineIndex) -> list[TableLines]:
+        """Parse a query statement
+
+        Args:
+            query_str (str): Query statement
+            line_index (LineIndex): Line index of the query statement
+
+        Returns:
+            list[TableLines]: Tables in ascending order and their line indexes
+        """
+        pass
+
+
+class RegexQueryParser(QueryParser):
+    """A parser with regular expressions, which is fast for plain queries"""
+
+    NAME = QueryEngine.REGEX.value
+
+    def parse(self, query_str: str, line_index: LineIndex) -> list[TableLines]:
+        return [
+            (
+                table,
+                find_line_indexes_out_of_comments(table=table, line_index=line_index),
+            )
+            for table in parse_and_get_upstairs_tables(query_str=query_str)
+        ]
+
+
+class LexerQueryParser(QueryParser):
+    """A single-pass parser which understands comments, strings and CTE scopes"""
+
+    NAME = QueryEngine.LEXER.value
+
+    def parse(self, query_str: str, line_index: LineIndex) -> list[TableLines]:
+        lexed = lex_query(query_str=query_str, line_index=line_index)
+        return [(table, lexed.find_line_indexes(table=table)) for table in lexed.tables]
+
+
+class SqlglotQueryParser(QueryParser):
+    """A parser with sqlglot, which builds a syntax tree of a query"""
+
+    NAME = QueryEngine.SQLGLOT.value
+
+    def __init__(self, dialect: str = "bigquery") -> None:
+        """A parser with sqlglot, which builds a syntax tree of a query
+
+        Args:
+            dialect (str, optional): SQL dialect. Defaults to "bigquery".
+        """
+        super().__init__()
+        self.dialect = dialect
+        # Queries that sqlglot fails to parse
+        self._fallback = LexerQueryParser()
+
+    def parse(self, query_str: str, line_index: LineIndex) -> list[TableLines]:
+        import sqlglot
+        from sqlglot import exp
+
+        try:
+            expressions = [
+                expression
+                for expression in sqlglot.parse(query_str, read=self.dialect)
+                if expression
+            ]
+        except sqlglot.errors.SqlglotError as e:
+            logger.debug(f"Failed to parse a query with sqlglot: {e}")
+            return self._fallback.parse(query_str=query_str, line_index=line_index)
+
+        cte_names = {
+            cte.alias_or_name
+            for expression in expressions
+            for cte in expression.find_all(exp.CTE)
+        }
+        tables: dict[str, list[str]] = {}
+        for expression in expressions:
+            for table in expression.find_all(exp.Table):
+                parts = [part for part in (table.catalog, table.db, table.name) if part]
+                if not parts or (len(parts) == 1 and parts[0] in cte_names):
+                    continue
+                tables.setdefault(".".join(parts), parts)
+
+        # Tables are searched with or without backticks, as they are written
+        return [
+            (
+                table,
+                find_line_indexes_out_of_comments(
+                    table=table,
+                    line_index=line_index,
+                    pattern=re.compile(
+                        "`?" + r"`?\.`?".join(re.escape(part) for part in parts) + "`?"
+                    ),
+                ),
+            )
+            for table, parts in sorted(tables.items())
+        ]
+
+
+class HybridQueryParser(QueryParser):
+    """A parser which sends only complex queries to a full parser"""
+
+    NAME = QueryEngine.HYBRID.value
+
+    def __init__(
+        self, fast: QueryParser | None = None, full: QueryParser | None = None
+    ) -> None:
+        """A parser which sends only complex queries to a full parser
+
+        Args:
+            fast (QueryParser, optional):
+                A parser for queries that are safe to parse with it.
+                Defaults to RegexQueryParser.
+            full (QueryParser, optional):
+                A parser for the rest. Defaults to SqlglotQueryParser
+                if sqlglot is installed, otherwise LexerQueryParser.
+        """
+        super().__init__()
+        self.fast = fast or RegexQueryParser()
+        self.full = full or create_full_query_parser()
+
+    def parse(self, query_str: str, line_index: LineIndex) -> list[TableLines]:
+        reason = classify_query(query_str=query_str)
+        if not reason:
+            return self.fast.find_upstairs_table_lines(
+                query_str=query_str, line_index=line_index
+            )
+
+        with self._lock:
+            self.stats.reasons[reason] += 1
+        return self.full.find_upstairs_table_lines(
+            query_str=query_str, line_index=line_index
+        )
+
+
+def classify_query(query_str: str) -> str | None:
+    """Check if a query is safe to parse with regular expressions
+
+    Args:
+        query_str (str): Query statement
+
+    Returns:
+        str | None:
+            A kind of the first construct that regular expressions may misread,
+            like "subquery", "string" or "scripting". None if the query is safe.
+    """
+    upper = query_str.upper()
+    for kind, substrings, pattern in UNSAFE_CONSTRUCTS:
+        if any(substring in upper for substring in substrings) and (
+            not pattern or pattern.search(upper)
+        ):
+            return kind
+    return None
+
+
+def create_full_query_parser() -> QueryParser:
+    """Create a parser which parses queries entirely
+
+    Returns:
+        QueryParser: SqlglotQueryParser if sqlglot is installed
+    """
+    if find_spec("sqlglot"):
+        return SqlglotQueryParser()
+    return LexerQueryParser()
+
+
+_query_parsers: dict[QueryEngine, QueryParser] = {}
+_query_parsers_lock = threading.Lock()
+
+
+def get_query_parser(engine: QueryEngine) -> QueryParser:
+    """Get a parser of an engine, which is shared in a process
+
+    Args:
+        engine (QueryEngine): Query engine
+
+    Returns:
+        QueryParser: Query parser
+    """
+    with _query_parsers_lock:
+        if engine not in _query_parsers:
+            query_parser: QueryParser
+            if engine == QueryEngine.REGEX:
+                query_parser = RegexQueryParser()
+            elif engine == QueryEngine.HYBRID:
+                query_parser = HybridQueryParser()
+            elif engine == QueryEngine.SQLGLOT:
+                if not find_spec("sqlglot"):
+                    raise ImportError(
+                        "sqlglot is required for the query engine 'sqlglot'"
+                    )
+                query_parser = SqlglotQueryParser()
+            else:
+                query_parser = LexerQueryParser()
+            _query_parsers[engine] = query_parser
+        return _query_parsers[engine]
+
+
+def parse_and_get_upstairs_tables(query_str: str) -> list[str]:
+    """Parse query and get upstairs tables with regular expressions
+
+    Args:
+        query_str (str): Query statement
+
+    Returns:
+        list[str]: A list of upstairs tables
+    """
+    # Remove comments
+    comments_pattern = r"\-\-.*\n"
+    query_str = re.sub(comments_pattern, "", query_str)
+
+    # Get Common-Table-Expressions(CTE) from query string
+    cte_pattern = r"(?:with|,)\s*(\w+)\s+as\s*"
+    cte_alias: list[str] = re.findall(cte_pattern, query_str, re.IGNORECASE)
+
+    # Search a boundary line number that a main query starts
+    boundary_num: int = 0
+    main_pattern = r"\)[;\s]*select" if any(cte_alias) else r"select"
+    main_search_result = re.search(main_pattern, query_str, re.IGNORECASE)
+    if main_search_result:
+        boundary_num = main_search_result.start()
+
+    # Split the query to a main query and CTEs
+    query_group = {}
+    query_group["main"] = query_str[boundary_num:].strip()
+    query_group["cte"] = query_str[:boundary_num].strip()
+
+    table_pattern = r"\s(?:from|join)\s+([`.\-\w]+)"
+    main_tables_with_alias: list[str] = re.findall(
+        table_pattern, query_group["main"], re.IGNORECASE
+    )
+
+    # Exclude Google BigQuery EXTRACT function
+    bq_extract_pattern = r"(?:EXTRACT\(.+ FROM)\s+([`.\-\w]+)"
+    bq_extracts: list[str] = re.findall(
+        bq_extract_pattern, query_group["main"], re.IGNORECASE
+    )
+
+    main_tables = [
+        table
+        for table in main_tables_with_alias
+        if table not in cte_alias
+        and table not in bq_extracts
+        and table.upper() != "UNNEST"
+    ]
+
+    # Exclude table alias from CTEs
+    cte_tables_with_alias: list[str] = re.findall(
+        table_pattern, query_group["cte"], re.IGNORECASE
+    )
+    cte_tables = [
+        cte_table for cte_table in cte_tables_with_alias if cte_table not in cte_alias
+    ]
+
+    return sorted(set(main_tables + cte_tables))
+
+
+def find_line_indexes_out_of_comments(
+    table: str, line_index: LineIndex, pattern: re.Pattern | None = None
+) -> list[int]:
+    """Find lines which contain a table name before a comment starts
+
+    Args:
+        table (str): Table name
+        line_index (LineIndex): Line index of a query statement
+        pattern (re.Pattern, optional):
+            A pattern of the table name as written. Defaults to None,
+            which means the table name itself.
+
+    Returns:
+        list[int]: Line indexes in ascending order
+    """
+    query_str = line_index.query_str
+
+    def find(position: int) -> int:
+        if not pattern:
+            return query_str.find(table, position)
+        match = pattern.search(query_str, position)
+        return match.start() if match else -1
+
+    line_indexes: list[int] = []
+    position = find(position=0)
+    while position >= 0:
+        # Only the first occurrence in a line is checked
+        index = line_index.find(offset=position)
+        start = line_index.starts[index]
+        if "--" not in query_str[start:position]:
+            line_indexes.append(index)
+        position = find(position=max(position + 1, line_index.ends[index]))
+    return line_indexes
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import asdict
+from typing import IO, TYPE_CHECKING, Any, Iterable, Iterator
+
+from src.stairlight.source.config_key import GCS_URI_SCHEME, S3_URI_SCHEME, MapKey
+
+if TYPE_CHECKING:
+    from src.stairlight.map import MappedTemplate
+
+JSON_LINES_SUFFIX = ".jsonl"
+
+
+def is_json_lines(file: str) -> bool:
+    """Check if the file is saved as JSON lines
+
+    Args:
+        file (str): File path
+
+    Returns:
+        bool: Is JSON lines or not
+    """
+    return file.endswith(JSON_LINES_SUFFIX)
+
+
+def create_edge_record(
+    table_name: str, upstair_table_name: str, mapped_template: dict[str, Any]
+) -> dict[str, Any]:
+    """Create a record of an edge between tables
+
+    Args:
+        table_name (str): Downstairs table name
+        upstair_table_name (str): Upstairs table name
+        mapped_template (dict[str, Any]): Mapped template as dict
+
+    Returns:
+        dict[str, Any]: Edge record
+    """
+    return {
+        MapKey.TABLE_NAME: table_name,
+        MapKey.UPSTAIR_TABLE_NAME: upstair_table_name,
+        **mapped_template,
+    }
+
+
+def iterate_edge_records(mapped: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Iterate edge records of a dependency map
+
+    Args:
+        mapped (dict[str, Any]): Dependency map whose templates are dicts
+
+    Yields:
+        Iterator[dict[str, Any]]: Edge records
+    """
+    for table_name, upstairs in mapped.items():
+        for upstair_table_name, mapped_templates in upstairs.items():
+            for mapped_template in mapped_templates:
+                yield create_edge_record(
+                    table_name=table_name,
+                    upstair_table_name=upstair_table_name,
+                    mapped_template=mapped_template,
+                )
+
+
+def build_map_from_edge_records(
+    records: Iterable[dict[str, Any]]
+) -> dict[str, dict[str, list[dict[str, Any]]]]:
+    """Build a dependency map from edge records
+
+    Args:
+        records (Iterable[dict[str, Any]]): Edge records
+
+    Returns:
+        dict[str, dict[str, list[dict[str, Any]]]]: Dependency map
+    """
+    mapped: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for record in records:
+        mapped_template = dict(record)
+        table_name = mapped_template.pop(MapKey.TABLE_NAME)
+        upstair_table_name = mapped_template.pop(MapKey.UPSTAIR_TABLE_NAME)
+        mapped.setdefault(table_name, {}).setdefault(upstair_table_name, []).append(
+            mapped_template
+        )
+    return mapped
+
+
+class EdgeSink(ABC):
+    """A destination of edges that are written as soon as they are resolved"""
+
+    @abstractmethod
+    def write(
+        self,
+        table_name: str,
+        upstair_table_name: str,
+        mapped_template: MappedTemplate,
+    ) -> None:
+        """Write an edge between tables
+
+        Args:
+            table_name (str): Downstairs table name
+            upstair_table_name (str): Upstairs table name
+            mapped_template (MappedTemplate): Template that connects tables
+        """
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """Flush and close the sink"""
+        pass
+
+
+class JsonLinesEdgeSink(EdgeSink):
+    """An edge sink that appends edges to a JSON lines file"""
+
+    def __init__(self, save_file: str) -> None:
+        """An edge sink that appends edges to a JSON lines file
+
+        Args:
+            save_file (str):
+                A file path of JSON lines. If it is on GCS or S3,
+                edges are written to a temporary file and uploaded on close.
+        """
+        self.save_file = save_file
+        self.count: int = 0
+        self._is_remote = save_file.startswith((GCS_URI_SCHEME, S3_URI_SCHEME))
+        self._f: IO[str]
+        if self._is_remote:
+            self._f = tempfile.NamedTemporaryFile(
+                mode="w", suffix=JSON_LINES_SUFFIX, delete=False
+            )
+        else:
+            self._f = open(save_file, "w")
+
+    def write(
+        self,
+        table_name: str,
+        upstair_table_name: str,
+        mapped_template: MappedTemplate,
+    ) -> None:
+        """Write an edge between tables as a line
+
+        Args:
+            table_name (str): Downstairs table name
+            upstair_table_name (str): Upstairs table name
+            mapped_template (MappedTemplate): Template that connects tables
+        """
+        record = create_edge_record(
+            table_name=table_name,
+            upstair_table_name=upstair_table_name,
+            mapped_template=asdict(mapped_template),
+        )
+        self._f.write(json.dumps(record) + "\n")
+        self.count += 1
+
+    def close(self) -> None:
+        """Close the file, and upload it if the destination is remote"""
+        self._f.close()
+        if not self._is_remote:
+            return
+
+        try:
+            if self.save_file.startswith(GCS_URI_SCHEME):
+                from src.stairlight.source.gcs.map import get_gcs_blob
+
+                get_gcs_blob(uri=self.save_file).upload_from_filename(
+                    filename=self._f.name, content_type="application/jsonl"
+                )
+            else:
+                from src.stairlight.source.s3.map import get_s3_object
+
+                get_s3_object(uri=self.save_file).upload_file(Filename=self._f.name)
+        finally:
+            os.remove(self._f.name)
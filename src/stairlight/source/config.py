@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import logging
 from dataclasses import dataclass, field
-from typing import Any, Iterator, OrderedDict, Type
+from typing import TYPE_CHECKING, Any, Iterator, OrderedDict, Type
 
 from src.stairlight.source.config_key import MapKey
 
+if TYPE_CHECKING:
+    from src.stairlight.source.mapping_index import MappingIndex
+
 logger = logging.getLogger()
 
 
@@ -32,6 +35,20 @@ class StairlightConfigExclude:
 class StairlightConfigSettings:
     MappingFilesRegex: list[str] | None = None
     MappingPrefix: str | None = None
+    MaxWorkers: int | None = None
+    ProcessWorkers: int | None = None
+    ProcessChunkSize: int | None = None
+    CacheDir: str | None = None
+    CacheMaxSize: int | None = None
+    QueryEngine: str | None = None
+    QueryMemoMaxEntries: int | None = None
+    QueryMemoMaxBytes: int | None = None
+    LargeFileThreshold: int | None = None
+    LargeFileChunkSize: int | None = None
+    JinjaTemplateCacheMaxEntries: int | None = None
+    JinjaBytecodeCacheDir: str | None = None
+    TemplateTimeLimit: float | None = None
+    TemplateMemoryLimit: int | None = None
 
 
 @dataclass
@@ -136,6 +153,9 @@ class MappingConfig:
     Mapping: list[OrderedDict] = field(default_factory=list)
     ExtraLabels: list[dict[str, Any]] | None = None
     Metadata: list[dict[str, Any]] | None = None  # Deprecated
+    _mapping_index: MappingIndex | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
     def get_global(self) -> MappingConfigGlobal:
         """Get global section
@@ -161,6 +181,19 @@ class MappingConfig:
             )
             yield mapping_config(**_mapping)
 
+    def get_mapping_index(self) -> MappingIndex:
+        """Get an index of mapping section, built at the first call
+
+        Returns:
+            MappingIndex: Index of mapping section
+        """
+        # Avoid to occur circular imports
+        from src.stairlight.source.mapping_index import MappingIndex
+
+        if self._mapping_index is None:
+            self._mapping_index = MappingIndex(mapping_config=self)
+        return self._mapping_index
+
     def get_extra_labels(self) -> Iterator[MappingConfigExtraLabels]:
         """Get extra labels section
 
@@ -28,8 +28,23 @@ class StairlightConfigKey(Key):
     TEMPLATE_SOURCE_TYPE = "TemplateSourceType"
     DEFAULT_TABLE_PREFIX = "DefaultTablePrefix"
     REGEX = "Regex"
+    MAX_CONCURRENT_FETCHES = "MaxConcurrentFetches"
 
     MAPPING_PREFIX = "MappingPrefix"
+    MAX_WORKERS = "MaxWorkers"
+    PROCESS_WORKERS = "ProcessWorkers"
+    PROCESS_CHUNK_SIZE = "ProcessChunkSize"
+    CACHE_DIR = "CacheDir"
+    CACHE_MAX_SIZE = "CacheMaxSize"
+    QUERY_ENGINE = "QueryEngine"
+    QUERY_MEMO_MAX_ENTRIES = "QueryMemoMaxEntries"
+    QUERY_MEMO_MAX_BYTES = "QueryMemoMaxBytes"
+    LARGE_FILE_THRESHOLD = "LargeFileThreshold"
+    LARGE_FILE_CHUNK_SIZE = "LargeFileChunkSize"
+    JINJA_TEMPLATE_CACHE_MAX_ENTRIES = "JinjaTemplateCacheMaxEntries"
+    JINJA_BYTECODE_CACHE_DIR = "JinjaBytecodeCacheDir"
+    TEMPLATE_TIME_LIMIT = "TemplateTimeLimit"
+    TEMPLATE_MEMORY_LIMIT = "TemplateMemoryLimit"
 
     class File(Key):
         FILE_SYSTEM_PATH = "FileSystemPath"
@@ -96,6 +111,7 @@ class DbtProjectKey(Key):
 
 class MapKey(Key):
     TABLE_NAME = "TableName"
+    UPSTAIR_TABLE_NAME = "UpstairTableName"
     TEMPLATE_SOURCE_TYPE = "TemplateSourceType"
     KEY = "Key"
     URI = "Uri"
@@ -108,3 +124,4 @@ class MapKey(Key):
 
     TEMPLATE = "Template"
     PARAMETERS = "Parameters"
+    REASON = "Reason"
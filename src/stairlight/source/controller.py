@@ -7,6 +7,11 @@ from logging import getLogger
 from pathlib import Path
 from typing import Any, OrderedDict, Type
 
+from src.stairlight.sink import (
+    build_map_from_edge_records,
+    is_json_lines,
+    iterate_edge_records,
+)
 from src.stairlight.source.config import MappingConfigMapping
 from src.stairlight.source.config_key import GCS_URI_SCHEME, S3_URI_SCHEME
 from src.stairlight.source.dbt.config import MappingConfigMappingDbt
@@ -129,8 +134,27 @@ class SaveMapController:
         else:
             self._save_map_file()
 
+    def _dumps(self) -> str:
+        """Serialize mapped results
+
+        Returns:
+            str: JSON lines of edges if the file suffix is '.jsonl', otherwise JSON
+        """
+        if is_json_lines(file=self.save_file):
+            return "".join(
+                json.dumps(record) + "\n"
+                for record in iterate_edge_records(mapped=self._mapped)
+            )
+        return json.dumps(obj=self._mapped, indent=2)
+
     def _save_map_file(self) -> None:
         """Save mapped results to file system"""
+        if is_json_lines(file=self.save_file):
+            with open(self.save_file, "w") as f:
+                for record in iterate_edge_records(mapped=self._mapped):
+                    f.write(json.dumps(record) + "\n")
+            return
+
         with open(self.save_file, "w") as f:
             json.dump(self._mapped, f, indent=2)
 
@@ -142,7 +166,7 @@ class SaveMapController:
 
         blob: Blob = get_gcs_blob(uri=self.save_file)
         blob.upload_from_string(
-            data=json.dumps(obj=self._mapped, indent=2),
+            data=self._dumps(),
             content_type="application/json",
         )
 
@@ -153,13 +177,31 @@ class SaveMapController:
         from src.stairlight.source.s3.map import get_s3_object
 
         _object: Object = get_s3_object(uri=self.save_file)
-        _ = _object.put(Body=json.dumps(obj=self._mapped, indent=2))
+        _ = _object.put(Body=self._dumps())
 
 
 class LoadMapController:
     def __init__(self, load_file: str) -> None:
         self.load_file = load_file
 
+    def _loads(self, s: str | bytes) -> dict:
+        """Deserialize mapped results
+
+        Args:
+            s (str | bytes): JSON lines of edges if the file suffix is '.jsonl',
+                otherwise JSON
+
+        Returns:
+            dict: Loaded map
+        """
+        if is_json_lines(file=self.load_file):
+            if isinstance(s, bytes):
+                s = s.decode("utf-8")
+            return build_map_from_edge_records(
+                records=(json.loads(line) for line in s.splitlines() if line)
+            )
+        return json.loads(s)
+
     def load(self) -> dict:
         """Load mapped results
 
@@ -180,6 +222,12 @@ class LoadMapController:
         if not os.path.exists(self.load_file):
             logger.error(f"{self.load_file} is not found.")
             exit()
+        if is_json_lines(file=self.load_file):
+            with open(self.load_file) as f:
+                return build_map_from_edge_records(
+                    records=(json.loads(line) for line in f if line.strip())
+                )
+
         with open(self.load_file) as f:
             return json.load(f)
 
@@ -193,7 +241,7 @@ class LoadMapController:
         if not blob.exists():
             logger.error(f"{self.load_file} is not found.")
             exit()
-        return json.loads(blob.download_as_string())
+        return self._loads(blob.download_as_string())
 
     def _load_map_s3(self) -> dict:
         """Load mapped results from Amazon S3"""
@@ -209,4 +257,4 @@ class LoadMapController:
         if not body:
             logger.error(f"{self.load_file} is not found.")
             exit()
-        return json.loads(body.read().decode("utf-8"))
+        return self._loads(body.read().decode("utf-8"))
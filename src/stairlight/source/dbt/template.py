@@ -6,7 +6,7 @@ import pathlib
 import re
 import shlex
 import subprocess
-from typing import Any, Iterator
+from typing import Any, Iterator, Sequence
 
 import yaml
 
@@ -17,6 +17,8 @@ from src.stairlight.source.template import Template, TemplateSource, TemplateSou
 
 
 class DbtTemplate(Template):
+    IS_COMPILED = True
+
     def __init__(
         self,
         mapping_config: MappingConfig | None,
@@ -48,19 +50,55 @@ class DbtTemplate(Template):
         with open(self.key) as f:
             return f.read()
 
+    def get_local_path(self) -> str | None:
+        """Get a path of the template in local file system
+
+        Returns:
+            str | None: File path
+        """
+        return self.key
+
     def render(
-        self, params: dict[str, Any] = None, ignore_params: list[str] = None
+        self,
+        params: dict[str, Any] = None,
+        ignore_params: list[str] = None,
+        template_str: str | None = None,
     ) -> str:
         """Render a query statement from a jinja template
 
         Args:
             params (dict[str, Any]): Jinja parameters
             ignore_params (list[str]): Ignore parameters. Defaults to None.
+            template_str (str, optional):
+                Template string fetched in advance.
+                If it is None, it is read from a key. Defaults to None.
 
         Returns:
             str: Query statement
         """
-        return self.get_template_str()
+        return template_str if template_str is not None else self.get_template_str()
+
+    def render_many(
+        self,
+        param_sets: Sequence[dict[str, Any]],
+        ignore_params: list[str] | None = None,
+        template_str: str | None = None,
+    ) -> list[str]:
+        """Get query statements compiled by dbt, which are the same for any params
+
+        Args:
+            param_sets (Sequence[dict[str, Any]]): Sets of jinja parameters
+            ignore_params (list[str], optional):
+                Ignore parameters. Defaults to None.
+            template_str (str, optional):
+                Template string fetched in advance.
+                If it is None, it is read from a key. Defaults to None.
+
+        Returns:
+            list[str]: Query statements in the same order as parameter sets
+        """
+        query_str = self.render(template_str=template_str)
+        return [query_str for _ in param_sets]
 
 
 class DbtTemplateSource(TemplateSource):
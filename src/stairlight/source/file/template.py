@@ -45,6 +45,14 @@ class FileTemplate(Template):
         with open(self.key) as f:
             return f.read()
 
+    def get_local_path(self) -> str | None:
+        """Get a path of the template in local file system
+
+        Returns:
+            str | None: File path
+        """
+        return self.key
+
 
 class FileTemplateSource(TemplateSource):
     def __init__(
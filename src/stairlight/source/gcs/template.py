@@ -96,6 +96,14 @@ class GcsTemplateSource(TemplateSource):
                 default_table_prefix=self._include.DefaultTablePrefix,
             )
 
+    def get_max_concurrent_fetches(self) -> int | None:
+        """Get the number of template strings fetched concurrently
+
+        Returns:
+            int | None: 'MaxConcurrentFetches' in the include section
+        """
+        return self._include.MaxConcurrentFetches
+
     def is_skipped(self, blob: Any) -> bool:
         """Check the target path is skipped or not
 
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import Any
+
+from src.stairlight.source.config import MappingConfig, MappingConfigMappingTable
+from src.stairlight.source.template import TemplateSourceType
+
+
+class SuffixTrieNode:
+    """A node of SuffixTrie"""
+
+    __slots__ = ("children", "value")
+
+    def __init__(self) -> None:
+        self.children: dict[str, SuffixTrieNode] = {}
+        self.value: int | None = None
+
+
+class SuffixTrie:
+    """A trie of reversed strings to find suffixes of a string"""
+
+    def __init__(self) -> None:
+        self._root = SuffixTrieNode()
+
+    def insert(self, suffix: str, value: int) -> None:
+        """Insert a suffix. The smallest value is kept if it is duplicated.
+
+        Args:
+            suffix (str): Suffix
+            value (int): Value
+        """
+        node = self._root
+        for char in reversed(suffix):
+            node = node.children.setdefault(char, SuffixTrieNode())
+        if node.value is None or value < node.value:
+            node.value = value
+
+    def find_min(self, s: str) -> int | None:
+        """Find the smallest value of suffixes that the string ends with
+
+        Args:
+            s (str): String
+
+        Returns:
+            int | None: The smallest value if found
+        """
+        node: SuffixTrieNode | None = self._root
+        found: int | None = None
+        for char in reversed(s):
+            if node.value is not None and (found is None or node.value < found):
+                found = node.value
+            node = node.children.get(char)
+            if node is None:
+                return found
+        if node.value is not None and (found is None or node.value < found):
+            found = node.value
+        return found
+
+
+class MappingIndex:
+    """An index of mapping section to find mapped tables of a template"""
+
+    def __init__(self, mapping_config: MappingConfig) -> None:
+        """An index of mapping section to find mapped tables of a template
+
+        When multiple mappings match a template, the first one in mapping section
+        takes precedence, as well as a linear scan of mapping section.
+
+        Args:
+            mapping_config (MappingConfig): Mapping configuration
+        """
+        self._tables: list[list[MappingConfigMappingTable]] = []
+        self._file_suffixes = SuffixTrie()
+        self._uris: dict[str, int] = {}
+        self._redash_queries: dict[tuple[Any, Any], int] = {}
+
+        mapping: Any
+        for i, mapping in enumerate(mapping_config.get_mapping()):
+            self._tables.append(list(mapping.get_table()))
+            if mapping.TemplateSourceType in (
+                TemplateSourceType.FILE.value,
+                TemplateSourceType.DBT.value,
+            ):
+                if mapping.FileSuffix is not None:
+                    self._file_suffixes.insert(suffix=mapping.FileSuffix, value=i)
+            elif mapping.TemplateSourceType in (
+                TemplateSourceType.GCS.value,
+                TemplateSourceType.S3.value,
+            ):
+                self._uris.setdefault(mapping.Uri, i)
+            elif mapping.TemplateSourceType == TemplateSourceType.REDASH.value:
+                self._redash_queries.setdefault(
+                    (mapping.DataSourceName, mapping.QueryId), i
+                )
+
+    def find_tables(self, key: str, uri: str) -> list[MappingConfigMappingTable]:
+        """Find mapped tables by a template key or uri
+
+        Args:
+            key (str): Template key, compared with FileSuffix
+            uri (str): Template uri, compared with Uri
+
+        Returns:
+            list[MappingConfigMappingTable]: Mapped table attributes
+        """
+        found = [
+            i
+            for i in (self._file_suffixes.find_min(s=key), self._uris.get(uri))
+            if i is not None
+        ]
+        return self._tables[min(found)] if found else []
+
+    def find_redash_tables(
+        self, data_source_name: str, query_id: int
+    ) -> list[MappingConfigMappingTable]:
+        """Find mapped tables by a Redash data source name and query id
+
+        Args:
+            data_source_name (str): Data source name
+            query_id (int): Query id
+
+        Returns:
+            list[MappingConfigMappingTable]: Mapped table attributes
+        """
+        i = self._redash_queries.get((data_source_name, query_id))
+        return self._tables[i] if i is not None else []
@@ -45,18 +45,9 @@ class RedashTemplate(Template):
         Yields:
             Iterator[dict]: Mapped table attributes
         """
-        mapping: Any
-        for mapping in self._mapping_config.get_mapping():
-            if mapping.TemplateSourceType != self.source_type.value:
-                continue
-
-            if (
-                mapping.DataSourceName == self.data_source_name
-                and mapping.QueryId == self.query_id
-            ):
-                for table_attributes in mapping.get_table():
-                    yield table_attributes
-                break
+        yield from self._mapping_config.get_mapping_index().find_redash_tables(
+            data_source_name=self.data_source_name, query_id=self.query_id
+        )
 
     def get_template_str(self) -> str:
         """Get template string that read from Redash
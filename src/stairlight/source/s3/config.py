@@ -14,6 +14,7 @@ class StairlightConfigIncludeS3(StairlightConfigInclude):
     BucketName: str | None = None
     Regex: str | None = None
     DefaultTablePrefix: str | None = None
+    MaxConcurrentFetches: int | None = None
 
 
 @dataclass
@@ -111,6 +111,14 @@ class S3TemplateSource(TemplateSource):
                 default_table_prefix=self._include.DefaultTablePrefix,
             )
 
+    def get_max_concurrent_fetches(self) -> int | None:
+        """Get the number of template strings fetched concurrently
+
+        Returns:
+            int | None: 'MaxConcurrentFetches' in the include section
+        """
+        return self._include.MaxConcurrentFetches
+
     def is_skipped(self, obj: ObjectSummary) -> bool:
         """Check the target object is skipped or not
 
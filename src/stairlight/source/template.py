@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import enum
+import hashlib
+import os
 import re
+import threading
 from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from logging import getLogger
 from string import Template as StringTemplate
-from typing import Any, Iterator
+from typing import Any, Callable, Iterable, Iterator, Sequence
 
-from jinja2 import BaseLoader, Environment
-from jinja2.exceptions import UndefinedError
+from jinja2 import BaseLoader, Environment, FileSystemBytecodeCache
+from jinja2 import Template as JinjaTemplate
+from jinja2.exceptions import TemplateNotFound, UndefinedError
 
 from src.stairlight.source.config import (
     MappingConfig,
@@ -16,6 +23,11 @@ from src.stairlight.source.config import (
     StairlightConfig,
 )
 
+TEMPLATE_STR_STORE_MAX_BYTES_DEFAULT = 64 * 1024 * 1024
+JINJA_TEMPLATE_CACHE_MAX_ENTRIES_DEFAULT = 1000
+# Templates fetched ahead of consumers, relative to the number of fetch threads
+PREFETCH_WINDOW_FACTOR = 2
+
 logger = getLogger(__name__)
 
 
@@ -32,9 +44,185 @@ class TemplateSourceType(enum.Enum):
         return self.name
 
 
+class SourceLoader(BaseLoader):
+    """A jinja loader which loads template sources registered by their names
+
+    Sources are registered per thread, so that threads compile templates
+    with the same name at once.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+
+    @property
+    def sources(self) -> dict[str, str]:
+        """Return sources registered by the current thread
+
+        Returns:
+            dict[str, str]: Sources by names
+        """
+        if not hasattr(self._local, "sources"):
+            self._local.sources = {}
+        return self._local.sources
+
+    def get_source(
+        self, environment: Environment, template: str
+    ) -> tuple[str, str | None, Callable[[], bool]]:
+        if template not in self.sources:
+            raise TemplateNotFound(template)
+        return self.sources[template], None, lambda: True
+
+
+class JinjaEnvironment:
+    """A jinja environment shared by templates, with templates compiled by it"""
+
+    def __init__(
+        self, max_entries: int | None = None, bytecode_cache_dir: str | None = None
+    ) -> None:
+        """A jinja environment shared by templates, with templates compiled by it
+
+        Compiled templates are kept in memory by hashes of their sources, and
+        least recently used ones are removed when they exceed a limit.
+        If a bytecode cache directory is set, compiled code is also saved
+        there and loaded by later runs, as long as sources are unchanged.
+
+        Args:
+            max_entries (int, optional):
+                Maximum number of compiled templates kept in memory.
+                0 disables it. Defaults to JINJA_TEMPLATE_CACHE_MAX_ENTRIES_DEFAULT.
+            bytecode_cache_dir (str, optional):
+                A directory of the bytecode cache. Defaults to None.
+        """
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock = threading.Lock()
+        self._templates: OrderedDict[str, JinjaTemplate] = OrderedDict()
+        self.configure(max_entries=max_entries, bytecode_cache_dir=bytecode_cache_dir)
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def configure(
+        self, max_entries: int | None = None, bytecode_cache_dir: str | None = None
+    ) -> None:
+        """Create the environment with settings, which drops compiled templates
+
+        Args:
+            max_entries (int, optional):
+                Maximum number of compiled templates kept in memory.
+                0 disables it. Defaults to JINJA_TEMPLATE_CACHE_MAX_ENTRIES_DEFAULT.
+            bytecode_cache_dir (str, optional):
+                A directory of the bytecode cache. Defaults to None.
+        """
+        bytecode_cache: FileSystemBytecodeCache | None = None
+        if bytecode_cache_dir:
+            os.makedirs(bytecode_cache_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(directory=bytecode_cache_dir)
+
+        with self._lock:
+            self.max_entries = (
+                JINJA_TEMPLATE_CACHE_MAX_ENTRIES_DEFAULT
+                if max_entries is None
+                else max_entries
+            )
+            self.bytecode_cache_dir = bytecode_cache_dir
+            self._loader = SourceLoader()
+            # Compiled templates are kept by this class, not by the environment
+            self.environment = Environment(
+                loader=self._loader,
+                cache_size=0,
+                auto_reload=False,
+                bytecode_cache=bytecode_cache,
+            )
+            self._templates.clear()
+            self.hits = self.misses = 0
+
+    def get_template(self, source: str) -> JinjaTemplate:
+        """Get a template compiled from a source
+
+        Args:
+            source (str): Template source
+
+        Returns:
+            JinjaTemplate: Compiled template
+        """
+        name = hashlib.blake2b(
+            source.encode("utf-8", "surrogatepass"), digest_size=16
+        ).hexdigest()
+        with self._lock:
+            template = self._templates.get(name)
+            if template:
+                self._templates.move_to_end(name)
+                self.hits += 1
+                return template
+            self.misses += 1
+            environment = self.environment
+            loader = self._loader
+
+        # Compiled out of the lock, so that threads compile different templates
+        # at once. A template compiled by another thread in the meantime is kept.
+        loader.sources[name] = source
+        try:
+            template = environment.get_template(name)
+        finally:
+            del loader.sources[name]
+        with self._lock:
+            if self.max_entries and environment is self.environment:
+                template = self._templates.setdefault(name, template)
+                self._templates.move_to_end(name)
+                while len(self._templates) > self.max_entries:
+                    self._templates.popitem(last=False)
+        return template
+
+
+# Shared by all templates in a process
+jinja_environment = JinjaEnvironment()
+
+
+@dataclass(frozen=True)
+class TemplateSignature:
+    """Parameters of a template string, which are found without rendering it"""
+
+    # Expressions in '{{ }}', as Template.get_jinja_params returns
+    jinja_params: tuple[str, ...]
+    # Identifiers of '$name' and '${name}' of string.Template
+    string_template_params: frozenset[str]
+    # Whether '$' appears, including '$$' and invalid placeholders
+    has_dollar_signs: bool
+    has_dollar_escapes: bool
+
+    @property
+    def is_templated(self) -> bool:
+        """Check if rendering may change the template string
+
+        Returns:
+            bool: Whether it has jinja expressions or '$'
+        """
+        return bool(self.jinja_params) or self.has_dollar_signs
+
+    def is_ignored(self, ignore_params: list[str] | None) -> bool:
+        """Check if replacing ignore parameters changes the template string
+
+        Args:
+            ignore_params (list[str] | None): Ignore parameters
+
+        Returns:
+            bool: Whether any of them are found, or '$$' is unescaped
+        """
+        if not ignore_params:
+            return False
+        return self.has_dollar_escapes or any(
+            param in self.jinja_params or param in self.string_template_params
+            for param in ignore_params
+        )
+
+
 class Template(ABC):
     """Base query template"""
 
+    # Template strings of compiled templates are query statements as they are
+    IS_COMPILED = False
+
     def __init__(
         self,
         mapping_config: MappingConfig,
@@ -82,6 +270,8 @@ class Template(ABC):
         self.query_id = query_id
         self.project_name = project_name
         self.uri = ""
+        # A hash and a length of the template string, and its signature
+        self._signature: tuple[int, int, TemplateSignature] | None = None
 
     def find_mapped_table_attributes(self) -> Iterator[MappingConfigMappingTable]:
         """Get mapped tables as iterator
@@ -89,28 +279,9 @@ class Template(ABC):
         Yields:
             Iterator[dict]: Mapped table attributes
         """
-        mapping: Any
-        for mapping in self._mapping_config.get_mapping():
-            found: bool = False
-            if mapping.TemplateSourceType in (
-                TemplateSourceType.FILE.value,
-                TemplateSourceType.DBT.value,
-            ):
-                if self.key.endswith(mapping.FileSuffix):
-                    found = True
-            elif mapping.TemplateSourceType in (
-                TemplateSourceType.GCS.value,
-                TemplateSourceType.S3.value,
-            ):
-                if self.uri == mapping.Uri:
-                    found = True
-
-            if not found:
-                continue
-
-            for table_attributes in mapping.get_table():
-                yield table_attributes
-            break
+        yield from self._mapping_config.get_mapping_index().find_tables(
+            key=self.key, uri=self.uri
+        )
 
     @property
     def mapped(self) -> bool:
@@ -143,16 +314,61 @@ class Template(ABC):
             for param in re.findall("[^{}]+", jinja_expressions, re.IGNORECASE)
         ]
 
+    def get_signature(self, template_str: str | None = None) -> TemplateSignature:
+        """Get parameters of the template, which are cached on it
+
+        Args:
+            template_str (str, optional):
+                Template string fetched in advance.
+                If it is None, it is read from template source. Defaults to None.
+
+        Returns:
+            TemplateSignature: Template signature
+        """
+        if template_str is None:
+            template_str = self.get_template_str()
+        # A hash of a string is computed once and kept by the string
+        if (
+            self._signature
+            and self._signature[0] == hash(template_str)
+            and self._signature[1] == len(template_str)
+        ):
+            return self._signature[2]
+
+        string_template_params: set[str] = set()
+        has_dollar_escapes = False
+        has_dollar_signs = "$" in template_str
+        if has_dollar_signs:
+            for match in StringTemplate.pattern.finditer(template_str):
+                param = match.group("named") or match.group("braced")
+                if param:
+                    string_template_params.add(param)
+                elif match.group("escaped") is not None:
+                    has_dollar_escapes = True
+
+        signature = TemplateSignature(
+            jinja_params=tuple(self.get_jinja_params(template_str=template_str)),
+            string_template_params=frozenset(string_template_params),
+            has_dollar_signs=has_dollar_signs,
+            has_dollar_escapes=has_dollar_escapes,
+        )
+        self._signature = (hash(template_str), len(template_str), signature)
+        return signature
+
     def render_by_jinja(
         self,
         template_str: str,
         params: dict[str, Any],
+        jinja_template: JinjaTemplate | None = None,
     ) -> str:
         """Render query string by jinja2
 
         Args:
             template_str (str): template string
             params (dict[str, Any]): Jinja parameters
+            jinja_template (JinjaTemplate, optional):
+                A template compiled from the template string in advance.
+                Defaults to None.
 
         Raises:
             RenderingTemplateException: class RenderingTemplateException
@@ -160,14 +376,14 @@ class Template(ABC):
         Returns:
             str: rendered query string
         """
-        if not self.get_jinja_params(template_str=template_str):
-            return template_str
+        if not jinja_template:
+            if not self.get_jinja_params(template_str=template_str):
+                return template_str
+            jinja_template = jinja_environment.get_template(source=template_str)
 
         rendered_str: str = template_str
         try:
-            env = Environment(loader=BaseLoader())
-            template = env.from_string(template_str)
-            rendered_str = template.render(params)
+            rendered_str = jinja_template.render(params)
         except UndefinedError as undefined_error:
             logger.warning(
                 (
@@ -182,17 +398,21 @@ class Template(ABC):
         self,
         template_str: str,
         params: dict[str, Any],
+        string_template: StringTemplate | None = None,
     ) -> str:
         """_summary_
 
         Args:
             template_str (str): template string
             params (dict[str, Any]): mapping dict
+            string_template (StringTemplate, optional):
+                A string.Template of the template string created in advance.
+                Defaults to None.
 
         Returns:
             str: rendered query string
         """
-        s = StringTemplate(template=template_str)
+        s = string_template or StringTemplate(template=template_str)
 
         try:
             rendered_str = s.substitute(params)
@@ -269,38 +489,213 @@ class Template(ABC):
         """Get template strings that read from template source"""
         pass
 
-    def render(self, params: dict[str, Any], ignore_params: list[str] = None) -> str:
+    def get_local_path(self) -> str | None:
+        """Get a path of the template in local file system
+
+        Returns:
+            str | None: File path, None if the template is not a local file
+        """
+        return None
+
+    def render(
+        self,
+        params: dict[str, Any],
+        ignore_params: list[str] = None,
+        template_str: str | None = None,
+    ) -> str:
         """Render a query statement from a jinja template
         Args:
             params (dict[str, Any]): Jinja parameters
             ignore_params (list[str]): Ignore parameters. Defaults to None.
+            template_str (str, optional):
+                Template string fetched in advance.
+                If it is None, it is read from template source. Defaults to None.
         Returns:
             str: Query statement
         """
-        rendered_str = self.get_template_str()
-        rendered_str = self.ignore_jinja_params(
-            template_str=rendered_str,
+        return self.render_many(
+            param_sets=[params],
             ignore_params=ignore_params,
-        )
-        rendered_str = self.ignore_string_template_params(
-            template_str=rendered_str,
-            ignore_params=ignore_params,
-        )
+            template_str=template_str,
+        )[0]
+
+    def render_many(
+        self,
+        param_sets: Sequence[dict[str, Any]],
+        ignore_params: list[str] | None = None,
+        template_str: str | None = None,
+    ) -> list[str]:
+        """Render query statements from a template with sets of parameters
 
-        if not params:
-            return rendered_str
+        The template is read, its ignore parameters are replaced, and it is
+        compiled only once, then every set of parameters is rendered with it.
+        A template without jinja expressions or '$' is returned as it is.
 
-        rendered_str = self.render_by_jinja(
-            template_str=rendered_str,
-            params=params,
-        )
+        Args:
+            param_sets (Sequence[dict[str, Any]]): Sets of jinja parameters
+            ignore_params (list[str], optional):
+                Ignore parameters. Defaults to None.
+            template_str (str, optional):
+                Template string fetched in advance.
+                If it is None, it is read from template source. Defaults to None.
 
-        rendered_str = self.render_by_string_template(
-            template_str=rendered_str,
-            params=params,
+        Returns:
+            list[str]: Query statements in the same order as parameter sets
+        """
+        prepared_str = (
+            template_str if template_str is not None else self.get_template_str()
         )
+        signature = self.get_signature(template_str=prepared_str)
+        if not signature.is_templated:
+            return [prepared_str for _ in param_sets]
+
+        jinja_params = signature.jinja_params
+        if signature.is_ignored(ignore_params=ignore_params):
+            prepared_str = self.ignore_jinja_params(
+                template_str=prepared_str,
+                ignore_params=ignore_params,
+            )
+            prepared_str = self.ignore_string_template_params(
+                template_str=prepared_str,
+                ignore_params=ignore_params,
+            )
+            jinja_params = tuple(self.get_jinja_params(template_str=prepared_str))
+        if not any(param_sets):
+            return [prepared_str for _ in param_sets]
+
+        jinja_template: JinjaTemplate | None = None
+        string_template: StringTemplate | None = None
+        if jinja_params:
+            jinja_template = jinja_environment.get_template(source=prepared_str)
+        else:
+            # A string.Template is shared if jinja renders nothing
+            string_template = StringTemplate(template=prepared_str)
+
+        rendered_strs: list[str] = []
+        for params in param_sets:
+            if not params:
+                rendered_strs.append(prepared_str)
+                continue
 
-        return rendered_str
+            rendered_str = prepared_str
+            if jinja_template:
+                rendered_str = self.render_by_jinja(
+                    template_str=prepared_str,
+                    params=params,
+                    jinja_template=jinja_template,
+                )
+            rendered_strs.append(
+                self.render_by_string_template(
+                    template_str=rendered_str,
+                    params=params,
+                    string_template=string_template,
+                )
+            )
+        return rendered_strs
+
+
+class TemplateStrStore:
+    """A byte-budgeted LRU store of template strings"""
+
+    def __init__(self, max_bytes: int = TEMPLATE_STR_STORE_MAX_BYTES_DEFAULT) -> None:
+        """A byte-budgeted LRU store of template strings
+
+        A template string is read from template source at the first access,
+        and served from memory until it is released or evicted.
+
+        Args:
+            max_bytes (int, optional):
+                Maximum total size of stored template strings in bytes.
+                Defaults to TEMPLATE_STR_STORE_MAX_BYTES_DEFAULT.
+        """
+        self.max_bytes = max_bytes
+        self.bytes_fetched: int = 0
+        self.bytes_served: int = 0
+        self.evictions: int = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Template, tuple[str, int]] = OrderedDict()
+        self._size: int = 0
+
+    def get(self, template: Template) -> str:
+        """Get a template string
+
+        Args:
+            template (Template): Query template
+
+        Returns:
+            str: Template string
+        """
+        with self._lock:
+            entry = self._entries.get(template)
+            if entry:
+                self._entries.move_to_end(template)
+                self.bytes_served += entry[1]
+                return entry[0]
+
+        template_str = template.get_template_str()
+        size = len(template_str.encode("utf-8"))
+        with self._lock:
+            self.bytes_fetched += size
+            self._entries[template] = (template_str, size)
+            self._size += size
+            while len(self._entries) > 1 and self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.evictions += 1
+        return template_str
+
+    def prefetch(
+        self, templates: Iterable[Template], max_concurrency: int
+    ) -> Iterator[Template]:
+        """Fetch template strings ahead of consumers
+
+        Template strings are fetched by a thread pool while consumers
+        render and parse templates that have been yielded. Templates are
+        yielded in the same order, after their strings are stored.
+        A failed fetch is not raised here, but it is retried and raised
+        when a consumer gets the string.
+
+        Args:
+            templates (Iterable[Template]): Query templates
+            max_concurrency (int): The number of concurrent fetches
+
+        Yields:
+            Iterator[Template]: Query templates
+        """
+        in_flight: deque[tuple[Template, Future[str]]] = deque()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            for template in templates:
+                in_flight.append((template, executor.submit(self.get, template)))
+                if len(in_flight) >= max_concurrency * PREFETCH_WINDOW_FACTOR:
+                    yield self._wait_prefetched(in_flight=in_flight)
+            while in_flight:
+                yield self._wait_prefetched(in_flight=in_flight)
+
+    @staticmethod
+    def _wait_prefetched(in_flight: deque[tuple[Template, Future[str]]]) -> Template:
+        """Wait for the oldest fetch in flight
+
+        Args:
+            in_flight (deque[tuple[Template, Future[str]]]): Fetches in flight
+
+        Returns:
+            Template: Query template
+        """
+        template, future = in_flight.popleft()
+        if future.exception():
+            logger.debug(f"Prefetching failed, it will be retried: {template.uri}")
+        return template
+
+    def release(self, template: Template) -> None:
+        """Release a template string that is no longer used
+
+        Args:
+            template (Template): Query template
+        """
+        with self._lock:
+            entry = self._entries.pop(template, None)
+            if entry:
+                self._size -= entry[1]
 
 
 class RenderingTemplateException(Exception):
@@ -347,6 +742,15 @@ class TemplateSource(ABC):
         """
         pass
 
+    def get_max_concurrent_fetches(self) -> int | None:
+        """Get the number of template strings fetched concurrently
+
+        Returns:
+            int | None: The number of concurrent fetches,
+                None if template strings are fetched when they are used
+        """
+        return None
+
     def is_excluded(self, source_type: TemplateSourceType, key: str) -> bool:
         """Check if the specified file is out of scope
 
@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import re
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Callable
+
+IDENTIFIER = r"(?:`[^`]*(?:`|\Z)|[\w.]|-(?!-))+"
+# Not to find keywords in a part of identifiers, like "date_from"
+NOT_AFTER_IDENTIFIER = r"(?<![\w.`-])"
+NOT_BEFORE_IDENTIFIER = r"(?![\w.`-])"
+
+# Line boundaries recognized by str.splitlines
+LINE_BREAK_PATTERN = re.compile(r"\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+
+# Only tokens which change a state are matched, and others are skipped over.
+# The leading lookahead lets positions which start no token be skipped quickly.
+SCAN_PATTERN = re.compile(
+    rf"""
+    (?=[-/'"`EeFfJjWw();])
+    (?:
+    (?P<comment>--[^\n]*|/\*.*?(?:\*/|\Z))
+    |(?P<string>'(?:[^'\\]|\\.|'')*(?:'|\Z)|"(?:[^"\\]|\\.|"")*(?:"|\Z))
+    |(?P<quoted>`[^`]*(?:`|\Z))
+    |{NOT_AFTER_IDENTIFIER}(?P<function>EXTRACT)\s*(?=\()
+    |{NOT_AFTER_IDENTIFIER}(?P<keyword>FROM|JOIN|WITH){NOT_BEFORE_IDENTIFIER}
+    |(?P<open>\()
+    |(?P<close>\))
+    |(?P<end>;)
+    )
+    """,
+    re.VERBOSE | re.DOTALL | re.IGNORECASE,
+)
+SKIP_PATTERN = re.compile(r"(?:\s+|--[^\n]*|/\*.*?(?:\*/|\Z))*", re.DOTALL)
+IDENTIFIER_PATTERN = re.compile(IDENTIFIER)
+# "name AS (" of "WITH name AS (...), name AS (...)"
+CTE_PATTERN = re.compile(
+    rf"(?:RECURSIVE\s+)?({IDENTIFIER})\s+AS\s*(?=\()", re.DOTALL | re.IGNORECASE
+)
+COMMA_PATTERN = re.compile(",")
+
+EXCLUDED_TABLES = frozenset(["UNNEST"])
+# Characters kept for the next chunk, which are enough to look ahead
+# from a keyword, like "FROM" followed by a table name or comments
+SCAN_MARGIN_DEFAULT = 64 * 1024
+FUNCTION_PARENTHESIS = "function"
+
+
+class LineIndex:
+    """Offsets of lines in a query statement"""
+
+    def __init__(self, query_str: str) -> None:
+        """Offsets of lines in a query statement
+
+        Lines are split in the same way as str.splitlines,
+        without copying each line.
+
+        Args:
+            query_str (str): Query statement
+        """
+        self.query_str = query_str
+        # Offsets where each line starts, and where its line break starts
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        start = 0
+        for match in LINE_BREAK_PATTERN.finditer(query_str):
+            self.starts.append(start)
+            self.ends.append(match.start())
+            start = match.end()
+        if start < len(query_str):
+            self.starts.append(start)
+            self.ends.append(len(query_str))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def find(self, offset: int) -> int:
+        """Find a line which contains an offset
+
+        Args:
+            offset (int): Offset in the query statement
+
+        Returns:
+            int: Line index
+        """
+        return bisect_right(self.starts, offset) - 1
+
+    def get_line(self, line_index: int) -> str:
+        """Get a line without its line break
+
+        Args:
+            line_index (int): Line index
+
+        Returns:
+            str: Line string
+        """
+        start, end = self.starts[line_index], self.ends[line_index]
+        return self.query_str[start:end]
+
+
+@dataclass
+class WithClause:
+    """A WITH clause which defines Common-Table-Expressions(CTE)"""
+
+    depth: int
+    names: set[str] = field(default_factory=set)
+    # Whether the next parenthesis is a body of a CTE
+    expects_body: bool = False
+    in_body: bool = False
+
+
+@dataclass
+class LexedQuery:
+    line_index: LineIndex
+    tables: list[str] = field(default_factory=list)
+    # Spans of comments and string literals, in ascending order
+    ignored_starts: array = field(default_factory=lambda: array("q"))
+    ignored_ends: array = field(default_factory=lambda: array("q"))
+
+    def find_line_indexes(self, table: str) -> list[int]:
+        """Find lines which contain a table name out of comments and strings
+
+        Args:
+            table (str): Table name
+
+        Returns:
+            list[int]: Line indexes in ascending order
+        """
+        query_str = self.line_index.query_str
+        line_indexes: list[int] = []
+        position = query_str.find(table)
+        while position >= 0:
+            span_index = bisect_right(self.ignored_starts, position) - 1
+            if span_index < 0 or self.ignored_ends[span_index] <= position:
+                line_index = self.line_index.find(offset=position)
+                if line_indexes[-1:] != [line_index]:
+                    line_indexes.append(line_index)
+            position = query_str.find(table, position + 1)
+        return line_indexes
+
+
+class IncompleteTokenException(Exception):
+    """A token may continue in the next chunk"""
+
+    pass
+
+
+class QueryLexer:
+    """A lexer which extracts upstairs tables from chunks of a query statement"""
+
+    def __init__(self, margin: int = SCAN_MARGIN_DEFAULT) -> None:
+        """A lexer which extracts upstairs tables from chunks of a query statement
+
+        Text is scanned as it is fed. Tokens within the margin from the end of
+        fed text are kept until the next chunk, since they may continue
+        in it. So are constructs like "FROM table" that need to look ahead.
+
+        Args:
+            margin (int, optional):
+                Characters kept for the next chunk, which must be longer than
+                keywords and names of CTEs. Defaults to SCAN_MARGIN_DEFAULT.
+        """
+        self.margin = margin
+        self.tables: set[str] = set()
+        # Spans of comments and string literals, in ascending order
+        self.ignored_starts: array = array("q")
+        self.ignored_ends: array = array("q")
+        # Kinds of open parentheses, and WITH clauses from outer to inner
+        self._parentheses: list[str] = []
+        self._with_clauses: list[WithClause] = []
+        self._opens_function = False
+        # Text which has not been scanned yet, and its offset in the query
+        self._buffer = ""
+        self._offset = 0
+        # Characters at the head of the buffer, which have been scanned
+        self._context = 0
+
+    def feed(self, text: str, final: bool = False) -> None:
+        """Scan a chunk of a query statement
+
+        Args:
+            text (str): A chunk which follows chunks fed before
+            final (bool, optional): Whether it is the last chunk. Defaults to False.
+        """
+        buffer = self._buffer + text if self._buffer else text
+        safe_end = len(buffer) if final else len(buffer) - self.margin
+
+        def match_next(pattern: re.Pattern, position: int) -> re.Match | None:
+            position = SKIP_PATTERN.match(buffer, position).end()
+            next_match = pattern.match(buffer, position)
+            # The next chunk may complete or change the match
+            end = next_match.end() if next_match else position + self.margin
+            if not final and end >= len(buffer):
+                raise IncompleteTokenException()
+            return next_match
+
+        def define_cte(clause: WithClause, cte: re.Match | None) -> None:
+            if cte:
+                clause.names.add(cte.group(1))
+            clause.expects_body = cte is not None
+
+        rest = max(safe_end, self._context)
+        for match in SCAN_PATTERN.finditer(buffer, self._context):
+            if not final and (match.start() >= safe_end or match.end() == len(buffer)):
+                rest = match.start()
+                break
+            try:
+                self._scan(
+                    match=match,
+                    offset=self._offset,
+                    match_next=match_next,
+                    define_cte=define_cte,
+                )
+            except IncompleteTokenException:
+                rest = match.start()
+                break
+            rest = match.end()
+
+        if final:
+            rest = len(buffer)
+        # A character before the rest is kept for lookbehinds of keywords
+        context = min(rest, 1)
+        kept = rest - context
+        self._buffer = buffer[kept:]
+        self._context = context
+        self._offset += kept
+
+    @property
+    def scanned_offset(self) -> int:
+        """Offset before which text has been scanned
+
+        Returns:
+            int: Offset in the query statement
+        """
+        return self._offset + self._context
+
+    def discard_ignored_spans(self, before: int) -> None:
+        """Discard spans of comments and strings that are no longer needed
+
+        Args:
+            before (int): Offset before which spans end
+        """
+        count = bisect_right(self.ignored_ends, before)
+        del self.ignored_starts[:count]
+        del self.ignored_ends[:count]
+
+    def _scan(
+        self,
+        match: re.Match,
+        offset: int,
+        match_next: Callable[[re.Pattern, int], re.Match | None],
+        define_cte: Callable[[WithClause, re.Match | None], None],
+    ) -> None:
+        """Change states by a token
+
+        Tokens are looked ahead before states are changed, so that a token
+        can be scanned again if IncompleteTokenException is raised.
+
+        Args:
+            match (re.Match): A token matched with SCAN_PATTERN
+            offset (int): Offset of the buffer in the query statement
+            match_next (Callable[[re.Pattern, int], re.Match | None]):
+                A function which matches a pattern after comments and spaces
+            define_cte (Callable[[WithClause, re.Match | None], None]):
+                A function which adds a CTE to a WITH clause
+        """
+        parentheses = self._parentheses
+        with_clauses = self._with_clauses
+        kind = match.lastgroup
+        if kind == "comment" or kind == "string":
+            self.ignored_starts.append(offset + match.start())
+            self.ignored_ends.append(offset + match.end())
+        elif kind == "keyword":
+            keyword = match.group(kind).upper()
+            if keyword == "WITH":
+                cte = match_next(CTE_PATTERN, match.end())
+                with_clauses.append(WithClause(depth=len(parentheses)))
+                define_cte(with_clauses[-1], cte)
+                return
+            if keyword == "FROM" and parentheses[-1:] == [FUNCTION_PARENTHESIS]:
+                return
+            table = match_next(IDENTIFIER_PATTERN, match.end())
+            if not table or table.group().upper() in EXCLUDED_TABLES:
+                return
+            if not any(table.group() in clause.names for clause in with_clauses):
+                self.tables.add(table.group())
+        elif kind == "function":
+            self._opens_function = True
+        elif kind == "open":
+            parentheses.append(FUNCTION_PARENTHESIS if self._opens_function else "")
+            self._opens_function = False
+            if with_clauses and with_clauses[-1].expects_body:
+                with_clauses[-1].expects_body = False
+                with_clauses[-1].in_body = True
+        elif kind == "close":
+            depth = max(len(parentheses) - 1, 0)
+            # CTE names are out of scope when the enclosing parenthesis is closed
+            scopes = len(with_clauses)
+            while scopes and with_clauses[scopes - 1].depth > depth:
+                scopes -= 1
+            clause = with_clauses[scopes - 1] if scopes else None
+            closes_cte = clause and clause.in_body and clause.depth == depth
+            cte = None
+            if closes_cte:
+                comma = match_next(COMMA_PATTERN, match.end())
+                cte = match_next(CTE_PATTERN, comma.end()) if comma else None
+
+            if parentheses:
+                parentheses.pop()
+            del with_clauses[scopes:]
+            if clause and closes_cte:
+                clause.in_body = False
+                if cte:
+                    define_cte(clause, cte)
+        elif kind == "end":
+            parentheses.clear()
+            with_clauses.clear()
+
+
+def lex_query(query_str: str, line_index: LineIndex | None = None) -> LexedQuery:
+    """Extract upstairs tables from a query statement in a single pass
+
+    A table is an identifier which follows FROM or JOIN, except names of
+    Common-Table-Expressions(CTE) visible in the scope, FROM in arguments
+    of functions like EXTRACT, and UNNEST.
+
+    Args:
+        query_str (str): Query statement
+        line_index (LineIndex, optional):
+            Line index of the query statement. Defaults to None.
+
+    Returns:
+        LexedQuery: Upstairs tables and spans of comments and strings
+    """
+    lexer = QueryLexer()
+    lexer.feed(text=query_str, final=True)
+    return LexedQuery(
+        line_index=line_index or LineIndex(query_str=query_str),
+        tables=sorted(lexer.tables),
+        ignored_starts=lexer.ignored_starts,
+        ignored_ends=lexer.ignored_ends,
+    )
@@ -2,13 +2,22 @@ from __future__ import annotations
 
 import enum
 import os
-from dataclasses import asdict
+from collections import deque
+from dataclasses import asdict, dataclass, field
 from logging import getLogger
-from typing import Any, OrderedDict
+from typing import Any, Iterator, Mapping, OrderedDict
 
 import src.stairlight.util as sl_util
+from src.stairlight.cache import MappingCache, query_memo
 from src.stairlight.configurator import Configurator
-from src.stairlight.map import Map, MappedTemplate
+from src.stairlight.graph import (
+    DependencyGraph,
+    DependencyGraphBuilder,
+    MappedView,
+    TransitiveClosure,
+)
+from src.stairlight.map import Map, MappedTemplate, restore_mapped_template
+from src.stairlight.sink import EdgeSink, JsonLinesEdgeSink, is_json_lines
 from src.stairlight.source.config import (
     MapKey,
     MappingConfig,
@@ -17,7 +26,7 @@ from src.stairlight.source.config import (
 )
 from src.stairlight.source.config_key import MappingConfigKey
 from src.stairlight.source.controller import LoadMapController, SaveMapController
-from src.stairlight.source.template import TemplateSourceType
+from src.stairlight.source.template import TemplateSourceType, jinja_environment
 
 STAIRLIGHT_CONFIG_PREFIX_DEFAULT = "stairlight"
 MAPPING_CONFIG_PREFIX_DEFAULT = "mapping"
@@ -47,6 +56,50 @@ class SearchDirection(enum.Enum):
         return self.name
 
 
+@dataclass
+class SearchFrame:
+    """A table being searched, and its results so far"""
+
+    table_name: str
+    relative_items: Iterator[tuple[str, list[dict[str, Any]]]]
+    results: dict[str, dict[str, Any]] = field(default_factory=dict)
+    # The smallest depth of tables on the path that circular references reach
+    cycle_depth: int | None = None
+
+    def reach_cycle(self, depth: int) -> None:
+        """Record a circular reference to a table on the path
+
+        Args:
+            depth (int): Depth of the table
+        """
+        if self.cycle_depth is None or depth < self.cycle_depth:
+            self.cycle_depth = depth
+
+
+@dataclass
+class SearchRecord:
+    """A template which refers to a table found by a search"""
+
+    TableName: str
+    Depth: int
+    # A table which the template belongs to(up) or reads(down)
+    Parent: str
+    Template: dict[str, Any]
+
+
+def get_remaining_depth(depth: int | None, current_depth: int) -> int | None:
+    """Get the remaining depth of a recursive search
+
+    Args:
+        depth (int | None): Maximum depth, None means no limit
+        current_depth (int): Current depth
+
+    Returns:
+        int | None: Remaining depth, None means no limit
+    """
+    return None if depth is None else depth - current_depth
+
+
 class StairLight:
     """A table dependency detector"""
 
@@ -57,6 +110,7 @@ class StairLight:
         save_file: str = "",
         stairlight_config_prefix: str = STAIRLIGHT_CONFIG_PREFIX_DEFAULT,
         mapping_config_prefix: str = MAPPING_CONFIG_PREFIX_DEFAULT,
+        max_workers: int | None = None,
     ) -> None:
         """A table dependency detector
 
@@ -67,14 +121,22 @@ class StairLight:
                 file names of loading results if load option set. Defaults to None.
             save_file (str, optional):
                 A file name of saving results if save option set. Defaults to None.
+            max_workers (int, optional):
+                The number of threads that process templates concurrently.
+                It takes precedence over 'MaxWorkers' in settings section.
+                Defaults to None.
         """
         self.load_files = load_files
         self.save_file: str = save_file
+        self.max_workers: int | None = max_workers
         self._configurator = Configurator(dir=config_dir)
-        self._mapped: dict[str, dict[str, list[MappedTemplate] | None] | None] = {}
+        self._graph: DependencyGraph = DependencyGraph()
         self._unmapped: list[dict[str, Any]] = []
         self._not_found: list[str] = []
         self._mapping_config: MappingConfig | None = None
+        self._settings: StairlightConfigSettings = StairlightConfigSettings()
+        self._streamed: bool = False
+        self._lineage_precomputed: bool = False
         self._stairlight_config_prefix: str = stairlight_config_prefix
         self._mapping_config_prefix: str = mapping_config_prefix
         self._stairlight_config: StairlightConfig = self._configurator.read_stairlight(
@@ -82,13 +144,40 @@ class StairLight:
         )
 
     @property
-    def mapped(self) -> dict[str, dict[str, list[MappedTemplate] | None] | None]:
+    def mapped(self) -> Mapping[str, dict[str, list[MappedTemplate]]]:
         """Return mapped
 
+        It is a read-only view of the dependency graph in the shape of a dict.
+        If edges have been streamed to the save file, they are loaded from it
+        on first access.
+
+        Returns:
+            Mapping: Mapped results
+        """
+        return MappedView(graph=self.graph)
+
+    @property
+    def graph(self) -> DependencyGraph:
+        """Return the dependency graph
+
         Returns:
-            dict: Mapped results
+            DependencyGraph: Dependency graph
         """
-        return self._mapped
+        if self._streamed and not len(self._graph):
+            loaded_map = LoadMapController(load_file=self.save_file).load()
+            self._graph = DependencyGraph.from_mapped(
+                mapped={
+                    table_name: {
+                        upstair_name: [
+                            restore_mapped_template(mapped_template=mapped_template)
+                            for mapped_template in mapped_templates
+                        ]
+                        for upstair_name, mapped_templates in upstairs.items()
+                    }
+                    for table_name, upstairs in loaded_map.items()
+                }
+            )
+        return self._graph
 
     @property
     def unmapped(self) -> list[dict[str, Any]]:
@@ -126,14 +215,15 @@ class StairLight:
             self._set_config()
             self._write_map()
 
-        if self.save_file:
+        # Edges have already been saved while writing the map
+        if self.save_file and not self._streamed:
             self.save_map()
 
     def save_map(self) -> None:
         """Save mapped results"""
         save_map_controller = SaveMapController(
             save_file=self.save_file,
-            mapped=self.cast_mapped_dict_all(mapped=self._mapped),
+            mapped=self.cast_mapped_dict_all(mapped=self.mapped),
         )
         save_map_controller.save()
 
@@ -141,14 +231,16 @@ class StairLight:
         """Load mapped results"""
         if not self.load_files:
             return
+        mapped: dict[str, Any] = self._graph.to_mapped()
         for load_file in self.load_files:
             load_map_controller = LoadMapController(load_file=load_file)
             loaded_map = load_map_controller.load()
 
-            if self._mapped:
-                self._mapped = sl_util.deep_merge(original=self._mapped, add=loaded_map)
+            if mapped:
+                mapped = sl_util.deep_merge(original=mapped, add=loaded_map)
             else:
-                self._mapped = loaded_map
+                mapped = loaded_map
+        self._graph = DependencyGraph.from_mapped(mapped=mapped)
 
     def _set_config(self) -> None:
         """Set configurations"""
@@ -160,6 +252,7 @@ class StairLight:
             settings: StairlightConfigSettings = StairlightConfigSettings(
                 **self._stairlight_config.Settings
             )
+            self._settings = settings
             mapping_config_prefix: str = (
                 settings.MappingPrefix
                 if settings.MappingPrefix
@@ -182,23 +275,100 @@ class StairLight:
 
     def _write_map(self) -> None:
         """Write a dependency map"""
+        cache: MappingCache | None = None
+        if self._settings.CacheDir:
+            cache = MappingCache(
+                dir=self._settings.CacheDir, max_size=self._settings.CacheMaxSize
+            )
+
+        query_memo.configure(
+            max_entries=self._settings.QueryMemoMaxEntries,
+            max_bytes=self._settings.QueryMemoMaxBytes,
+        )
+        jinja_environment.configure(
+            max_entries=self._settings.JinjaTemplateCacheMaxEntries,
+            bytecode_cache_dir=self._settings.JinjaBytecodeCacheDir,
+        )
+
+        # Save edges as JSON lines without keeping the map in memory
+        edge_sink: EdgeSink | None = None
+        if self.save_file and is_json_lines(file=self.save_file):
+            edge_sink = JsonLinesEdgeSink(save_file=self.save_file)
+        # Build the graph from edges without keeping the map as a dict
+        graph_builder = DependencyGraphBuilder()
+
         dependency_map = Map(
             stairlight_config=self._stairlight_config,
             mapping_config=self._mapping_config,
+            max_workers=(
+                self.max_workers
+                if self.max_workers is not None
+                else self._settings.MaxWorkers
+            ),
+            cache=cache,
+            edge_sink=edge_sink,
+            max_processes=self._settings.ProcessWorkers,
+            process_chunk_size=self._settings.ProcessChunkSize,
+            query_engine=self._settings.QueryEngine,
+            large_file_threshold=self._settings.LargeFileThreshold,
+            large_file_chunk_size=self._settings.LargeFileChunkSize,
+            template_time_limit=self._settings.TemplateTimeLimit,
+            template_memory_limit=self._settings.TemplateMemoryLimit,
+            graph_builder=graph_builder,
         )
 
-        dependency_map.write()
+        try:
+            dependency_map.write()
+        finally:
+            if edge_sink:
+                edge_sink.close()
+        logger.info(
+            f"Query memo: hits={query_memo.hits}, misses={query_memo.misses}, "
+            f"evictions={query_memo.evictions}, hit_rate={query_memo.hit_rate:.2%}"
+        )
+        logger.info(
+            f"Jinja templates: compiled={jinja_environment.misses}, "
+            f"reused={jinja_environment.hits}"
+        )
+        if cache:
+            logger.info(
+                f"Mapping cache: hits={cache.hits}, misses={cache.misses}, "
+                f"evictions={cache.evictions}, hit_rate={cache.hit_rate:.2%}"
+            )
         if self._mapping_config:
-            self._mapped = dependency_map.mapped
+            self._graph = graph_builder.build()
 
         self._unmapped = dependency_map.unmapped
-        self._not_found = self.get_templates_not_found()
+        if edge_sink:
+            self._streamed = True
+            self._not_found = self.get_templates_not_found(
+                mapped_uris=self.collect_uris(
+                    upstair_names=dependency_map.streamed_upstairs,
+                    template_uris=dependency_map.streamed_uris,
+                )
+            )
+        else:
+            self._not_found = self.get_templates_not_found()
 
-    def get_templates_not_found(self) -> list[str]:
+    def get_templates_not_found(
+        self, mapped_uris: list[str] | None = None
+    ) -> list[str]:
+        """Get URIs that are set in mapping configurations but not found
+
+        Args:
+            mapped_uris (list[str], optional):
+                URIs that stairlight knows. If it is None, they are listed from
+                the map. Defaults to None.
+
+        Returns:
+            list[str]: URIs not found
+        """
         not_found: set[str] = set()
 
         # Uris that stairlight knows
-        mapped_urls: list[str] = self.list_uris()
+        mapped_urls: list[str] = (
+            mapped_uris if mapped_uris is not None else self.list_uris()
+        )
 
         for config in self._mapping_config.Mapping:
             # Uri that mapping config set
@@ -291,12 +461,8 @@ class StairLight:
         Returns:
             list[str]: a list of tables
         """
-        results: set[str] = set()
-        for table_name, upstairs in self._mapped.items():
-            results.add(table_name)
-            results.update(
-                set([upstair_name for upstair_name in upstairs.keys()]),
-            )
+        results: set[str] = set(self.graph.iterate_table_names())
+        results.update(self.graph.iterate_upstair_names())
         return sorted(results)
 
     def list_uris(self) -> list[str]:
@@ -305,23 +471,30 @@ class StairLight:
         Returns:
             list[str]: a list of URIs
         """
-        results: set[str] = set()
-        for upstairs in self._mapped.values():
-            for upstair, mapped_templates in upstairs.items():
-                upstair_uri: str = self.get_uri_from_mapping_config(
-                    target_table=upstair
-                )
-                if upstair_uri:
-                    results.add(upstair_uri)
-                results.update(
-                    set(
-                        [
-                            mapped_template.Uri
-                            for mapped_template in mapped_templates
-                            if mapped_templates
-                        ]
-                    )
-                )
+        return self.collect_uris(
+            upstair_names=set(self.graph.iterate_upstair_names()),
+            template_uris=set(self.graph.iterate_template_uris()),
+        )
+
+    def collect_uris(
+        self, upstair_names: set[str], template_uris: set[str]
+    ) -> list[str]:
+        """Collect URIs from upstairs tables and templates
+
+        Args:
+            upstair_names (set[str]): Upstairs table names
+            template_uris (set[str]): URIs of mapped templates
+
+        Returns:
+            list[str]: a list of URIs
+        """
+        results: set[str] = set(template_uris)
+        for upstair_name in upstair_names:
+            upstair_uri: str = self.get_uri_from_mapping_config(
+                target_table=upstair_name
+            )
+            if upstair_uri:
+                results.add(upstair_uri)
         return sorted(results)
 
     def get_uri_from_mapping_config(self, target_table: str) -> str:
@@ -354,6 +527,7 @@ class StairLight:
         recursive: bool = False,
         verbose: bool = False,
         response_type: str = ResponseType.TABLE.value,
+        depth: int | None = None,
     ) -> list[str] | dict[str, Any]:
         """Search upstream nodes
 
@@ -363,6 +537,9 @@ class StairLight:
             verbose (bool, optional): Return verbose results or not. Defaults to False.
             response_type (str, optional):
                 Response type value. Defaults to ResponseType.TABLE.value.
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
 
         Returns:
             list[str] | dict[str, Any]: Search results
@@ -372,6 +549,7 @@ class StairLight:
             recursive=recursive,
             verbose=verbose,
             response_type=response_type,
+            depth=depth,
             direction=SearchDirection.UP,
         )
 
@@ -381,6 +559,7 @@ class StairLight:
         recursive=False,
         verbose=False,
         response_type=ResponseType.TABLE.value,
+        depth=None,
     ) -> list[str] | dict[str, Any]:
         """Search downstream nodes
 
@@ -390,6 +569,9 @@ class StairLight:
             verbose (bool, optional): Return verbose results or not. Defaults to False.
             response_type (str, optional):
                 Response type value. Defaults to ResponseType.TABLE.value.
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
 
         Returns:
             list[str] | dict[str, Any]: Search results
@@ -399,6 +581,71 @@ class StairLight:
             recursive=recursive,
             verbose=verbose,
             response_type=response_type,
+            depth=depth,
+            direction=SearchDirection.DOWN,
+        )
+
+    def up_many(
+        self,
+        table_names: list[str],
+        recursive: bool = False,
+        verbose: bool = False,
+        response_type: str = ResponseType.TABLE.value,
+        depth: int | None = None,
+    ) -> dict[str, list[str] | dict[str, Any]]:
+        """Search upstream nodes of multiple tables at once
+
+        Args:
+            table_names (list[str]): Table names
+            recursive (bool, optional): Search recursively or not. Defaults to False.
+            verbose (bool, optional): Return verbose results or not. Defaults to False.
+            response_type (str, optional):
+                Response type value. Defaults to ResponseType.TABLE.value.
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
+
+        Returns:
+            dict[str, list[str] | dict[str, Any]]: Search results by table name
+        """
+        return self.search_many(
+            table_names=table_names,
+            recursive=recursive,
+            verbose=verbose,
+            response_type=response_type,
+            depth=depth,
+            direction=SearchDirection.UP,
+        )
+
+    def down_many(
+        self,
+        table_names: list[str],
+        recursive: bool = False,
+        verbose: bool = False,
+        response_type: str = ResponseType.TABLE.value,
+        depth: int | None = None,
+    ) -> dict[str, list[str] | dict[str, Any]]:
+        """Search downstream nodes of multiple tables at once
+
+        Args:
+            table_names (list[str]): Table names
+            recursive (bool, optional): Search recursively or not. Defaults to False.
+            verbose (bool, optional): Return verbose results or not. Defaults to False.
+            response_type (str, optional):
+                Response type value. Defaults to ResponseType.TABLE.value.
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
+
+        Returns:
+            dict[str, list[str] | dict[str, Any]]: Search results by table name
+        """
+        return self.search_many(
+            table_names=table_names,
+            recursive=recursive,
+            verbose=verbose,
+            response_type=response_type,
+            depth=depth,
             direction=SearchDirection.DOWN,
         )
 
@@ -409,6 +656,7 @@ class StairLight:
         verbose: bool,
         response_type: str,
         direction: SearchDirection,
+        depth: int | None = None,
     ) -> list[str] | dict[str, Any]:
         """Search nodes
 
@@ -418,6 +666,9 @@ class StairLight:
             verbose (bool): Return verbose results or not
             response_type (str): Response type value
             direction (SearchDirection): Search direction
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
 
         Returns:
             list[str] | dict[str, Any]: Search results
@@ -427,8 +678,7 @@ class StairLight:
                 table_name=table_name,
                 recursive=recursive,
                 direction=direction,
-                searched_tables=[],
-                head=True,
+                depth=depth,
             )
 
         if response_type in [type.value for type in ResponseType]:
@@ -437,8 +687,7 @@ class StairLight:
                 recursive=recursive,
                 response_type=response_type,
                 direction=direction,
-                searched_tables=[],
-                head=True,
+                depth=depth,
             )
 
         return []
@@ -448,71 +697,104 @@ class StairLight:
         table_name: str,
         recursive: bool,
         direction: SearchDirection,
-        searched_tables: list[str],
-        head: bool,
+        depth: int | None = None,
+        shared_results: dict[tuple[str, int | None], dict[str, Any]] | None = None,
     ) -> dict[str, Any]:
         """Search nodes and return verbose results
 
+        Tables are searched depth-first with a stack instead of recursion.
+        A table which is already on the path is a circular reference, and it
+        is left out of the results. Results of a table whose search has no
+        circular references back to its path are made once and shared.
+
         Args:
             table_name (str): Table name
             recursive (bool): Search recursively or not
             direction (SearchDirection): Search direction
-            searched_tables (list[str]): a list of searched tables
-            head (bool): Current position is head or not
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
+            shared_results (dict[tuple[str, int | None], dict[str, Any]], optional):
+                Results of tables by remaining depths, shared with other searches
+                in the same direction. Defaults to None.
 
         Returns:
             dict: Search results
         """
-        search_results: dict[str, dict[str, Any]] = {}
-        response: dict[str, Any] = {table_name: {}}
-
-        relative_map = self.create_relative_map(
-            target_table_name=table_name, direction=direction
+        head = SearchFrame(
+            table_name=table_name,
+            relative_items=iter(
+                self.create_relative_map(
+                    target_table_name=table_name, direction=direction
+                ).items()
+            ),
         )
-
-        for next_table_name, templates in relative_map.items():
-            if recursive:
-                if head:
-                    searched_tables = [table_name]
-
-                searched_tables.append(next_table_name)
-
-                if sl_util.is_cyclic(tables=searched_tables):
-                    details = {
-                        "table_name": table_name,
-                        "next_table_name": next_table_name,
-                        "searched_tables": searched_tables,
-                    }
-                    logger.warning(f"Circular references detected!: {details}")
-                    continue
-
-            search_results[next_table_name] = {}
-            search_results[next_table_name]["Templates"] = []
-            for template in templates:
-                if recursive:
-                    next_response = self.search_verbose(
-                        table_name=next_table_name,
-                        direction=direction,
-                        recursive=recursive,
-                        searched_tables=searched_tables,
-                        head=False,
-                    )
-
-                    if not next_response.get(next_table_name):
-                        continue
-
-                    search_results[next_table_name]["Templates"] = relative_map[
-                        next_table_name
-                    ]
-                    if next_response[next_table_name][direction.value]:
-                        search_results[next_table_name][direction.value] = (
-                            next_response[next_table_name][direction.value]
-                        )
+        stack: list[SearchFrame] = [head]
+        # Tables on the path and their depths
+        path: dict[str, int] = {table_name: 0}
+        if shared_results is None:
+            shared_results = {}
+
+        while stack:
+            frame = stack[-1]
+            next_item = next(frame.relative_items, None)
+            if next_item is None:
+                stack.pop()
+                del path[frame.table_name]
+                if not stack:
+                    break
+                parent = stack[-1]
+                if frame.results:
+                    parent.results[frame.table_name][direction.value] = frame.results
+                # The depth of the frame is the length of the rest of the stack
+                if frame.cycle_depth is None or frame.cycle_depth > len(stack):
+                    # The results do not depend on tables above it
+                    shared_results[
+                        (frame.table_name, get_remaining_depth(depth, len(stack)))
+                    ] = frame.results
                 else:
-                    search_results[table_name]["Templates"].append(template)
+                    parent.reach_cycle(depth=frame.cycle_depth)
+                continue
+
+            next_table_name, templates = next_item
+            if recursive and next_table_name in path:
+                details = {
+                    "table_name": frame.table_name,
+                    "next_table_name": next_table_name,
+                    "searched_tables": [*path, next_table_name],
+                }
+                logger.warning(f"Circular references detected!: {details}")
+                frame.reach_cycle(depth=path[next_table_name])
+                continue
+
+            frame.results[next_table_name] = {"Templates": templates}
+            if not recursive:
+                continue
+            if not templates or depth is not None and len(stack) >= depth:
+                # It is not searched, so it may be on the path of other searches
+                frame.reach_cycle(depth=0)
+                continue
+            shared_key = (next_table_name, get_remaining_depth(depth, len(stack)))
+            if shared_key in shared_results:
+                if shared_results[shared_key]:
+                    frame.results[next_table_name][direction.value] = shared_results[
+                        shared_key
+                    ]
+                continue
+
+            path[next_table_name] = len(stack)
+            stack.append(
+                SearchFrame(
+                    table_name=next_table_name,
+                    relative_items=iter(
+                        self.create_relative_map(
+                            target_table_name=next_table_name, direction=direction
+                        ).items()
+                    ),
+                )
+            )
 
-        response[table_name][direction.value] = search_results
-        return response
+        return {table_name: {direction.value: head.results}}
 
     def search_plain(
         self,
@@ -520,67 +802,266 @@ class StairLight:
         recursive: bool,
         response_type: str,
         direction: SearchDirection,
-        searched_tables: list[str],
-        head: bool,
+        depth: int | None = None,
     ) -> list[str]:
         """Search nodes and return simple results
 
+        Tables are searched breadth-first, and each table is searched once.
+        Circular references back to the table are not followed.
+
         Args:
             table_name (str): Table name
             recursive (bool): Search recursively or not
             response_type (str): Response type value
             direction (SearchDirection): Search direction
-            searched_tables (list[str]): a list of searched tables
-            head (bool): Current position is head or not
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
 
         Returns:
             list[str]: Search results
         """
-        relative_map = self.create_relative_map(
-            target_table_name=table_name, direction=direction
-        )
-        response: list[str] = []
-        if not relative_map:
-            return response
-
-        next_table_name: str
-        for next_table_name, templates in relative_map.items():
-            if recursive:
-                if head:
-                    searched_tables = []
-                    searched_tables.append(table_name)
+        if recursive and depth is None and self._lineage_precomputed:
+            return self.search_plain_precomputed(
+                table_name=table_name,
+                response_type=response_type,
+                direction=direction,
+            )
 
-                searched_tables.append(next_table_name)
+        response: set[str] = set()
+        searched_tables: set[str] = {table_name}
+        # Tables and their depths
+        tables_to_search: deque[tuple[str, int]] = deque([(table_name, 0)])
+        while tables_to_search:
+            current_table_name, current_depth = tables_to_search.popleft()
+            relative_map = self.create_relative_map(
+                target_table_name=current_table_name, direction=direction
+            )
 
-                if sl_util.is_cyclic(tables=searched_tables):
+            next_table_name: str
+            for next_table_name, templates in relative_map.items():
+                if not templates:
+                    continue
+                if recursive and next_table_name == table_name:
                     details = {
-                        "table_name": table_name,
+                        "table_name": current_table_name,
                         "next_table_name": next_table_name,
-                        "searched_tables": searched_tables,
                     }
                     logger.info(f"Circular references detected!: {details}")
                     continue
 
-            for template in templates:
-                if recursive:
-                    next_response = self.search_plain(
-                        table_name=next_table_name,
-                        direction=direction,
-                        recursive=recursive,
-                        response_type=response_type,
-                        searched_tables=searched_tables,
-                        head=False,
-                    )
-                    response = response + next_response
-
                 if response_type == ResponseType.TABLE.value:
-                    response.append(next_table_name)
+                    response.add(next_table_name)
                 elif response_type == ResponseType.URI.value:
-                    uri = template.get(MapKey.URI)
-                    if uri:
-                        response.append(uri)
+                    for template in templates:
+                        uri = template.get(MapKey.URI)
+                        if uri:
+                            response.add(uri)
+
+                if (
+                    recursive
+                    and next_table_name not in searched_tables
+                    and (depth is None or current_depth + 1 < depth)
+                ):
+                    searched_tables.add(next_table_name)
+                    tables_to_search.append((next_table_name, current_depth + 1))
+
+        return sorted(response)
+
+    def search_plain_precomputed(
+        self,
+        table_name: str,
+        response_type: str,
+        direction: SearchDirection,
+        closure: TransitiveClosure | None = None,
+        relative_uris: dict[str, dict[str, set[str]]] | None = None,
+    ) -> list[str]:
+        """Search nodes recursively with the transitive closure
 
-        return sorted(list(set(response)))
+        Results are the same as search_plain, without traversing tables.
+
+        Args:
+            table_name (str): Table name
+            response_type (str): Response type value
+            direction (SearchDirection): Search direction
+            closure (TransitiveClosure, optional):
+                Transitive closure which reaches the table. Defaults to None,
+                which means the closure of the whole map.
+            relative_uris (dict[str, dict[str, set[str]]], optional):
+                URIs of templates by next tables of tables, shared with other
+                searches in the same direction. Defaults to None.
+
+        Returns:
+            list[str]: Search results
+        """
+        if not closure:
+            closure = self.graph.get_closure(
+                downstairs=direction == SearchDirection.DOWN
+            )
+        reachable_tables = closure.get_reachable_tables(table_name=table_name)
+        if response_type != ResponseType.URI.value:
+            return reachable_tables
+
+        if relative_uris is None:
+            relative_uris = {}
+        response: set[str] = set()
+        for current_table_name in [table_name, *reachable_tables]:
+            if current_table_name not in relative_uris:
+                relative_map = self.create_relative_map(
+                    target_table_name=current_table_name, direction=direction
+                )
+                relative_uris[current_table_name] = {
+                    next_table_name: {
+                        template[MapKey.URI]
+                        for template in templates
+                        if template.get(MapKey.URI)
+                    }
+                    for next_table_name, templates in relative_map.items()
+                }
+            for next_table_name, uris in relative_uris[current_table_name].items():
+                if next_table_name != table_name:
+                    response.update(uris)
+        return sorted(response)
+
+    def search_many(
+        self,
+        table_names: list[str],
+        recursive: bool,
+        verbose: bool,
+        response_type: str,
+        direction: SearchDirection,
+        depth: int | None = None,
+    ) -> dict[str, list[str] | dict[str, Any]]:
+        """Search nodes of multiple tables at once
+
+        Tables reachable from any of them are traversed once. Recursive
+        searches share a transitive closure of the traversed tables, and
+        results of tables found by one search are reused by the others.
+
+        Args:
+            table_names (list[str]): Table names
+            recursive (bool): Search recursively or not
+            verbose (bool): Return verbose results or not
+            response_type (str): Response type value
+            direction (SearchDirection): Search direction
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
+
+        Returns:
+            dict[str, list[str] | dict[str, Any]]: Search results by table name
+        """
+        table_names = list(dict.fromkeys(table_names))
+        if verbose:
+            shared_results: dict[tuple[str, int | None], dict[str, Any]] = {}
+            return {
+                table_name: self.search_verbose(
+                    table_name=table_name,
+                    recursive=recursive,
+                    direction=direction,
+                    depth=depth,
+                    shared_results=shared_results,
+                )
+                for table_name in table_names
+            }
+
+        # Transitive closures do not know depths
+        if (
+            not recursive
+            or depth is not None
+            or response_type not in [type.value for type in ResponseType]
+        ):
+            return {
+                table_name: self.search(
+                    table_name=table_name,
+                    recursive=recursive,
+                    verbose=verbose,
+                    response_type=response_type,
+                    direction=direction,
+                    depth=depth,
+                )
+                for table_name in table_names
+            }
+
+        closure = None
+        if not self._lineage_precomputed:
+            closure = self.graph.get_closure(
+                downstairs=direction == SearchDirection.DOWN, table_names=table_names
+            )
+        relative_uris: dict[str, dict[str, set[str]]] = {}
+        return {
+            table_name: self.search_plain_precomputed(
+                table_name=table_name,
+                response_type=response_type,
+                direction=direction,
+                closure=closure,
+                relative_uris=relative_uris,
+            )
+            for table_name in table_names
+        }
+
+    def iterate_search(
+        self,
+        table_name: str,
+        direction: SearchDirection,
+        depth: int | None = None,
+    ) -> Iterator[SearchRecord]:
+        """Search nodes recursively and yield references as they are found
+
+        Tables are searched breadth-first as search_plain, and nothing is kept
+        but tables already searched, so that results can be written before
+        the search ends.
+
+        Args:
+            table_name (str): Table name
+            direction (SearchDirection): Search direction
+            depth (int, optional):
+                Maximum depth of recursive searches. Defaults to None,
+                which means no limit.
+
+        Yields:
+            Iterator[SearchRecord]: A record for each template of references
+        """
+        searched_tables: set[str] = {table_name}
+        tables_to_search: deque[tuple[str, int]] = deque([(table_name, 0)])
+        while tables_to_search:
+            current_table_name, current_depth = tables_to_search.popleft()
+            relative_map = self.create_relative_map(
+                target_table_name=current_table_name, direction=direction
+            )
+            for next_table_name, templates in relative_map.items():
+                if not templates or next_table_name == table_name:
+                    continue
+                for template in templates:
+                    yield SearchRecord(
+                        TableName=next_table_name,
+                        Depth=current_depth + 1,
+                        Parent=current_table_name,
+                        Template=template,
+                    )
+                if next_table_name not in searched_tables and (
+                    depth is None or current_depth + 1 < depth
+                ):
+                    searched_tables.add(next_table_name)
+                    tables_to_search.append((next_table_name, current_depth + 1))
+
+    def precompute_lineage(self) -> list[list[str]]:
+        """Precompute transitive closures of the map for recursive searches
+
+        Strongly connected components of tables are condensed, and tables
+        reachable from each component are kept as a bitset. Recursive searches
+        of tables or URIs use them afterwards, instead of traversing tables
+        for each search. They are made again for a map loaded later.
+
+        Returns:
+            list[list[str]]: Tables which have circular references
+        """
+        self._lineage_precomputed = True
+        self.graph.get_closure(downstairs=True)
+        cycles = self.graph.get_closure(downstairs=False).cycles
+        for cycle in cycles:
+            logger.warning(f"Circular references detected!: {cycle}")
+        return cycles
 
     def create_relative_map(
         self, target_table_name: str, direction: SearchDirection
@@ -596,19 +1077,14 @@ class StairLight:
         """
         relative_map: dict[str, list[dict[str, Any]]] = {}
         if direction == SearchDirection.UP:
-            upstairs = self._mapped.get(target_table_name, {})
-            for upstair_name, mapped_templates in upstairs.items():
-                relative_map[upstair_name] = [
-                    asdict(mapped_template) for mapped_template in mapped_templates
-                ]
+            relative_map = (
+                self.graph.get_upstairs(table_name=target_table_name, as_dict=True)
+                or {}
+            )
         elif direction == SearchDirection.DOWN:
-            for table_name, upstairs in self._mapped.items():
-                for upstair_name, mapped_templates in upstairs.items():
-                    if mapped_templates and upstair_name == target_table_name:
-                        relative_map[table_name] = [
-                            asdict(mapped_template)
-                            for mapped_template in mapped_templates
-                        ]
+            relative_map = self.graph.get_downstairs(
+                table_name=target_table_name, as_dict=True
+            )
         return relative_map
 
     def find_tables_by_labels(self, target_labels: list[str]) -> list[str]:
@@ -682,7 +1158,7 @@ class StairLight:
 
     @staticmethod
     def cast_mapped_dict_all(
-        mapped: dict[str, dict[str, list[MappedTemplate] | None]]
+        mapped: Mapping[str, dict[str, list[MappedTemplate] | None]]
     ) -> dict[str, dict[str, list[dict] | None]]:
         casted: dict[str, Any] = {}
         for table_name, upstairs in mapped.items():
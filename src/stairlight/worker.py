@@ -0,0 +1,476 @@
+from __future__ import annotations
+
+import errno
+import multiprocessing
+import time
+from dataclasses import dataclass
+from logging import getLogger
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Iterable, Iterator
+
+from src.stairlight.cache import query_memo
+from src.stairlight.large_file import LargeFileQuery
+from src.stairlight.query import Query, ReferenceTuple, UpstairTableReference
+from src.stairlight.source.config import MappingConfig
+from src.stairlight.source.template import (
+    Template,
+    TemplateSourceType,
+    jinja_environment,
+)
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    # Memory limits are not supported on Windows
+    resource = None  # type: ignore
+
+PROCESS_CHUNK_SIZE_DEFAULT = 8
+# Seconds to wait for a worker process to stop before it is killed
+WORKER_STOP_TIMEOUT_DEFAULT = 5.0
+
+WORK_FAILURE_TIMEOUT = "timeout"
+WORK_FAILURE_MEMORY = "memory"
+WORK_FAILURE_ERROR = "error"
+WORK_FAILURE_CRASHED = "crashed"
+
+logger = getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RenderParseWorkUnit:
+    """A picklable unit of rendering and parsing a template"""
+
+    template_str: str
+    params: dict[str, Any]
+    ignore_params: list[str] | None
+    default_table_prefix: str | None
+    source_type: str
+    key: str
+    is_compiled: bool = False
+    query_engine: str | None = None
+    # A local path of a large file, which is read by a worker instead of template_str
+    path: str | None = None
+    chunk_size: int | None = None
+
+
+class WorkUnitTemplate(Template):
+    """A template that renders a template string of a work unit"""
+
+    def __init__(self, work_unit: RenderParseWorkUnit) -> None:
+        """A template that renders a template string of a work unit
+
+        Args:
+            work_unit (RenderParseWorkUnit): Work unit
+        """
+        super().__init__(
+            mapping_config=MappingConfig(),
+            key=work_unit.key,
+            source_type=TemplateSourceType(work_unit.source_type),
+            default_table_prefix=work_unit.default_table_prefix,
+        )
+        self._template_str = work_unit.template_str
+
+    def get_uri(self) -> str:
+        return self.key
+
+    def get_template_str(self) -> str:
+        return self._template_str
+
+
+def create_work_unit(
+    template: Template,
+    template_str: str,
+    params: dict[str, Any],
+    ignore_params: list[str] | None,
+    query_engine: str | None = None,
+    path: str | None = None,
+    chunk_size: int | None = None,
+) -> RenderParseWorkUnit:
+    """Create a work unit of a template
+
+    Args:
+        template (Template): Query template
+        template_str (str): Template string, which is empty for a large file
+        params (dict[str, Any]): Merged parameters
+        ignore_params (list[str], optional): Ignore parameters
+        query_engine (str, optional): Query engine. Defaults to None.
+        path (str, optional):
+            A local path of a large file, which is parsed in chunks.
+            Defaults to None.
+        chunk_size (int, optional): Bytes of a large file read at once.
+            Defaults to None.
+
+    Returns:
+        RenderParseWorkUnit: Work unit
+    """
+    return RenderParseWorkUnit(
+        template_str=template_str,
+        params=params,
+        ignore_params=ignore_params,
+        default_table_prefix=template.default_table_prefix,
+        source_type=template.source_type.value,
+        key=template.key,
+        is_compiled=template.IS_COMPILED,
+        query_engine=query_engine,
+        path=path,
+        chunk_size=chunk_size,
+    )
+
+
+def process_work_unit(work_unit: RenderParseWorkUnit) -> list[ReferenceTuple]:
+    """Render and parse a template string in a worker process
+
+    Args:
+        work_unit (RenderParseWorkUnit): Work unit
+
+    Returns:
+        list[ReferenceTuple]: Upstairs table references
+    """
+    if work_unit.path:
+        return list(
+            LargeFileQuery(
+                template=WorkUnitTemplate(work_unit=work_unit),
+                path=work_unit.path,
+                params=work_unit.params,
+                ignore_params=work_unit.ignore_params,
+                chunk_size=work_unit.chunk_size,
+            ).iterate_reference_tuples()
+        )
+
+    query_str = work_unit.template_str
+    if not work_unit.is_compiled:
+        query_str = WorkUnitTemplate(work_unit=work_unit).render(
+            params=work_unit.params,
+            ignore_params=work_unit.ignore_params,
+            template_str=work_unit.template_str,
+        )
+    query = Query(
+        query_str=query_str,
+        default_table_prefix=work_unit.default_table_prefix,
+        engine=work_unit.query_engine,
+    )
+    return query_memo.get_reference_tuples(query=query)
+
+
+def configure_query_memo(max_entries: int, max_bytes: int) -> None:
+    """Set limits of the query memo in a worker process
+
+    Args:
+        max_entries (int): Maximum number of entries
+        max_bytes (int): Maximum approximate size of entries in bytes
+    """
+    query_memo.configure(max_entries=max_entries, max_bytes=max_bytes)
+
+
+def configure_worker_process(
+    query_memo_max_entries: int,
+    query_memo_max_bytes: int,
+    jinja_template_cache_max_entries: int,
+    jinja_bytecode_cache_dir: str | None,
+) -> None:
+    """Set up shared objects in a worker process as in the main process
+
+    Args:
+        query_memo_max_entries (int): Maximum number of query memo entries
+        query_memo_max_bytes (int): Maximum approximate size of query memo entries
+        jinja_template_cache_max_entries (int):
+            Maximum number of compiled jinja templates
+        jinja_bytecode_cache_dir (str | None): A directory of jinja bytecode cache
+    """
+    configure_query_memo(
+        max_entries=query_memo_max_entries, max_bytes=query_memo_max_bytes
+    )
+    jinja_environment.configure(
+        max_entries=jinja_template_cache_max_entries,
+        bytecode_cache_dir=jinja_bytecode_cache_dir,
+    )
+
+
+def to_upstair_table_references(
+    reference_tuples: list[ReferenceTuple],
+) -> list[UpstairTableReference]:
+    """Convert reference tuples returned by workers
+
+    Args:
+        reference_tuples (list[ReferenceTuple]): Reference tuples
+
+    Returns:
+        list[UpstairTableReference]: Upstairs table references
+    """
+    return [
+        UpstairTableReference(
+            TableName=table_name,
+            Line={"LineNumber": line_number, "LineString": line_string},
+        )
+        for table_name, line_number, line_string in reference_tuples
+    ]
+
+
+@dataclass(frozen=True)
+class WorkFailure:
+    """A work that failed or exceeded limits in a supervised worker"""
+
+    reason: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.reason}: {self.message}"
+
+
+def set_memory_limit(max_bytes: int) -> None:
+    """Limit the address space of the current process
+
+    Args:
+        max_bytes (int): Maximum size of the address space in bytes
+    """
+    if resource is None:
+        logger.warning("Memory limits are not supported on this platform")
+        return
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    if hard_limit != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard_limit))
+
+
+def run_supervised_worker(
+    connection: Connection,
+    memory_limit: int | None,
+    initializer: Callable[..., None] | None,
+    initargs: tuple,
+) -> None:
+    """Run works sent from a supervisor until the connection is closed
+
+    Args:
+        connection (Connection): A connection to the supervisor
+        memory_limit (int | None): Maximum size of the address space in bytes
+        initializer (Callable[..., None] | None): A function called at first
+        initargs (tuple): Arguments of the initializer
+    """
+    if memory_limit:
+        set_memory_limit(max_bytes=memory_limit)
+    if initializer:
+        initializer(*initargs)
+
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        index, func, item = task
+        try:
+            connection.send((index, func(item)))
+        except Exception as e:
+            # Mapping a large file beyond the limit raises OSError, not MemoryError
+            if not isinstance(e, MemoryError) and not (
+                isinstance(e, OSError) and e.errno == errno.ENOMEM
+            ):
+                connection.send(
+                    (index, WorkFailure(reason=WORK_FAILURE_ERROR, message=repr(e)))
+                )
+                continue
+            # The process may be broken, so that it is replaced
+            connection.send(
+                (
+                    index,
+                    WorkFailure(
+                        reason=WORK_FAILURE_MEMORY,
+                        message=f"exceeded {memory_limit} bytes",
+                    ),
+                )
+            )
+            return
+
+
+class SupervisedWorker:
+    """A worker process and a connection to it"""
+
+    def __init__(
+        self,
+        memory_limit: int | None,
+        initializer: Callable[..., None] | None,
+        initargs: tuple,
+    ) -> None:
+        """A worker process and a connection to it
+
+        Args:
+            memory_limit (int | None): Maximum size of the address space in bytes
+            initializer (Callable[..., None] | None): A function called at first
+            initargs (tuple): Arguments of the initializer
+        """
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_supervised_worker,
+            args=(child_connection, memory_limit, initializer, initargs),
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        # An index of a running work and its deadline
+        self.index: int | None = None
+        self.deadline: float | None = None
+
+    def stop(
+        self, kill: bool = False, timeout: float = WORKER_STOP_TIMEOUT_DEFAULT
+    ) -> None:
+        """Stop the worker process
+
+        Args:
+            kill (bool, optional):
+                Whether to kill it without waiting. Defaults to False.
+            timeout (float, optional):
+                Seconds to wait for it to stop, after which it is killed.
+                Defaults to WORKER_STOP_TIMEOUT_DEFAULT.
+        """
+        if not kill:
+            try:
+                self.connection.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class SupervisedWorkerPool:
+    """Worker processes which are replaced when a work exceeds limits"""
+
+    def __init__(
+        self,
+        max_processes: int,
+        time_limit: float | None = None,
+        memory_limit: int | None = None,
+        initializer: Callable[..., None] | None = None,
+        initargs: tuple = (),
+    ) -> None:
+        """Worker processes which are replaced when a work exceeds limits
+
+        A work which runs longer than the time limit is stopped by killing
+        its process, and a work which exceeds the memory limit raises
+        MemoryError in its process. Either is returned as a WorkFailure,
+        and a new process takes over the rest of the works.
+
+        Args:
+            max_processes (int): The number of processes
+            time_limit (float, optional):
+                Maximum seconds of a work. Defaults to None.
+            memory_limit (int, optional):
+                Maximum size of the address space of a process in bytes.
+                Defaults to None.
+            initializer (Callable[..., None], optional):
+                A function called when a process starts. Defaults to None.
+            initargs (tuple, optional): Arguments of the initializer.
+                Defaults to ().
+        """
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.failures: int = 0
+        self._initializer = initializer
+        self._initargs = initargs
+        self._workers = [self._start_worker() for _ in range(max(max_processes, 1))]
+
+    def __enter__(self) -> SupervisedWorkerPool:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        """Stop all worker processes"""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def map(self, func: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Any]:
+        """Run a function for items in worker processes
+
+        Args:
+            func (Callable[[Any], Any]): A picklable function
+            items (Iterable[Any]): Picklable items
+
+        Yields:
+            Iterator[Any]: Results in the same order as items, or WorkFailure
+        """
+        tasks = list(items)
+        results: dict[int, Any] = {}
+        next_index = 0
+        yielded = 0
+        while yielded < len(tasks):
+            for worker in self._workers:
+                if worker.index is None and next_index < len(tasks):
+                    self._send(
+                        worker=worker, task=(next_index, func, tasks[next_index])
+                    )
+                    next_index += 1
+
+            running = [worker for worker in self._workers if worker.index is not None]
+            deadlines = [worker.deadline for worker in running if worker.deadline]
+            timeout = max(min(deadlines) - time.monotonic(), 0) if deadlines else None
+            ready = wait([worker.connection for worker in running], timeout=timeout)
+            for worker in running:
+                if worker.connection in ready:
+                    results.update(self._receive(worker=worker))
+                elif worker.deadline and worker.deadline <= time.monotonic():
+                    results[worker.index] = WorkFailure(
+                        reason=WORK_FAILURE_TIMEOUT,
+                        message=f"exceeded {self.time_limit} seconds",
+                    )
+                    self._replace(worker=worker)
+
+            while yielded in results:
+                result = results.pop(yielded)
+                if isinstance(result, WorkFailure):
+                    self.failures += 1
+                yield result
+                yielded += 1
+
+    def _start_worker(self) -> SupervisedWorker:
+        return SupervisedWorker(
+            memory_limit=self.memory_limit,
+            initializer=self._initializer,
+            initargs=self._initargs,
+        )
+
+    def _send(self, worker: SupervisedWorker, task: tuple[int, Callable, Any]) -> None:
+        worker.index = task[0]
+        worker.deadline = (
+            time.monotonic() + self.time_limit if self.time_limit else None
+        )
+        worker.connection.send(task)
+
+    def _receive(self, worker: SupervisedWorker) -> dict[int, Any]:
+        """Receive a result of a work from a worker
+
+        Args:
+            worker (SupervisedWorker): A worker which has sent a result
+
+        Returns:
+            dict[int, Any]: An index of the work and its result
+        """
+        index = worker.index
+        try:
+            _, result = worker.connection.recv()
+        except (EOFError, OSError):
+            worker.process.join()
+            result = WorkFailure(
+                reason=WORK_FAILURE_CRASHED,
+                message=f"exit code {worker.process.exitcode}",
+            )
+        worker.index = worker.deadline = None
+        # A process may be broken by a failure other than an exception
+        if isinstance(result, WorkFailure) and result.reason != WORK_FAILURE_ERROR:
+            self._replace(worker=worker)
+        return {index: result}
+
+    def _replace(self, worker: SupervisedWorker) -> None:
+        """Replace a worker which exceeded limits with a new one
+
+        Args:
+            worker (SupervisedWorker): Worker
+        """
+        worker.stop(kill=True)
+        self._workers[self._workers.index(worker)] = self._start_worker()
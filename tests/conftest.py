@@ -23,6 +23,13 @@ def stairlight_config(configurator: Configurator) -> StairlightConfig:
     return configurator.read_stairlight(prefix=STAIRLIGHT_CONFIG_PREFIX_DEFAULT)
 
 
+@pytest.fixture(scope="session")
+def stairlight_config_file() -> StairlightConfig:
+    return Configurator(dir="tests/config/test_check").read_stairlight(
+        prefix=STAIRLIGHT_CONFIG_PREFIX_DEFAULT
+    )
+
+
 @pytest.fixture(scope="session")
 def mapping_config(configurator: Configurator) -> MappingConfig:
     return configurator.read_mapping_with_prefix(prefix=MAPPING_CONFIG_PREFIX_DEFAULT)
@@ -11,7 +11,6 @@ from src.stairlight.source.config import (
     MappingConfig,
     StairlightConfig,
 )
-from src.stairlight.source.config_key import StairlightConfigKey
 from src.stairlight.source.gcs.config import StairlightConfigIncludeGcs
 from src.stairlight.source.gcs.template import (
     GCS_URI_SCHEME,
@@ -136,12 +135,10 @@ class TestGcsTemplateSource:
         mapping_config: MappingConfig,
     ) -> GcsTemplateSource:
         _include = StairlightConfigIncludeGcs(
-            **{
-                StairlightConfigKey.TEMPLATE_SOURCE_TYPE: TemplateSourceType.GCS.value,
-                StairlightConfigKey.Gcs.PROJECT_ID: None,
-                StairlightConfigKey.Gcs.BUCKET_NAME: "stairlight",
-                StairlightConfigKey.REGEX: "sql/.*/*.sql",
-            }
+            TemplateSourceType=TemplateSourceType.GCS.value,
+            ProjectId=None,
+            BucketName="stairlight",
+            Regex="sql/.*/*.sql",
         )
         return GcsTemplateSource(
             stairlight_config=stairlight_config,
@@ -176,10 +173,8 @@ class TestGcsTemplateSourceConfigKeyNotFound:
             prefix="stairlight_key_not_found"
         )
         _include = StairlightConfigIncludeGcs(
-            **{
-                StairlightConfigKey.TEMPLATE_SOURCE_TYPE: TemplateSourceType.GCS.value,
-                StairlightConfigKey.REGEX: ".*/*.sql",
-            }
+            TemplateSourceType=TemplateSourceType.GCS.value,
+            Regex=".*/*.sql",
         )
         return GcsTemplateSource(
             stairlight_config=stairlight_config,
@@ -7,12 +7,12 @@ import pytest
 from moto import mock_aws
 
 from src.stairlight.configurator import Configurator
+from src.stairlight.map import Map
 from src.stairlight.source.config import (
     ConfigAttributeNotFoundException,
     MappingConfig,
     StairlightConfig,
 )
-from src.stairlight.source.config_key import StairlightConfigKey
 from src.stairlight.source.s3.config import StairlightConfigIncludeS3
 from src.stairlight.source.s3.template import (
     S3_URI_SCHEME,
@@ -131,11 +131,9 @@ class TestS3TemplateSource:
         mapping_config: MappingConfig,
     ) -> S3TemplateSource:
         _include = StairlightConfigIncludeS3(
-            **{
-                StairlightConfigKey.TEMPLATE_SOURCE_TYPE: TemplateSourceType.S3.value,
-                StairlightConfigKey.S3.BUCKET_NAME: "stairlight",
-                StairlightConfigKey.REGEX: "sql/.*/*.sql",
-            }
+            TemplateSourceType=TemplateSourceType.S3.value,
+            BucketName="stairlight",
+            Regex="sql/.*/*.sql",
         )
         return S3TemplateSource(
             stairlight_config=stairlight_config,
@@ -156,6 +154,44 @@ class TestS3TemplateSource:
             result.append(file)
         assert len(result) > 0
 
+    @mock_aws
+    def test_search_templates_with_prefetch(
+        self,
+        stairlight_config: StairlightConfig,
+        mapping_config: MappingConfig,
+    ):
+        s3_client = boto3.resource("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+        s3_bucket = s3_client.Bucket(BUCKET_NAME)
+        keys = [f"sql/prefetch/{i:02}.sql" for i in range(10)]
+        for i, key in enumerate(keys):
+            s3_bucket.put_object(Key=key, Body=f"SELECT * FROM PROJECT.DATASET.T{i}")
+
+        template_source = S3TemplateSource(
+            stairlight_config=stairlight_config,
+            mapping_config=mapping_config,
+            include=StairlightConfigIncludeS3(
+                TemplateSourceType=TemplateSourceType.S3.value,
+                BucketName=BUCKET_NAME,
+                Regex="sql/prefetch/.*.sql",
+                MaxConcurrentFetches=4,
+            ),
+        )
+        dependency_map = Map(
+            stairlight_config=stairlight_config, mapping_config=mapping_config
+        )
+        templates = list(
+            dependency_map.search_templates(template_source=template_source)
+        )
+        store = dependency_map.template_str_store
+        fetched = store.bytes_fetched
+
+        assert [template.key for template in templates] == keys
+        assert [store.get(template=template) for template in templates] == [
+            f"SELECT * FROM PROJECT.DATASET.T{i}" for i in range(10)
+        ]
+        assert store.bytes_fetched == fetched > 0
+
     @pytest.mark.integration
     def test_search_templates_integration(self, s3_template_source: S3TemplateSource):
         result = []
@@ -175,10 +211,8 @@ class TestS3TemplateSourceConfigKeyNotFound:
             prefix="stairlight_key_not_found"
         )
         _include = StairlightConfigIncludeS3(
-            **{
-                StairlightConfigKey.TEMPLATE_SOURCE_TYPE: TemplateSourceType.S3.value,
-                StairlightConfigKey.REGEX: ".*/*.sql",
-            }
+            TemplateSourceType=TemplateSourceType.S3.value,
+            Regex=".*/*.sql",
         )
         return S3TemplateSource(
             stairlight_config=stairlight_config,
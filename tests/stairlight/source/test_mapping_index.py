@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+
+import pytest
+
+from src.stairlight.source.config import MappingConfig
+from src.stairlight.source.mapping_index import MappingIndex, SuffixTrie
+
+
+class TestSuffixTrie:
+    @pytest.mark.parametrize(
+        ("s", "expected"),
+        [
+            ("tests/sql/a.sql", 0),
+            ("tests/sql/xa.sql", 0),
+            ("tests/sql/b.sql", 1),
+            ("sql/b.sql", 2),
+            ("b.sql", None),
+            ("tests/sql/c.sql", None),
+        ],
+    )
+    def test_find_min(self, s: str, expected: int | None):
+        trie = SuffixTrie()
+        trie.insert(suffix="a.sql", value=0)
+        trie.insert(suffix="sql/b.sql", value=3)
+        trie.insert(suffix="sql/b.sql", value=2)
+        trie.insert(suffix="tests/sql/b.sql", value=1)
+        trie.insert(suffix="tests/sql/b.sql", value=4)
+        assert trie.find_min(s=s) == expected
+
+    def test_empty_suffix(self):
+        trie = SuffixTrie()
+        trie.insert(suffix="", value=5)
+        assert trie.find_min(s="any.sql") == 5
+
+
+class TestMappingIndex:
+    mapping_config = MappingConfig(
+        Mapping=[
+            OrderedDict(
+                {
+                    "TemplateSourceType": "File",
+                    "FileSuffix": "sql/a.sql",
+                    "Tables": [{"TableName": "A"}],
+                }
+            ),
+            OrderedDict(
+                {
+                    "TemplateSourceType": "dbt",
+                    "FileSuffix": "tests/sql/a.sql",
+                    "Tables": [{"TableName": "B"}],
+                }
+            ),
+            OrderedDict(
+                {
+                    "TemplateSourceType": "GCS",
+                    "Uri": "gs://bucket/sql/c.sql",
+                    "Tables": [{"TableName": "C"}, {"TableName": "D"}],
+                }
+            ),
+            OrderedDict(
+                {
+                    "TemplateSourceType": "Redash",
+                    "DataSourceName": "metadata",
+                    "QueryId": 5,
+                    "Tables": [{"TableName": "E"}],
+                }
+            ),
+        ]
+    )
+
+    @pytest.mark.parametrize(
+        ("key", "uri", "expected"),
+        [
+            ("tests/sql/a.sql", "", ["A"]),
+            ("sql/c.sql", "gs://bucket/sql/c.sql", ["C", "D"]),
+            ("sql/c.sql", "s3://bucket/sql/c.sql", []),
+        ],
+    )
+    def test_find_tables(self, key: str, uri: str, expected: list[str]):
+        index = MappingIndex(mapping_config=self.mapping_config)
+        assert [
+            table.TableName for table in index.find_tables(key=key, uri=uri)
+        ] == expected
+
+    def test_find_redash_tables(self):
+        index = MappingIndex(mapping_config=self.mapping_config)
+        assert [
+            table.TableName
+            for table in index.find_redash_tables(
+                data_source_name="metadata", query_id=5
+            )
+        ] == ["E"]
+        assert not index.find_redash_tables(data_source_name="metadata", query_id=6)
+
+    def test_built_once(self):
+        assert (
+            self.mapping_config.get_mapping_index()
+            is self.mapping_config.get_mapping_index()
+        )
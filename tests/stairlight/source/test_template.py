@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, cast
+
+import pytest
+
+from src.stairlight.source.config import MappingConfig
+from src.stairlight.source.template import (
+    PREFETCH_WINDOW_FACTOR,
+    JinjaEnvironment,
+    Template,
+    TemplateSignature,
+    TemplateSourceType,
+    TemplateStrStore,
+    jinja_environment,
+)
+
+
+class CountingTemplate(Template):
+    def __init__(self, key: str, template_str: str):
+        super().__init__(
+            mapping_config=MappingConfig(),
+            key=key,
+            source_type=TemplateSourceType.FILE,
+        )
+        self.template_str = template_str
+        self.fetched = 0
+
+    def get_uri(self) -> str:
+        return self.key
+
+    def get_template_str(self) -> str:
+        self.fetched += 1
+        return self.template_str
+
+
+class FailingTemplate(CountingTemplate):
+    def get_template_str(self) -> str:
+        self.fetched += 1
+        raise RuntimeError(self.key)
+
+
+class TestTemplateStrStore:
+    def test_fetch_once(self):
+        store = TemplateStrStore()
+        template = CountingTemplate(key="a", template_str="SELECT 1")
+        assert store.get(template=template) == "SELECT 1"
+        assert store.get(template=template) == "SELECT 1"
+        assert template.fetched == 1
+        assert (store.bytes_fetched, store.bytes_served) == (8, 8)
+
+    def test_release(self):
+        store = TemplateStrStore()
+        template = CountingTemplate(key="a", template_str="SELECT 1")
+        store.get(template=template)
+        store.release(template=template)
+        store.get(template=template)
+        assert template.fetched == 2
+
+    def test_evict_least_recently_used(self):
+        store = TemplateStrStore(max_bytes=16)
+        templates = [
+            CountingTemplate(key=key, template_str="SELECT 1") for key in "abc"
+        ]
+        store.get(template=templates[0])
+        store.get(template=templates[1])
+        store.get(template=templates[0])
+        store.get(template=templates[2])
+        store.get(template=templates[0])
+        store.get(template=templates[1])
+
+        assert store.evictions == 2
+        assert [template.fetched for template in templates] == [1, 2, 1]
+
+    def test_render_with_template_str(self):
+        template = CountingTemplate(key="a", template_str="SELECT 1")
+        actual = template.render(
+            params={"table": "b"}, template_str="SELECT * FROM {{ table }}"
+        )
+        assert actual == "SELECT * FROM b"
+        assert template.fetched == 0
+
+    def test_prefetch(self):
+        store = TemplateStrStore()
+        templates = [
+            CountingTemplate(key=str(i), template_str=f"SELECT {i}") for i in range(10)
+        ]
+        actual = []
+        for template in store.prefetch(templates=templates, max_concurrency=3):
+            actual.append(store.get(template=template))
+            store.release(template=template)
+
+        assert actual == [f"SELECT {i}" for i in range(10)]
+        assert [template.fetched for template in templates] == [1] * 10
+        assert store.bytes_fetched == store.bytes_served
+
+    def test_prefetch_bounded(self):
+        store = TemplateStrStore()
+        templates = [
+            CountingTemplate(key=str(i), template_str=f"SELECT {i}") for i in range(20)
+        ]
+        prefetched = cast(
+            Generator[Template, None, None],
+            store.prefetch(templates=templates, max_concurrency=2),
+        )
+        next(prefetched)
+        assert sum(template.fetched for template in templates) <= (
+            2 * PREFETCH_WINDOW_FACTOR
+        )
+        prefetched.close()
+
+    def test_prefetch_failure_is_raised_by_consumer(self):
+        store = TemplateStrStore()
+        template = FailingTemplate(key="a", template_str="SELECT 1")
+        prefetched = list(store.prefetch(templates=[template], max_concurrency=2))
+        assert prefetched == [template]
+        with pytest.raises(RuntimeError):
+            store.get(template=template)
+        assert template.fetched == 2
+
+
+class TestJinjaEnvironment:
+    def test_reuse_compiled_template(self):
+        environment = JinjaEnvironment()
+        template = environment.get_template(source="SELECT * FROM {{ table }}")
+        assert environment.get_template(source="SELECT * FROM {{ table }}") is template
+        assert template.render({"table": "a"}) == "SELECT * FROM a"
+        assert (environment.hits, environment.misses) == (1, 1)
+
+    def test_evict_least_recently_used(self):
+        environment = JinjaEnvironment(max_entries=2)
+        for source in ["{{ a }}", "{{ b }}", "{{ a }}", "{{ c }}"]:
+            environment.get_template(source=source)
+        assert len(environment) == 2
+        environment.get_template(source="{{ b }}")
+        assert environment.misses == 4
+
+    def test_bytecode_cache(self, tmp_path, monkeypatch: pytest.MonkeyPatch):
+        bytecode_cache_dir = str(tmp_path / "jinja")
+        environment = JinjaEnvironment(bytecode_cache_dir=bytecode_cache_dir)
+        environment.get_template(source="SELECT * FROM {{ table }}")
+        assert len(os.listdir(bytecode_cache_dir)) == 1
+
+        # Another run loads the compiled code instead of compiling it
+        environment = JinjaEnvironment(bytecode_cache_dir=bytecode_cache_dir)
+        monkeypatch.setattr(environment.environment, "compile", None)
+        template = environment.get_template(source="SELECT * FROM {{ table }}")
+        assert template.render({"table": "a"}) == "SELECT * FROM a"
+
+    def test_compile_concurrently(self, monkeypatch: pytest.MonkeyPatch):
+        environment = JinjaEnvironment()
+        compile = environment.environment.compile
+        # Both threads must be compiling at once to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_and_compile(*args, **kwargs):
+            barrier.wait()
+            return compile(*args, **kwargs)
+
+        monkeypatch.setattr(environment.environment, "compile", wait_and_compile)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            templates = list(
+                executor.map(
+                    lambda source: environment.get_template(source=source),
+                    ["SELECT * FROM {{ table }}"] * 2,
+                )
+            )
+        assert environment.misses == 2
+        assert len(environment) == 1
+        assert environment.get_template(source="SELECT * FROM {{ table }}") in templates
+
+
+class TestRenderMany:
+    @pytest.mark.parametrize(
+        "template_str",
+        [
+            "SELECT * FROM {{ params.table }} WHERE {{ params.column }} = 1",
+            "SELECT * FROM $table WHERE ${column} = 1",
+            "SELECT * FROM {{ params.table }} WHERE $column = 1",
+            "SELECT $$1 FROM $table WHERE $ = 1",
+        ],
+        ids=["jinja", "string_template", "both", "invalid"],
+    )
+    def test_same_as_render(self, template_str: str):
+        template = CountingTemplate(key="a.sql", template_str=template_str)
+        param_sets = [
+            {"params": {"table": "a", "column": "x"}, "table": "a", "column": "x"},
+            {},
+            {"params": {"table": "b"}, "table": "b"},
+        ]
+        actual = template.render_many(param_sets=param_sets, ignore_params=["column"])
+        assert actual == [
+            template.render(params=params, ignore_params=["column"])
+            for params in param_sets
+        ]
+        assert template.fetched == 1 + len(param_sets)
+
+    def test_compile_once(self):
+        template = CountingTemplate(
+            key="a.sql", template_str="SELECT * FROM {{ table }} -- render_many"
+        )
+        misses = jinja_environment.misses
+        actual = template.render_many(param_sets=[{"table": "a"}, {"table": "b"}])
+        assert actual == [
+            "SELECT * FROM a -- render_many",
+            "SELECT * FROM b -- render_many",
+        ]
+        assert template.fetched == 1
+        assert jinja_environment.misses == misses + 1
+
+
+class TestTemplateSignature:
+    def test_get_signature(self):
+        template = CountingTemplate(
+            key="a.sql",
+            template_str="SELECT {{ params.a }}, $b, ${c}, $$ FROM {{ d }}",
+        )
+        assert template.get_signature() == TemplateSignature(
+            jinja_params=("params.a", "d"),
+            string_template_params=frozenset(["b", "c"]),
+            has_dollar_signs=True,
+            has_dollar_escapes=True,
+        )
+        assert template.get_signature(template_str="SELECT 1") == TemplateSignature(
+            jinja_params=(),
+            string_template_params=frozenset(),
+            has_dollar_signs=False,
+            has_dollar_escapes=False,
+        )
+
+    def test_cached(self):
+        template = CountingTemplate(key="a.sql", template_str="SELECT $a")
+        template_str = template.get_template_str()
+        signature = template.get_signature(template_str=template_str)
+        assert template.get_signature(template_str=template_str) is signature
+        assert template.get_signature(template_str="SELECT $b") is not signature
+
+    @pytest.mark.parametrize(
+        ("ignore_params", "expected"),
+        [(None, False), (["x"], False), (["a"], True), (["b"], True)],
+    )
+    def test_is_ignored(self, ignore_params: list[str] | None, expected: bool):
+        template = CountingTemplate(key="a.sql", template_str="{{ a }} $b")
+        assert template.get_signature().is_ignored(ignore_params) == expected
+
+    def test_skip_rendering(self, monkeypatch: pytest.MonkeyPatch):
+        template = CountingTemplate(key="a.sql", template_str="SELECT * FROM a")
+
+        def fail(*args, **kwargs):
+            raise AssertionError("rendered")
+
+        monkeypatch.setattr(template, "ignore_string_template_params", fail)
+        monkeypatch.setattr(template, "render_by_string_template", fail)
+        assert template.render(params={"a": "b"}, ignore_params=["a"]) == (
+            "SELECT * FROM a"
+        )
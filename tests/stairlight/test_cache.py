@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any
+
+import pytest
+
+from src.stairlight import StairLight
+from src.stairlight.cache import MappingCache, QueryMemo
+from src.stairlight.map import Map
+from src.stairlight.query import Query, UpstairTableReference
+from src.stairlight.source.config import MappingConfig, StairlightConfig
+from src.stairlight.source.config_key import MapKey
+
+REFERENCES = [
+    UpstairTableReference(
+        TableName="PROJECT_A.DATASET_A.TABLE_A",
+        Line={MapKey.LINE_NUMBER: 1, MapKey.LINE_STRING: "FROM DATASET_A.TABLE_A"},
+    )
+]
+
+
+class TestMappingCache:
+    def test_create_key(self):
+        key_args: dict[str, Any] = {
+            "uri": "/tmp/a.sql",
+            "template_str": "SELECT * FROM {{ params.table }}",
+            "params": {"params": {"table": "a"}},
+            "ignore_params": None,
+            "default_table_prefix": "PROJECT_A",
+        }
+        key = MappingCache.create_key(**key_args)
+        assert key == MappingCache.create_key(**key_args)
+        assert key != MappingCache.create_key(
+            **{**key_args, "params": {"params": {"table": "b"}}}
+        )
+        assert key != MappingCache.create_key(
+            **{**key_args, "default_table_prefix": "PROJECT_B"}
+        )
+        assert key != MappingCache.create_key(**{**key_args, "query_engine": "regex"})
+
+    def test_create_key_with_mixed_keys(self):
+        key_args: dict[str, Any] = {
+            "uri": "/tmp/a.sql",
+            "template_str": "SELECT * FROM {{ params.table }}",
+            "params": {"params": {1: "a", "table": "a"}},
+            "ignore_params": None,
+            "default_table_prefix": "PROJECT_A",
+        }
+        key = MappingCache.create_key(**key_args)
+        assert key == MappingCache.create_key(
+            **{**key_args, "params": {"params": {"table": "a", 1: "a"}}}
+        )
+        assert key != MappingCache.create_key(
+            **{**key_args, "params": {"params": {"1": "a", "table": "a"}}}
+        )
+
+    def test_get_and_put(self, tmp_path):
+        cache = MappingCache(dir=str(tmp_path))
+        assert cache.get(key="a") is None
+        cache.put(key="a", references=REFERENCES)
+        assert cache.get(key="a") == REFERENCES
+        assert (cache.hits, cache.misses, cache.hit_rate) == (1, 1, 0.5)
+
+    def test_persistent(self, tmp_path):
+        MappingCache(dir=str(tmp_path)).put(key="a", references=REFERENCES)
+        assert MappingCache(dir=str(tmp_path)).get(key="a") == REFERENCES
+
+    def test_evict_least_recently_used(self, tmp_path):
+        size = len(json.dumps([{"TableName": "", "Line": {}}]))
+        cache = MappingCache(dir=str(tmp_path), max_size=size * 2)
+        empty = [UpstairTableReference(TableName="", Line={})]
+        cache.put(key="a", references=empty)
+        cache.put(key="b", references=empty)
+        cache.get(key="a")
+        cache.put(key="c", references=empty)
+
+        assert cache.evictions == 1
+        assert sorted(os.listdir(tmp_path)) == ["a.json", "c.json"]
+
+    def test_broken_file(self, tmp_path):
+        cache = MappingCache(dir=str(tmp_path))
+        cache.put(key="a", references=REFERENCES)
+        with open(tmp_path / "a.json", "w") as f:
+            f.write("{")
+        assert cache.get(key="a") is None
+        assert not os.listdir(tmp_path)
+
+
+def test_map_with_cache(
+    tmp_path,
+    monkeypatch: pytest.MonkeyPatch,
+    stairlight_config_file: StairlightConfig,
+    mapping_config: MappingConfig,
+):
+    results: list[str] = []
+    puts: list[str] = []
+    for _ in range(2):
+        cache = MappingCache(dir=str(tmp_path))
+        if results:
+            # Cache hits are not written again
+            monkeypatch.setattr(cache, "put", lambda key, references: puts.append(key))
+        dependency_map = Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            cache=cache,
+        )
+        dependency_map.write()
+        results.append(
+            json.dumps(StairLight.cast_mapped_dict_all(mapped=dependency_map.mapped))
+        )
+
+    assert results[0] == results[1]
+    assert cache.hits > 0 and cache.misses == 0
+    assert not puts
+
+
+class TestQueryMemo:
+    QUERY_STR = "SELECT * FROM DATASET_A.TABLE_A"
+
+    def test_detect_upstair_table_reference(self):
+        memo = QueryMemo()
+        query = Query(query_str=self.QUERY_STR, default_table_prefix="PROJECT_A")
+        expected = list(query.detect_upstair_table_reference())
+
+        first = memo.detect_upstair_table_reference(query=query)
+        second = memo.detect_upstair_table_reference(
+            query=Query(query_str=self.QUERY_STR, default_table_prefix="PROJECT_A")
+        )
+        assert first == second == expected
+        assert first[0].Line is not second[0].Line
+        assert (memo.hits, memo.misses, memo.hit_rate) == (1, 1, 0.5)
+
+        memo.detect_upstair_table_reference(
+            query=Query(query_str=self.QUERY_STR, default_table_prefix="PROJECT_B")
+        )
+        assert (memo.misses, len(memo)) == (2, 2)
+
+    def test_evict_least_recently_used(self):
+        memo = QueryMemo(max_entries=2)
+        queries = [Query(query_str=f"SELECT * FROM TABLE_{i}") for i in range(3)]
+        memo.detect_upstair_table_reference(query=queries[0])
+        memo.detect_upstair_table_reference(query=queries[1])
+        memo.detect_upstair_table_reference(query=queries[0])
+        memo.detect_upstair_table_reference(query=queries[2])
+        assert (len(memo), memo.evictions) == (2, 1)
+
+        memo.detect_upstair_table_reference(query=queries[1])
+        assert memo.misses == 4
+
+        memo.configure(max_entries=2, max_bytes=1)
+        assert len(memo) == 0 and memo.size == 0
+
+    def test_disabled(self):
+        memo = QueryMemo(max_entries=0)
+        query = Query(query_str=self.QUERY_STR)
+        assert memo.detect_upstair_table_reference(query=query) == list(
+            query.detect_upstair_table_reference()
+        )
+        assert (len(memo), memo.misses) == (0, 0)
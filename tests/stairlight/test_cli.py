@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 from typing import Any, Iterator
 
 import pytest
@@ -77,7 +78,7 @@ class TestSuccess:
             ]
         )
         results = cli_main.command_up(stairlight=stairlight_save, args=args)
-        assert len(results) > 0
+        assert isinstance(results, (dict, list)) and len(results) > 0
 
     @pytest.mark.integration
     def test_command_up_label(self, stairlight_save: StairLight):
@@ -93,7 +94,7 @@ class TestSuccess:
             ]
         )
         results = cli_main.command_up(stairlight=stairlight_save, args=args)
-        assert len(results) > 0
+        assert isinstance(results, (dict, list)) and len(results) > 0
 
     @pytest.mark.integration
     def test_command_down_table(self, stairlight_save: StairLight):
@@ -105,7 +106,7 @@ class TestSuccess:
             ]
         )
         results = cli_main.command_down(stairlight=stairlight_save, args=args)
-        assert len(results) > 0
+        assert isinstance(results, (dict, list)) and len(results) > 0
 
     @pytest.mark.integration
     def test_command_down_label(self, stairlight_save: StairLight):
@@ -118,9 +119,7 @@ class TestSuccess:
                 "-v",
             ]
         )
-        results: dict[str, Any] | list[dict[str, Any]] = cli_main.command_down(
-            stairlight=stairlight_save, args=args
-        )
+        results = cli_main.command_down(stairlight=stairlight_save, args=args)
         actual: dict[str, Any]
         if isinstance(results, dict):
             actual = results
@@ -164,6 +163,78 @@ class TestSuccess:
         out, err = capfd.readouterr()
         assert len(out) > 0 and len(err) == 0
 
+    def test_command_down_jsonl(self, tmp_path):
+        load_file = tmp_path / "map.json"
+        load_file.write_text(
+            json.dumps(
+                {
+                    "A": {"B": [{"Key": "a.sql"}]},
+                    "B": {"C": [{"Key": "b.sql"}]},
+                }
+            )
+        )
+        stairlight = StairLight(config_dir="none", load_files=[str(load_file)])
+        stairlight.load_map()
+        args = self.parser.parse_args(["down", "-t", "C", "--jsonl"])
+
+        records = cli_main.command_down(stairlight=stairlight, args=args)
+        assert isinstance(records, Iterator)
+        # Only the next tables are searched without --recursive
+        assert list(records) == [
+            {
+                "SearchedTable": "C",
+                "TableName": "B",
+                "Depth": 1,
+                "Parent": "C",
+                "Template": {"Key": "b.sql"},
+            }
+        ]
+        args = self.parser.parse_args(["down", "-t", "C", "--jsonl", "-r"])
+        records = cli_main.command_down(stairlight=stairlight, args=args)
+        assert isinstance(records, Iterator)
+        assert [
+            (record["TableName"], record["Depth"], record["Parent"])
+            for record in records
+        ] == [("B", 1, "C"), ("A", 2, "B")]
+
+    @pytest.mark.parametrize("depth", ["0", "-1", "a"])
+    def test_invalid_depth(self, depth: str, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args(["up", "-t", "A", "--depth", depth])
+        assert "--depth" in capsys.readouterr().err
+
+    @pytest.mark.parametrize("workers", ["0", "-1"])
+    def test_invalid_workers(self, workers: str, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args(["list", "-w", workers])
+        assert "--workers" in capsys.readouterr().err
+
+    def test_depth(self):
+        args = self.parser.parse_args(["up", "-t", "A", "--depth", "1"])
+        assert args.depth == 1
+
+    @pytest.mark.integration
+    def test_main_up_jsonl(self, monkeypatch, capfd):
+        monkeypatch.setattr(
+            "sys.argv",
+            [
+                "",
+                "up",
+                "-c",
+                "tests/config",
+                "--table",
+                "PROJECT_D.DATASET_E.TABLE_F",
+                "--depth",
+                "2",
+                "--jsonl",
+            ],
+        )
+        cli_main.main()
+        out, err = capfd.readouterr()
+        records = [json.loads(line) for line in out.splitlines()]
+        assert len(records) > 0 and len(err) == 0
+        assert all(1 <= record["Depth"] <= 2 for record in records)
+
     @pytest.mark.integration
     def test_main_down(self, monkeypatch, capfd):
         monkeypatch.setattr(
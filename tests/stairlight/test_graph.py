@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import pytest
+
+from src.stairlight.graph import (
+    DependencyGraph,
+    DependencyGraphBuilder,
+    Interner,
+    MappedView,
+    iterate_set_bits,
+)
+from src.stairlight.map import MappedTemplate, MappedTemplateObjectStorage
+
+
+def create_template(key: str, line_number: int) -> MappedTemplate:
+    return MappedTemplate(
+        TemplateSourceType="File",
+        Key=key,
+        Uri=f"/{key}",
+        Lines=[{"LineNumber": line_number, "LineString": "FROM X"}],
+        Labels={"Test": "a"},
+    )
+
+
+MAPPED = {
+    "A": {
+        "B": [create_template(key="a.sql", line_number=1)],
+        "C": [
+            create_template(key="a.sql", line_number=2),
+            MappedTemplateObjectStorage(
+                TemplateSourceType="GCS",
+                Key="c.sql",
+                Uri="gs://bucket/c.sql",
+                Lines=[],
+                Labels=None,
+                BucketName="bucket",
+            ),
+        ],
+        "D": [],
+    },
+    "B": {"C": [create_template(key="b.sql", line_number=1)]},
+    "E": {},
+}
+
+
+@pytest.fixture(scope="module")
+def graph() -> DependencyGraph:
+    return DependencyGraph.from_mapped(mapped=MAPPED)
+
+
+class TestInterner:
+    def test_intern(self):
+        interner = Interner()
+        assert interner.intern("a") == 0
+        assert interner.intern("b") == 1
+        assert interner.intern("a") == 0
+        assert interner[1] == "b"
+        assert interner.get_id("c") is None
+
+    def test_intern_with_key(self):
+        interner = Interner()
+        value = {"Test": "a"}
+        assert interner.intern(value, key="Test:a") == 0
+        assert interner.intern({"Test": "a"}, key="Test:a") == 0
+        assert interner[0] is value
+
+
+class TestDependencyGraph:
+    def test_to_mapped(self, graph: DependencyGraph):
+        assert graph.to_mapped() == MAPPED
+        assert list(graph.to_mapped()["A"].keys()) == ["B", "C", "D"]
+
+    def test_templates_are_shared(self, graph: DependencyGraph):
+        assert graph.edge_count == 4
+        assert len(graph._templates) == 3
+        assert len(graph._attributes) == 3
+
+    def test_get_upstairs(self, graph: DependencyGraph):
+        upstairs = graph.get_upstairs(table_name="A", as_dict=True)
+        assert upstairs is not None
+        assert upstairs["B"] == [
+            {
+                "TemplateSourceType": "File",
+                "Key": "a.sql",
+                "Uri": "/a.sql",
+                "Lines": [{"LineNumber": 1, "LineString": "FROM X"}],
+                "Labels": {"Test": "a"},
+            }
+        ]
+        assert graph.get_upstairs(table_name="X") is None
+
+    def test_get_downstairs(self, graph: DependencyGraph):
+        assert list(graph.get_downstairs(table_name="C").keys()) == ["A", "B"]
+        assert graph.get_downstairs(table_name="D") == {}
+        assert graph.get_downstairs(table_name="A") == {}
+        assert graph.get_downstairs(table_name="Z") == {}
+
+    def test_get_downstairs_same_as_scan(self, graph: DependencyGraph):
+        for name in list(graph.iterate_upstair_names()) + ["A", "E"]:
+            expected = {
+                table_name: upstairs[name]
+                for table_name, upstairs in MAPPED.items()
+                if upstairs.get(name)
+            }
+            assert graph.get_downstairs(table_name=name) == expected
+
+    def test_iterate_names(self, graph: DependencyGraph):
+        assert list(graph.iterate_table_names()) == ["A", "B", "E"]
+        assert sorted(graph.iterate_upstair_names()) == ["B", "C", "D"]
+        assert sorted(graph.iterate_template_uris()) == [
+            "/a.sql",
+            "/b.sql",
+            "gs://bucket/c.sql",
+        ]
+
+    def test_restored_values_are_copies(self, graph: DependencyGraph):
+        upstairs = graph.get_upstairs(table_name="A")
+        assert upstairs is not None
+        upstairs["B"][0].Lines.append({"LineNumber": 9, "LineString": ""})
+        assert graph.to_mapped() == MAPPED
+
+    def test_single_template(self):
+        loaded_map = {
+            "A": {"B": {"Key": "a.sql", "Uri": "/a.sql", "Lines": []}, "C": None}
+        }
+        graph = DependencyGraph.from_mapped(mapped=loaded_map)
+        assert graph.to_mapped() == loaded_map
+        assert graph.get_upstairs(table_name="A", as_dict=True) == {
+            "B": [{"Key": "a.sql", "Uri": "/a.sql", "Lines": []}],
+            "C": [],
+        }
+
+
+class TestDependencyGraphBuilder:
+    def test_build(self):
+        line_1 = {"LineNumber": 1, "LineString": "FROM X"}
+        line_2 = {"LineNumber": 2, "LineString": "FROM X"}
+        builder = DependencyGraphBuilder()
+        assert not builder.add_table(table_name="A")
+        builder.add_edge(
+            table_name="A",
+            upstair_name="B",
+            mapped_template=create_template(key="a.sql", line_number=1),
+            line=line_1,
+            replace=True,
+        )
+        builder.add_edge(
+            table_name="A",
+            upstair_name="B",
+            mapped_template=create_template(key="a.sql", line_number=1),
+            line=line_2,
+            replace=True,
+        )
+        assert builder.add_table(table_name="A")
+        builder.add_edge(
+            table_name="A",
+            upstair_name="B",
+            mapped_template=create_template(key="b.sql", line_number=1),
+            line=line_1,
+        )
+        builder.add_table(table_name="E")
+
+        a_template = create_template(key="a.sql", line_number=1)
+        a_template.Lines = [line_2, line_1]
+        b_template = create_template(key="b.sql", line_number=1)
+        mapped = {"A": {"B": [a_template, b_template]}}
+        graph = builder.build()
+        assert graph.to_mapped() == mapped
+        assert (
+            graph._names._values
+            == DependencyGraph.from_mapped(mapped=mapped)._names._values
+        )
+
+
+@pytest.fixture(scope="module")
+def cyclic_graph() -> DependencyGraph:
+    template = create_template(key="a.sql", line_number=1)
+    return DependencyGraph.from_mapped(
+        mapped={
+            "A": {"B": [template], "X": []},
+            "B": {"C": [template]},
+            "C": {"B": [template], "D": [template]},
+            "E": {"E": [template], "A": [template]},
+        }
+    )
+
+
+class TestTransitiveClosure:
+    def test_get_reachable_tables(self, cyclic_graph: DependencyGraph):
+        closure = cyclic_graph.get_closure()
+        assert closure.get_reachable_tables(table_name="A") == ["B", "C", "D"]
+        assert closure.get_reachable_tables(table_name="B") == ["C", "D"]
+        assert closure.get_reachable_tables(table_name="E") == ["A", "B", "C", "D"]
+        assert closure.get_reachable_tables(table_name="X") == []
+        assert closure.get_reachable_tables(table_name="Z") == []
+
+    def test_get_reachable_tables_downstairs(self, cyclic_graph: DependencyGraph):
+        closure = cyclic_graph.get_closure(downstairs=True)
+        assert closure.get_reachable_tables(table_name="D") == ["A", "B", "C", "E"]
+        assert closure.get_reachable_tables(table_name="X") == []
+
+    def test_cycles(self, cyclic_graph: DependencyGraph):
+        assert sorted(cyclic_graph.get_closure().cycles) == [["B", "C"], ["E"]]
+
+    def test_closure_is_kept(self, cyclic_graph: DependencyGraph):
+        assert cyclic_graph.get_closure() is cyclic_graph.get_closure()
+
+
+@pytest.mark.parametrize(
+    "indexes", [[], [0], [3, 7, 8, 63, 64], [0, 511, 512, 100000], list(range(1500))]
+)
+def test_iterate_set_bits(indexes: list[int]):
+    assert list(iterate_set_bits(bits=sum(1 << index for index in indexes))) == indexes
+
+
+class TestMappedView:
+    def test_mapping(self, graph: DependencyGraph):
+        view = MappedView(graph=graph)
+        assert len(view) == 3
+        assert "A" in view
+        assert "C" not in view
+        assert view.get("C") is None
+        assert view["B"] == MAPPED["B"]
+        assert view == MAPPED
+        with pytest.raises(KeyError):
+            view["C"]
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import glob
+import pathlib
+
+import pytest
+
+from src.stairlight.large_file import (
+    LargeFileQuery,
+    digest_file,
+    has_jinja_expressions,
+    iterate_file_chunks,
+)
+from src.stairlight.query import Query
+from src.stairlight.source.config import MappingConfig
+from src.stairlight.source.file.template import FileTemplate
+
+
+def render_at_once(
+    template: FileTemplate, params: dict, ignore_params: list[str] | None = None
+) -> list:
+    query = Query(
+        query_str=template.render(params=params, ignore_params=ignore_params),
+        default_table_prefix=template.default_table_prefix,
+        engine="lexer",
+    )
+    return list(query.iterate_reference_tuples())
+
+
+class TestIterateFileChunks:
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 1024])
+    def test_same_as_text_mode(self, tmp_path: pathlib.Path, chunk_size: int):
+        path = tmp_path / "query.sql"
+        path.write_bytes("SELECT 'あ'\r\nFROM a\rJOIN b\n\nWHERE 1 = 1".encode())
+
+        chunks = list(iterate_file_chunks(path=str(path), chunk_size=chunk_size))
+        with open(path) as f:
+            assert "".join(chunks) == f.read()
+        assert all(chunk.endswith("\n") for chunk in chunks[:-1])
+
+    def test_empty(self, tmp_path: pathlib.Path):
+        path = tmp_path / "empty.sql"
+        path.write_text("")
+        assert list(iterate_file_chunks(path=str(path))) == []
+        assert not has_jinja_expressions(path=str(path))
+        assert digest_file(path=str(path))
+
+
+class TestLargeFileQuery:
+    @pytest.mark.parametrize(
+        "key",
+        sorted(
+            path
+            for path in glob.glob("tests/sql/*.sql")
+            if not has_jinja_expressions(path=path)
+        ),
+    )
+    @pytest.mark.parametrize("chunk_size", [16, 1024])
+    def test_same_as_query(
+        self, mapping_config: MappingConfig, key: str, chunk_size: int
+    ):
+        template = FileTemplate(
+            mapping_config=mapping_config,
+            key=key,
+            default_table_prefix="PROJECT_A.DATASET_A",
+        )
+        params = {
+            "sub_table_01": "PROJECT_B.DATASET_B.TABLE_B",
+            "sub_table_02": "PROJECT_C.DATASET_C.TABLE_C",
+        }
+        large_file_query = LargeFileQuery(
+            template=template,
+            path=key,
+            params=params,
+            ignore_params=["main_table"],
+            chunk_size=chunk_size,
+        )
+        assert list(large_file_query.iterate_reference_tuples()) == render_at_once(
+            template=template, params=params, ignore_params=["main_table"]
+        )
+
+    def test_invalid_placeholders(
+        self, mapping_config: MappingConfig, tmp_path: pathlib.Path
+    ):
+        path = tmp_path / "invalid.sql"
+        path.write_text(
+            "SELECT * FROM a_$suffix\n" * 10 + "SELECT $1 FROM b_${suffix}\n"
+        )
+        template = FileTemplate(mapping_config=mapping_config, key=str(path))
+        params = {"suffix": "x"}
+
+        large_file_query = LargeFileQuery(
+            template=template, path=str(path), params=params, chunk_size=32
+        )
+        actual = list(large_file_query.iterate_reference_tuples())
+        assert actual == render_at_once(template=template, params=params)
+        # The whole file is left unrendered, not only the chunk
+        assert {table_name for table_name, _, _ in actual} == {"a_", "b_"}
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import json
 from collections import OrderedDict
+from typing import Any
 
 import pytest
 
-from src.stairlight.map import Map, create_dict_key_list
+from src.stairlight import StairLight
+from src.stairlight.graph import DependencyGraph, DependencyGraphBuilder
+from src.stairlight.map import Map, MappedTemplate, MappingPlan, create_dict_key_list
+from src.stairlight.query import ReferenceTuple
+from src.stairlight.sink import EdgeSink
 from src.stairlight.source.config import (
     MappingConfig,
     MappingConfigMappingTable,
@@ -12,6 +18,7 @@ from src.stairlight.source.config import (
 )
 from src.stairlight.source.config_key import MapKey
 from src.stairlight.source.template import Template, TemplateSourceType
+from src.stairlight.worker import RenderParseWorkUnit, process_work_unit
 
 
 @pytest.fixture(scope="session")
@@ -194,3 +201,341 @@ def test_create_dict_key_list():
     actual = create_dict_key_list(d=d)
     expected = ["params.PROJECT", "params.DATASET", "params.TABLE"]
     assert actual == expected
+
+
+@pytest.fixture(scope="session")
+def serial_map(
+    stairlight_config_file: StairlightConfig, mapping_config: MappingConfig
+) -> Map:
+    serial_map = Map(
+        stairlight_config=stairlight_config_file, mapping_config=mapping_config
+    )
+    serial_map.write()
+    return serial_map
+
+
+# Every file without jinja expressions is parsed in chunks
+LARGE_FILE_ARGS = {"large_file_threshold": 1, "large_file_chunk_size": 64}
+
+
+@pytest.mark.parametrize(
+    "map_args",
+    [
+        {"max_workers": 4},
+        {"max_processes": 2, "process_chunk_size": 2},
+        # Limits switch to supervised processes even without max_processes
+        {"template_time_limit": 60},
+        LARGE_FILE_ARGS,
+        {"max_processes": 2, **LARGE_FILE_ARGS},
+        {"template_time_limit": 60, **LARGE_FILE_ARGS},
+    ],
+    ids=[
+        "threads",
+        "processes",
+        "limits",
+        "large_files",
+        "large_files_in_processes",
+        "large_files_with_limits",
+    ],
+)
+def test_same_as_serial(
+    stairlight_config_file: StairlightConfig,
+    mapping_config: MappingConfig,
+    serial_map: Map,
+    map_args: dict[str, Any],
+):
+    dependency_map = Map(
+        stairlight_config=stairlight_config_file,
+        mapping_config=mapping_config,
+        **map_args,
+    )
+    dependency_map.write()
+
+    assert len(dependency_map.mapped) > 0
+    if map_args.get("large_file_threshold"):
+        assert any(dependency_map._large_file_paths.values())
+    assert json.dumps(
+        StairLight.cast_mapped_dict_all(mapped=dependency_map.mapped)
+    ) == json.dumps(StairLight.cast_mapped_dict_all(mapped=serial_map.mapped))
+    assert [
+        (unmapped[MapKey.TEMPLATE].key, unmapped[MapKey.PARAMETERS])
+        for unmapped in dependency_map.unmapped
+    ] == [
+        (unmapped[MapKey.TEMPLATE].key, unmapped[MapKey.PARAMETERS])
+        for unmapped in serial_map.unmapped
+    ]
+
+
+class TestWriteInProcesses:
+    def test_failed_template_is_unmapped(
+        self,
+        stairlight_config_file: StairlightConfig,
+        mapping_config: MappingConfig,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        monkeypatch.setattr("src.stairlight.map.process_work_unit", fail_cte_multi_line)
+        dependency_map = Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            template_time_limit=60,
+        )
+        dependency_map.write()
+
+        failed = [
+            unmapped
+            for unmapped in dependency_map.unmapped
+            if MapKey.REASON in unmapped
+        ]
+        assert failed
+        assert all(
+            unmapped[MapKey.TEMPLATE].key == CTE_MULTI_LINE_KEY
+            and unmapped[MapKey.REASON].startswith("error: ")
+            for unmapped in failed
+        )
+        for upstairs in dependency_map.mapped.values():
+            for templates in upstairs.values():
+                assert all(template.Key != CTE_MULTI_LINE_KEY for template in templates)
+
+
+CTE_MULTI_LINE_KEY = "tests/sql/cte_multi_line.sql"
+
+
+def fail_cte_multi_line(work_unit: RenderParseWorkUnit) -> list[ReferenceTuple]:
+    if work_unit.key == CTE_MULTI_LINE_KEY:
+        raise ValueError("failed")
+    return process_work_unit(work_unit=work_unit)
+
+
+def fail_large_file(work_unit: RenderParseWorkUnit) -> list[ReferenceTuple]:
+    if work_unit.path:
+        raise ValueError("failed")
+    return process_work_unit(work_unit=work_unit)
+
+
+class TestWriteLargeFiles:
+    def test_failed_large_file_is_unmapped(
+        self,
+        stairlight_config_file: StairlightConfig,
+        mapping_config: MappingConfig,
+        monkeypatch: pytest.MonkeyPatch,
+    ):
+        # Large files are also parsed in supervised processes
+        monkeypatch.setattr("src.stairlight.map.process_work_unit", fail_large_file)
+        dependency_map = Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            large_file_threshold=1,
+            template_time_limit=60,
+        )
+        dependency_map.write()
+
+        large_file_uris = {
+            uri for uri, path in dependency_map._large_file_paths.items() if path
+        }
+        failed_uris = {
+            unmapped[MapKey.TEMPLATE].uri
+            for unmapped in dependency_map.unmapped
+            if MapKey.REASON in unmapped
+        }
+        assert failed_uris and failed_uris <= large_file_uris
+        for upstairs in dependency_map.mapped.values():
+            for templates in upstairs.values():
+                assert not any(
+                    template.Uri in large_file_uris for template in templates
+                )
+
+
+class ListEdgeSink(EdgeSink):
+    def __init__(self) -> None:
+        self.edges: list[tuple[str, str, MappedTemplate]] = []
+        self.closed = False
+
+    def write(
+        self,
+        table_name: str,
+        upstair_table_name: str,
+        mapped_template: MappedTemplate,
+    ) -> None:
+        self.edges.append((table_name, upstair_table_name, mapped_template))
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class TestWriteEdges:
+    def test_same_edges_as_mapped(
+        self, stairlight_config_file: StairlightConfig, mapping_config: MappingConfig
+    ):
+        serial_map = Map(
+            stairlight_config=stairlight_config_file, mapping_config=mapping_config
+        )
+        serial_map.write()
+        sink = ListEdgeSink()
+        streaming_map = Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            edge_sink=sink,
+        )
+        streaming_map.write()
+
+        assert streaming_map.mapped == {}
+        assert {
+            (table_name, upstair_name, mapped_template.Uri)
+            for table_name, upstair_name, mapped_template in sink.edges
+        } == {
+            (table_name, upstair_name, mapped_template.Uri)
+            for table_name, upstairs in serial_map.mapped.items()
+            for upstair_name, mapped_templates in upstairs.items()
+            for mapped_template in mapped_templates
+        }
+        assert streaming_map.streamed_upstairs == {
+            upstair_name for _, upstair_name, _ in sink.edges
+        }
+
+    def test_lines_of_edge(
+        self, stairlight_config_file: StairlightConfig, mapping_config: MappingConfig
+    ):
+        sink = ListEdgeSink()
+        Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            edge_sink=sink,
+        ).write()
+
+        actual = [
+            mapped_template.Lines
+            for table_name, upstair_name, mapped_template in sink.edges
+            if upstair_name == "test_project.beam_streaming.taxirides_realtime"
+        ]
+        assert actual == [
+            [
+                {
+                    "LineNumber": 6,
+                    "LineString": "    test_project.beam_streaming.taxirides_realtime",
+                },
+                {
+                    "LineNumber": 15,
+                    "LineString": "    test_project.beam_streaming.taxirides_realtime",
+                },
+            ]
+        ]
+
+    def test_lines_differ_from_mapped(
+        self, stairlight_config_file: StairlightConfig, mapping_config: MappingConfig
+    ):
+        table_name = "PROJECT_J.DATASET_K.TABLE_L"
+        upstair_name = "PROJECT_P.DATASET_Q.TABLE_R"
+        sink = ListEdgeSink()
+        Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            edge_sink=sink,
+        ).write()
+        serial_map = Map(
+            stairlight_config=stairlight_config_file, mapping_config=mapping_config
+        )
+        serial_map.write()
+
+        # An edge has lines of its own template only, while remap adds lines
+        # to all templates of the upstairs table
+        assert [
+            (
+                mapped_template.Key,
+                [line["LineNumber"] for line in mapped_template.Lines],
+            )
+            for edge_table_name, edge_upstair_name, mapped_template in sink.edges
+            if (edge_table_name, edge_upstair_name) == (table_name, upstair_name)
+        ] == [
+            ("tests/sql/cte_multi_line_params.sql", [23]),
+            ("tests/sql/cte_multi_line_params_copy.sql", [32]),
+        ]
+        assert [
+            (
+                mapped_template.Key,
+                [line["LineNumber"] for line in mapped_template.Lines],
+            )
+            for mapped_template in serial_map.mapped[table_name][upstair_name]
+        ] == [
+            ("tests/sql/cte_multi_line_params.sql", [23, 32]),
+            ("tests/sql/cte_multi_line_params_copy.sql", [32]),
+        ]
+
+
+class TestWriteGraph:
+    @pytest.mark.parametrize("max_processes", [None, 2])
+    def test_same_as_mapped(
+        self,
+        stairlight_config_file: StairlightConfig,
+        mapping_config: MappingConfig,
+        max_processes: int | None,
+    ):
+        serial_map = Map(
+            stairlight_config=stairlight_config_file, mapping_config=mapping_config
+        )
+        serial_map.write()
+        graph_builder = DependencyGraphBuilder()
+        graph_map = Map(
+            stairlight_config=stairlight_config_file,
+            mapping_config=mapping_config,
+            max_processes=max_processes,
+            graph_builder=graph_builder,
+        )
+        graph_map.write()
+        graph = graph_builder.build()
+        expected = DependencyGraph.from_mapped(mapped=serial_map.mapped)
+
+        assert graph_map.mapped == {}
+        assert len(graph) > 0
+        assert json.dumps(
+            StairLight.cast_mapped_dict_all(mapped=graph.to_mapped())
+        ) == json.dumps(StairLight.cast_mapped_dict_all(mapped=serial_map.mapped))
+        assert graph._names._values == expected._names._values
+        assert [template.values for template in graph._templates._values] == [
+            template.values for template in expected._templates._values
+        ]
+
+
+class TestMappingPlan:
+    mapping_config = MappingConfig(
+        ExtraLabels=[
+            {"TableName": "A", "Labels": {"Test": "first"}},
+            {"TableName": "A", "Labels": {"Test": "second"}},
+        ],
+    )
+
+    def test_get_table_plan(self):
+        plan = MappingPlan(
+            mapping_config=self.mapping_config,
+            global_params={"params": {"PROJECT": "P", "TABLE": "T"}},
+        )
+        table_attributes = MappingConfigMappingTable(
+            TableName="B",
+            IgnoreParameters=["execution_date"],
+            Parameters=OrderedDict({"params": {"TABLE": "B"}, "DATASET": "D"}),
+        )
+        table_plan = plan.get_table_plan(table_attributes=table_attributes)
+        assert table_plan.params == {"params": {"TABLE": "B"}, "DATASET": "D"}
+        assert table_plan.param_keys == {"params.TABLE", "DATASET"}
+        assert table_plan.ignore_params == {"execution_date"}
+        assert plan.get_table_plan(table_attributes=table_attributes) is table_plan
+
+    def test_extra_labels(self):
+        plan = MappingPlan(mapping_config=self.mapping_config, global_params={})
+        assert plan.extra_labels == {"A": {"Test": "first"}}
+
+
+def test_fetch_template_str_once(
+    stairlight_config_file: StairlightConfig, mapping_config: MappingConfig
+):
+    dependency_map = Map(
+        stairlight_config=stairlight_config_file, mapping_config=mapping_config
+    )
+    dependency_map.write()
+    store = dependency_map.template_str_store
+
+    total_size = 0
+    for template_source in dependency_map.find_template_source():
+        for template in template_source.search_templates():
+            total_size += len(template.get_template_str().encode("utf-8"))
+    assert store.bytes_fetched == total_size
+    assert store.bytes_served > 0
@@ -1,8 +1,16 @@
 from __future__ import annotations
 
+import glob
+
 import pytest
 
-from src.stairlight.query import Query, UpstairTableReference, solve_table_prefix
+from src.stairlight.query import (
+    QUERY_ENGINE_DEFAULT,
+    Query,
+    QueryEngine,
+    UpstairTableReference,
+    solve_table_prefix,
+)
 from src.stairlight.source.config import MapKey
 
 
@@ -362,3 +370,61 @@ class TestSuccess:
             table=table, default_table_prefix=default_table_prefix
         )
         assert actual == expected
+
+
+class TestQueryEngine:
+    @pytest.mark.parametrize(
+        "file",
+        sorted(glob.glob("tests/sql/**/*.sql", recursive=True)),
+    )
+    def test_lexer_matches_regex(self, file: str):
+        with open(file) as f:
+            query_str = f.read()
+        actual = list(
+            Query(
+                query_str=query_str, default_table_prefix="PROJECT_A", engine="lexer"
+            ).detect_upstair_table_reference()
+        )
+        expected = list(
+            Query(
+                query_str=query_str, default_table_prefix="PROJECT_A", engine="regex"
+            ).detect_upstair_table_reference()
+        )
+        assert actual == expected
+
+    def test_default_engine(self):
+        assert Query(query_str="SELECT 1").engine == QUERY_ENGINE_DEFAULT
+        assert Query(query_str="SELECT 1", engine="regex").engine == QueryEngine.REGEX
+
+
+class TestParseMany:
+    def test_parse_many(self):
+        files = ["tests/sql/cte_multi_line.sql", "tests/sql/nested_join.sql"]
+        query_strs = []
+        for file in files:
+            with open(file) as f:
+                query_strs.append(f.read())
+        query_strs.append(query_strs[0])
+        prefixes = ["PROJECT_A", None, "PROJECT_B"]
+
+        parsed = Query.parse_many(
+            query_strs=query_strs, default_table_prefixes=prefixes
+        )
+        for query_index, query_str in enumerate(query_strs):
+            expected = list(
+                Query(
+                    query_str=query_str, default_table_prefix=prefixes[query_index]
+                ).detect_upstair_table_reference()
+            )
+            assert [
+                parsed.get_reference(index=i)
+                for i in parsed.get_range(query_index=query_index)
+            ] == expected
+        assert len(parsed) == len(parsed.line_ids) == len(parsed.table_ids)
+        # Line strings of the same query are interned once
+        assert len(parsed.lines) < len(parsed)
+
+    def test_parse_many_empty(self):
+        parsed = Query.parse_many(query_strs=["SELECT 1", ""])
+        assert len(parsed) == 0
+        assert parsed.get_range(query_index=1) == range(0, 0)
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import glob
+
+import pytest
+
+from src.stairlight.query_parser import (
+    HybridQueryParser,
+    LexerQueryParser,
+    QueryEngine,
+    RegexQueryParser,
+    classify_query,
+    get_query_parser,
+)
+from src.stairlight.sql_lexer import LineIndex
+
+
+@pytest.mark.parametrize(
+    ("query_str", "expected"),
+    [
+        ("SELECT * FROM a JOIN b USING(id)", None),
+        ("SELECT * FROM (SELECT * FROM a)", "subquery"),
+        ("SELECT 'from a' AS s FROM b", "string"),
+        ("SELECT * FROM a /* JOIN b */", "block_comment"),
+        ("SELECT EXTRACT(DAY FROM ts) FROM a", "function"),
+        ("DECLARE x INT64;\nSELECT * FROM a", "scripting"),
+        ("SELECT * FROM a;\nSELECT * FROM b;\n", "scripting"),
+        ("SELECT * FROM a;\n", None),
+    ],
+    ids=[
+        "plain",
+        "subquery",
+        "string",
+        "block_comment",
+        "function",
+        "scripting",
+        "statements",
+        "semicolon",
+    ],
+)
+def test_classify_query(query_str: str, expected: str | None):
+    assert classify_query(query_str=query_str) == expected
+
+
+class TestHybridQueryParser:
+    def test_parse(self):
+        query_parser = HybridQueryParser(
+            fast=RegexQueryParser(), full=LexerQueryParser()
+        )
+        lexer = LexerQueryParser()
+        for file in sorted(glob.glob("tests/sql/**/*.sql", recursive=True)):
+            with open(file) as f:
+                query_str = f.read()
+            line_index = LineIndex(query_str=query_str)
+            assert query_parser.find_upstairs_table_lines(
+                query_str=query_str, line_index=line_index
+            ) == lexer.find_upstairs_table_lines(
+                query_str=query_str, line_index=line_index
+            )
+
+        stats = query_parser.stats
+        assert stats.queries == lexer.stats.queries
+        assert stats.queries == (
+            query_parser.fast.stats.queries + query_parser.full.stats.queries
+        )
+        assert sum(stats.reasons.values()) == query_parser.full.stats.queries > 0
+
+
+def test_get_query_parser():
+    assert get_query_parser(engine=QueryEngine.HYBRID) is get_query_parser(
+        engine=QueryEngine.HYBRID
+    )
+    assert isinstance(get_query_parser(engine=QueryEngine.REGEX), RegexQueryParser)
+
+
+def test_sqlglot_query_parser():
+    pytest.importorskip("sqlglot")
+    query_parser = get_query_parser(engine=QueryEngine.SQLGLOT)
+    query_str = (
+        "WITH a AS (SELECT * FROM `p`.`d`.`t1`)\n"
+        "SELECT * FROM a\n"
+        "JOIN d.t2 USING(id) -- d.t2\n"
+    )
+    assert query_parser.find_upstairs_table_lines(
+        query_str=query_str, line_index=LineIndex(query_str=query_str)
+    ) == [("d.t2", [2]), ("p.d.t1", [0])]
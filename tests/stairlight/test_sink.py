@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from src.stairlight.map import MappedTemplate
+from src.stairlight.sink import (
+    JsonLinesEdgeSink,
+    build_map_from_edge_records,
+    is_json_lines,
+    iterate_edge_records,
+)
+from src.stairlight.source.controller import LoadMapController, SaveMapController
+
+MAPPED: dict[str, dict[str, list[dict[str, Any]]]] = {
+    "PROJECT_A.DATASET_A.TABLE_A": {
+        "PROJECT_B.DATASET_B.TABLE_B": [
+            {
+                "TemplateSourceType": "File",
+                "Key": "a.sql",
+                "Uri": "/a.sql",
+                "Lines": [{"LineNumber": 1, "LineString": "FROM B"}],
+                "Labels": {"Test": "a"},
+            }
+        ],
+        "PROJECT_C.DATASET_C.TABLE_C": [],
+    },
+}
+
+
+def test_is_json_lines():
+    assert is_json_lines(file="tests/expected/map.jsonl")
+    assert not is_json_lines(file="tests/expected/map.json")
+
+
+def test_build_map_from_edge_records():
+    records = list(iterate_edge_records(mapped=MAPPED))
+    assert len(records) == 1
+    assert records[0]["TableName"] == "PROJECT_A.DATASET_A.TABLE_A"
+    assert records[0]["UpstairTableName"] == "PROJECT_B.DATASET_B.TABLE_B"
+    assert build_map_from_edge_records(records=records) == {
+        "PROJECT_A.DATASET_A.TABLE_A": {
+            "PROJECT_B.DATASET_B.TABLE_B": MAPPED["PROJECT_A.DATASET_A.TABLE_A"][
+                "PROJECT_B.DATASET_B.TABLE_B"
+            ]
+        }
+    }
+
+
+def test_json_lines_edge_sink(tmp_path):
+    save_file = str(tmp_path / "map.jsonl")
+    sink = JsonLinesEdgeSink(save_file=save_file)
+    sink.write(
+        table_name="PROJECT_A.DATASET_A.TABLE_A",
+        upstair_table_name="PROJECT_B.DATASET_B.TABLE_B",
+        mapped_template=MappedTemplate(
+            **MAPPED["PROJECT_A.DATASET_A.TABLE_A"]["PROJECT_B.DATASET_B.TABLE_B"][0]
+        ),
+    )
+    sink.close()
+
+    assert sink.count == 1
+    with open(save_file) as f:
+        lines = f.read().splitlines()
+    assert json.loads(lines[0])["Key"] == "a.sql"
+    assert LoadMapController(load_file=save_file).load() == build_map_from_edge_records(
+        records=iterate_edge_records(mapped=MAPPED)
+    )
+
+
+def test_save_and_load_json_lines(tmp_path):
+    save_file = str(tmp_path / "map.jsonl")
+    SaveMapController(save_file=save_file, mapped=MAPPED).save()
+    assert LoadMapController(load_file=save_file).load() == build_map_from_edge_records(
+        records=iterate_edge_records(mapped=MAPPED)
+    )
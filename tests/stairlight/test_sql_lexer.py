@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import glob
+
+import pytest
+
+from src.stairlight.sql_lexer import LineIndex, QueryLexer, lex_query
+
+
+class TestLineIndex:
+    @pytest.mark.parametrize(
+        "query_str",
+        ["", "a", "a\n", "a\r\n\nb", "a\rb\x0bc\u2028d\r\n"],
+        ids=["empty", "one_line", "line_break", "blank_line", "line_breaks"],
+    )
+    def test_splitlines(self, query_str: str):
+        line_index = LineIndex(query_str=query_str)
+        assert [
+            line_index.get_line(line_index=i) for i in range(len(line_index))
+        ] == query_str.splitlines()
+
+    def test_find(self):
+        line_index = LineIndex(query_str="ab\r\ncd\nef")
+        actual = [line_index.find(offset=i) for i in range(9)]
+        assert actual == [0, 0, 0, 0, 1, 1, 1, 2, 2]
+
+
+class TestLexQuery:
+    @pytest.mark.parametrize(
+        ("query_str", "expected"),
+        [
+            (
+                "SELECT 'SELECT * FROM a' AS s FROM b /* JOIN c */ -- JOIN d\n",
+                ["b"],
+            ),
+            (
+                "WITH RECURSIVE a AS (SELECT 1 FROM b),\n"
+                "c AS (SELECT * FROM a JOIN `p`.`d`.`e` ON TRUE)\n"
+                "SELECT * FROM c",
+                ["`p`.`d`.`e`", "b"],
+            ),
+            (
+                "SELECT * FROM (WITH a AS (SELECT 1 FROM b) SELECT * FROM a) x\n"
+                "JOIN a USING(id)",
+                ["a", "b"],
+            ),
+            (
+                "SELECT EXTRACT(DAY FROM ts) FROM a CROSS JOIN UNNEST(arr)",
+                ["a"],
+            ),
+            (
+                "SELECT a, b AS c FROM b",
+                ["b"],
+            ),
+            (
+                "SELECT * FROM project-1.dataset.a;\n"
+                "WITH a AS (SELECT 1) SELECT * FROM a",
+                ["project-1.dataset.a"],
+            ),
+        ],
+        ids=[
+            "comments_and_strings",
+            "cte",
+            "cte_scope",
+            "extract_and_unnest",
+            "column_alias",
+            "statements",
+        ],
+    )
+    def test_tables(self, query_str: str, expected: list[str]):
+        assert lex_query(query_str=query_str).tables == expected
+
+    def test_find_line_indexes(self):
+        query_str = (
+            "SELECT\n"
+            "  a.id -- a.id\n"
+            "FROM\r\n"
+            "  a\r"
+            "WHERE a.name = 'a' /*\n"
+            "a */\n"
+        )
+        lexed = lex_query(query_str=query_str)
+        assert lexed.tables == ["a"]
+        assert lexed.find_line_indexes(table="a") == [1, 3, 4]
+
+
+class TestQueryLexer:
+    @pytest.mark.parametrize("chunk_size", [1, 7, 50])
+    @pytest.mark.parametrize("path", sorted(glob.glob("tests/sql/*.sql")))
+    def test_same_as_whole(self, path: str, chunk_size: int):
+        with open(path) as f:
+            query_str = f.read()
+        lexer = QueryLexer(margin=64)
+        for start in range(0, len(query_str), chunk_size):
+            end = start + chunk_size
+            lexer.feed(text=query_str[start:end])
+        lexer.feed(text="", final=True)
+
+        lexed = lex_query(query_str=query_str)
+        assert sorted(lexer.tables) == lexed.tables
+        assert lexer.ignored_starts == lexed.ignored_starts
+        assert lexer.ignored_ends == lexed.ignored_ends
+
+    def test_keyword_across_chunks(self):
+        lexer = QueryLexer(margin=8)
+        for text in ["SELECT * FR", "OM `a.b.", "c` JOIN\n", "d"]:
+            lexer.feed(text=text)
+        lexer.feed(text="", final=True)
+        assert sorted(lexer.tables) == ["`a.b.c`", "d"]
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Iterator
+from typing import Any, Iterator, Mapping
 
 import pytest
 
 from src.stairlight import ResponseType, SearchDirection, StairLight
-from src.stairlight.source.config import MapKey
+from src.stairlight.source.config import MapKey, StairlightConfigSettings
 from tests.conftest import teardown_rm_file
 
 
@@ -314,7 +314,7 @@ class TestStairLight:
 
     def test_merge(self, stairlight_merge: StairLight):
         stairlight_merge.load_map()
-        actual: dict[str, Any] = stairlight_merge.mapped
+        actual: Mapping[str, Any] = stairlight_merge.mapped
         with open("tests/expected/merged.json", "r") as f:
             expected: dict[str, Any] = json.load(f)
         assert actual == expected
@@ -341,3 +341,234 @@ class TestStairLightNoConfig:
 
     def test_has_stairlight_config(self):
         assert not self.stairlight.has_stairlight_config()
+
+
+def create_mapped_template(key: str) -> dict[str, Any]:
+    return {
+        "TemplateSourceType": "File",
+        "Key": key,
+        "Uri": f"/{key}",
+        "Lines": [{"LineNumber": 1, "LineString": "FROM X"}],
+    }
+
+
+# A diamond of B and C, and a cycle of E and F
+SEARCH_MAPPED = {
+    "A": {
+        "B": [create_mapped_template(key="a.sql")],
+        "C": [create_mapped_template(key="a.sql")],
+    },
+    "B": {"D": [create_mapped_template(key="b.sql")]},
+    "C": {"D": [create_mapped_template(key="c.sql")]},
+    "D": {"E": [create_mapped_template(key="d.sql")]},
+    "E": {"F": [create_mapped_template(key="e.sql")]},
+    "F": {"E": [create_mapped_template(key="f.sql")]},
+}
+
+
+@pytest.fixture
+def stairlight_search(tmp_path) -> StairLight:
+    load_file = tmp_path / "search.json"
+    load_file.write_text(json.dumps(SEARCH_MAPPED))
+    stairlight = StairLight(config_dir="none", load_files=[str(load_file)])
+    stairlight.load_map()
+    return stairlight
+
+
+class TestSearch:
+    def test_up_recursive_plain_table(self, stairlight_search: StairLight):
+        assert stairlight_search.up(table_name="A", recursive=True) == [
+            "B",
+            "C",
+            "D",
+            "E",
+            "F",
+        ]
+        assert stairlight_search.up(table_name="E", recursive=True) == ["F"]
+
+    def test_up_recursive_plain_uri(self, stairlight_search: StairLight):
+        assert stairlight_search.up(
+            table_name="B", recursive=True, response_type=ResponseType.URI.value
+        ) == ["/b.sql", "/d.sql", "/e.sql", "/f.sql"]
+
+    def test_down_recursive_plain_table(self, stairlight_search: StairLight):
+        assert stairlight_search.down(table_name="D", recursive=True) == [
+            "A",
+            "B",
+            "C",
+        ]
+
+    def test_up_recursive_verbose(self, stairlight_search: StairLight):
+        up = SearchDirection.UP.value
+        result = stairlight_search.up(table_name="A", recursive=True, verbose=True)
+        assert isinstance(result, dict)
+        # Both sides of the diamond are searched
+        for table_name in ["B", "C"]:
+            d = result["A"][up][table_name][up]["D"]
+            assert d["Templates"] == [
+                create_mapped_template(key=f"{table_name.lower()}.sql")
+            ]
+            # The circular reference back to E is left out
+            assert list(d[up]["E"][up]["F"].keys()) == ["Templates"]
+
+    def test_up_verbose(self, stairlight_search: StairLight):
+        result = stairlight_search.up(table_name="B", verbose=True)
+        assert result == {
+            "B": {
+                SearchDirection.UP.value: {
+                    "D": {"Templates": [create_mapped_template(key="b.sql")]}
+                }
+            }
+        }
+
+    @pytest.mark.parametrize("direction", list(SearchDirection))
+    @pytest.mark.parametrize(
+        "response_type", [ResponseType.TABLE.value, ResponseType.URI.value]
+    )
+    def test_precompute_lineage(
+        self,
+        stairlight_search: StairLight,
+        direction: SearchDirection,
+        response_type: str,
+    ):
+        expected = {
+            table_name: stairlight_search.search_plain(
+                table_name=table_name,
+                recursive=True,
+                response_type=response_type,
+                direction=direction,
+            )
+            for table_name in SEARCH_MAPPED
+        }
+        assert stairlight_search.precompute_lineage() == [["E", "F"]]
+        for table_name, response in expected.items():
+            assert (
+                stairlight_search.search_plain(
+                    table_name=table_name,
+                    recursive=True,
+                    response_type=response_type,
+                    direction=direction,
+                )
+                == response
+            )
+
+    @pytest.mark.parametrize("direction", list(SearchDirection))
+    @pytest.mark.parametrize(
+        "recursive, verbose, response_type",
+        [
+            (True, False, ResponseType.TABLE.value),
+            (True, False, ResponseType.URI.value),
+            (True, True, ResponseType.TABLE.value),
+            (False, False, ResponseType.TABLE.value),
+        ],
+    )
+    @pytest.mark.parametrize("depth", [None, 2])
+    def test_search_many(
+        self,
+        stairlight_search: StairLight,
+        direction: SearchDirection,
+        recursive: bool,
+        verbose: bool,
+        response_type: str,
+        depth: int | None,
+    ):
+        table_names = ["A", "D", "F", "Z", "A"]
+        actual = stairlight_search.search_many(
+            table_names=table_names,
+            recursive=recursive,
+            verbose=verbose,
+            response_type=response_type,
+            direction=direction,
+            depth=depth,
+        )
+        assert list(actual.keys()) == ["A", "D", "F", "Z"]
+        for table_name, result in actual.items():
+            assert result == stairlight_search.search(
+                table_name=table_name,
+                recursive=recursive,
+                verbose=verbose,
+                response_type=response_type,
+                direction=direction,
+                depth=depth,
+            )
+
+    @pytest.mark.parametrize(
+        "depth, expected",
+        [(1, ["B", "C"]), (2, ["B", "C", "D"]), (4, ["B", "C", "D", "E", "F"])],
+    )
+    def test_up_depth_plain(
+        self, stairlight_search: StairLight, depth: int, expected: list[str]
+    ):
+        assert (
+            stairlight_search.up(table_name="A", recursive=True, depth=depth)
+            == expected
+        )
+
+    def test_up_depth_verbose(self, stairlight_search: StairLight):
+        up = SearchDirection.UP.value
+        result = stairlight_search.up(
+            table_name="A", recursive=True, verbose=True, depth=2
+        )
+        assert isinstance(result, dict)
+        for table_name in ["B", "C"]:
+            # D is listed but not searched
+            assert list(result["A"][up][table_name][up]["D"].keys()) == ["Templates"]
+
+    def test_iterate_search(self, stairlight_search: StairLight):
+        records = list(
+            stairlight_search.iterate_search(
+                table_name="A", direction=SearchDirection.UP
+            )
+        )
+        assert [
+            (record.TableName, record.Depth, record.Parent) for record in records
+        ] == [
+            ("B", 1, "A"),
+            ("C", 1, "A"),
+            ("D", 2, "B"),
+            ("D", 2, "C"),
+            ("E", 3, "D"),
+            ("F", 4, "E"),
+            ("E", 5, "F"),
+        ]
+        assert records[0].Template == create_mapped_template(key="a.sql")
+
+    def test_iterate_search_depth(self, stairlight_search: StairLight):
+        records = stairlight_search.iterate_search(
+            table_name="D", direction=SearchDirection.DOWN, depth=1
+        )
+        assert [(record.TableName, record.Parent) for record in records] == [
+            ("B", "D"),
+            ("C", "D"),
+        ]
+
+    def test_up_recursive_deep(self, tmp_path):
+        depth = 5000
+        load_file = tmp_path / "deep.json"
+        load_file.write_text(
+            json.dumps(
+                {
+                    str(i): {str(i + 1): [create_mapped_template(key=f"{i}.sql")]}
+                    for i in range(depth)
+                }
+            )
+        )
+        stairlight = StairLight(config_dir="none", load_files=[str(load_file)])
+        stairlight.load_map()
+        assert len(stairlight.up(table_name="0", recursive=True)) == depth
+        assert stairlight.up(table_name="0", recursive=True, verbose=True)
+
+
+@pytest.mark.parametrize(("max_workers", "expected"), [(None, 4), (0, 0), (1, 1)])
+def test_max_workers_over_settings(
+    max_workers: int | None, expected: int, monkeypatch: pytest.MonkeyPatch
+):
+    def create_map(**kwargs):
+        raise RuntimeError(kwargs)
+
+    stairlight = StairLight(config_dir="none", max_workers=max_workers)
+    stairlight._settings = StairlightConfigSettings(MaxWorkers=4)
+    monkeypatch.setattr("src.stairlight.stairlight.Map", create_map)
+    with pytest.raises(RuntimeError) as e:
+        stairlight._write_map()
+    assert e.value.args[0]["max_workers"] == expected
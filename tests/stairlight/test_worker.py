@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import mmap
+import pickle
+import time
+from typing import Callable
+
+import pytest
+
+from src.stairlight.source.template import TemplateSourceType
+from src.stairlight.worker import (
+    WORK_FAILURE_ERROR,
+    WORK_FAILURE_MEMORY,
+    WORK_FAILURE_TIMEOUT,
+    RenderParseWorkUnit,
+    SupervisedWorker,
+    SupervisedWorkerPool,
+    WorkFailure,
+    process_work_unit,
+    resource,
+    to_upstair_table_references,
+)
+
+
+def test_work_unit_is_picklable():
+    work_unit = RenderParseWorkUnit(
+        template_str="SELECT * FROM {{ table }}",
+        params={"table": "PROJECT.DATASET.TABLE"},
+        ignore_params=None,
+        default_table_prefix=None,
+        source_type=TemplateSourceType.FILE.value,
+        key="a.sql",
+    )
+    assert pickle.loads(pickle.dumps(work_unit)) == work_unit
+
+
+def test_process_work_unit():
+    work_unit = RenderParseWorkUnit(
+        template_str="SELECT *\nFROM DATASET.{{ table }}\nWHERE {{ cond }}",
+        params={"table": "TABLE"},
+        ignore_params=["cond"],
+        default_table_prefix="PROJECT",
+        source_type=TemplateSourceType.FILE.value,
+        key="a.sql",
+    )
+    assert process_work_unit(work_unit=work_unit) == [
+        ("PROJECT.DATASET.TABLE", 2, "FROM DATASET.TABLE")
+    ]
+
+
+def test_process_compiled_work_unit():
+    work_unit = RenderParseWorkUnit(
+        template_str="SELECT * FROM {{ table }}",
+        params={"table": "TABLE"},
+        ignore_params=None,
+        default_table_prefix=None,
+        source_type=TemplateSourceType.DBT.value,
+        key="a.sql",
+        is_compiled=True,
+    )
+    assert process_work_unit(work_unit=work_unit) == []
+
+
+def test_process_large_file_work_unit(tmp_path):
+    path = tmp_path / "a.sql"
+    path.write_text("SELECT *\nFROM DATASET.$table\n" * 3)
+    work_unit = RenderParseWorkUnit(
+        template_str="",
+        params={"table": "TABLE"},
+        ignore_params=None,
+        default_table_prefix="PROJECT",
+        source_type=TemplateSourceType.FILE.value,
+        key="a.sql",
+        path=str(path),
+        chunk_size=16,
+    )
+    assert process_work_unit(work_unit=work_unit) == [
+        ("PROJECT.DATASET.TABLE", line_number, "FROM DATASET.TABLE")
+        for line_number in [2, 4, 6]
+    ]
+
+
+def test_to_upstair_table_references():
+    actual = to_upstair_table_references(
+        reference_tuples=[("PROJECT.DATASET.TABLE", 2, "FROM DATASET.TABLE")]
+    )
+    assert actual[0].TableName == "PROJECT.DATASET.TABLE"
+    assert actual[0].Line == {"LineNumber": 2, "LineString": "FROM DATASET.TABLE"}
+
+
+def work(seconds: float) -> float:
+    if seconds < 0:
+        raise ValueError("negative")
+    time.sleep(seconds)
+    return seconds
+
+
+def allocate(size: int) -> int:
+    return len(bytearray(size))
+
+
+def map_memory(size: int) -> int:
+    with mmap.mmap(-1, size) as mapped:
+        return len(mapped)
+
+
+def test_stop_busy_worker():
+    worker = SupervisedWorker(memory_limit=None, initializer=None, initargs=())
+    # The worker does not read the stop sentinel while it works
+    worker.connection.send((0, work, 60))
+    start = time.monotonic()
+    worker.stop(timeout=0.5)
+    assert time.monotonic() - start < 10
+    assert not worker.process.is_alive()
+
+
+class TestSupervisedWorkerPool:
+    def test_map_in_order(self):
+        with SupervisedWorkerPool(max_processes=2, time_limit=10) as pool:
+            actual = list(pool.map(work, [0.2, 0, 0.1, 0]))
+        assert actual == [0.2, 0, 0.1, 0]
+        assert pool.failures == 0
+
+    def test_timeout(self):
+        with SupervisedWorkerPool(max_processes=2, time_limit=0.5) as pool:
+            actual = list(pool.map(work, [0, 60, 0, 0]))
+            # The killed process is replaced, so later works are processed
+            assert list(pool.map(work, [0, 0])) == [0, 0]
+        assert actual[0] == actual[2] == actual[3] == 0
+        assert isinstance(actual[1], WorkFailure)
+        assert actual[1].reason == WORK_FAILURE_TIMEOUT
+        assert pool.failures == 1
+
+    def test_error(self):
+        with SupervisedWorkerPool(max_processes=1, time_limit=10) as pool:
+            actual = list(pool.map(work, [0, -1, 0]))
+        assert actual[0] == actual[2] == 0
+        assert isinstance(actual[1], WorkFailure)
+        assert actual[1].reason == WORK_FAILURE_ERROR
+        assert "negative" in str(actual[1])
+
+    @pytest.mark.skipif(resource is None, reason="Memory limits are not supported")
+    @pytest.mark.parametrize("func", [allocate, map_memory])
+    def test_memory(self, func: Callable[[int], int]):
+        with SupervisedWorkerPool(max_processes=1, memory_limit=2**31) as pool:
+            actual = list(pool.map(func, [1024, 2**32, 1024]))
+        assert actual[0] == actual[2] == 1024
+        assert isinstance(actual[1], WorkFailure)
+        assert actual[1].reason == WORK_FAILURE_MEMORY